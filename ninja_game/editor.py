@@ -4,6 +4,7 @@ import pygame
 
 from scripts.utils import load_images
 from scripts.tilemap import Tilemap
+from scripts import chunks, mapfile
 
 import os
 
@@ -39,7 +40,7 @@ class Editor:
         self.tilemap = Tilemap(self, tile_size=16)
         
         try:
-            self.tilemap.load('map.json')
+            self.tilemap.load('map.json', streaming=False)  # l'éditeur modifie et sauvegarde la map entière
         except FileNotFoundError:
             pass
         
@@ -141,10 +142,21 @@ class Editor:
                         self.tilemap.autotile()
                     if event.key == pygame.K_o:
                         self.tilemap.save('map.json')
-                        nbrDeMap = os.listdir('data/maps/')
+                        nbrDeMap = [f for f in os.listdir('data/maps/') if f.endswith('.json')]  # pas les .map compilés
                         nbrDeMap = len(nbrDeMap) # ca fait direct +1 vu que obn commence a 0
                         self.tilemap.save(f'data/maps/{nbrDeMap}.json')
                         self.tilemap.save(f'../ninja_game_server/data/maps/{nbrDeMap}.json')
+                        # version binaire compilée, lue au chargement par le client et le serveur
+                        # (découpée en chunks streamés pour une grande map)
+                        streamed = chunks.grid_cells(self.tilemap.tilemap) > chunks.STREAM_MIN_CELLS
+                        for map_path in (f'data/maps/{nbrDeMap}.json', f'../ninja_game_server/data/maps/{nbrDeMap}.json'):
+                            try:
+                                if streamed:
+                                    chunks.convert(map_path)
+                                else:
+                                    mapfile.convert(map_path)
+                            except OSError as e:
+                                print(f"Map binaire non écrite ({map_path}) : {e}")
                         print('Map saved to map.json')
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
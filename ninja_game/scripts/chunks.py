@@ -0,0 +1,260 @@
+import json
+import os
+import struct
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+# Maps découpées en chunks (partagé client / serveur)
+#
+# Un fichier N.chunks à côté de N.json pour les grands mondes : la grille est
+# découpée en chunks de CHUNK_SIZE x CHUNK_SIZE tuiles, seuls les chunks non
+# vides sont écrits. Un chunk se lit d'un bloc (numpy.memmap) à la demande, et
+# ChunkCache garde les plus récents dans un budget mémoire (LRU).
+#
+#   en-tête      CHUNK_HEADER (magic, version, tile_size, taille des chunks,
+#                nombre de chunks, taille de la table des noms, nombre d'objets,
+#                bornes de la grille en tuiles, taille et mtime du JSON source)
+#   noms         types de tuiles en UTF-8 séparés par '\n', complétés à 8 octets
+#   table        CHUNK_DTYPE [nombre de chunks] : (cx, cy) en coordonnées de chunk
+#   chunks       uint8 [nombre de chunks, 2, CHUNK_SIZE, CHUNK_SIZE] : types
+#                (0 = vide, sinon indice dans les noms + 1) puis variants
+#   objets       OBJECT_DTYPE [n] : les tuiles offgrid (x, y en pixels) et les
+#                tuiles de grille de OBJECT_TYPES (x, y en tuiles), qu'on doit
+#                connaître sans charger tous les chunks (spawners, décor extrait)
+#
+# Une map passe en chunks quand sa grille dense dépasse STREAM_MIN_CELLS cases ;
+# le .chunks est écrit par le serveur au premier chargement, par l'éditeur à la
+# sauvegarde, ou à la main :
+#
+#     python scripts/chunks.py data/maps/9.json
+
+CHUNK_MAGIC = b'NCHK'
+CHUNK_VERSION = 1
+CHUNK_HEADER = struct.Struct("<4sHHHIIIiiiiqq")
+CHUNK_DTYPE = np.dtype([('cx', '<i4'), ('cy', '<i4')])
+OBJECT_DTYPE = np.dtype([('type', '<u1'), ('variant', '<u1'), ('grid', '<u1'), ('x', '<f8'), ('y', '<f8')])
+CHUNK_SIZE = 32                 # tuiles de côté
+OBJECT_TYPES = {'spawners', 'large_decor'}
+STREAM_MIN_CELLS = 1 << 20      # cases de grille dense au-delà desquelles une map est streamée
+ALIGN = 8
+
+
+def chunk_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".chunks"
+
+
+def _padded(size: int) -> int:
+    return -(-size // ALIGN) * ALIGN
+
+
+def _source_stamp(json_path: str) -> tuple:
+    """(size, mtime_ns) of the JSON source, (0, 0) if it does not exist"""
+    try:
+        st = os.stat(json_path)
+    except OSError:
+        return 0, 0
+    return st.st_size, st.st_mtime_ns
+
+
+def grid_cells(tilemap: dict) -> int:
+    """Cells of the dense grid covering the tiles of a JSON "x;y" -> tile dict"""
+    if not tilemap:
+        return 0
+    xs = [tile['pos'][0] for tile in tilemap.values()]
+    ys = [tile['pos'][1] for tile in tilemap.values()]
+    return (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)
+
+
+class ChunkFile:
+    """Read-only view of a .chunks file, chunks are read one by one from a numpy.memmap"""
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                raise ValueError(f"{path}: truncated chunk file")
+            (magic, version, self.tile_size, self.chunk_size, chunk_count, names_size, object_count,
+             min_x, min_y, max_x, max_y, self.source_size, self.source_mtime) = CHUNK_HEADER.unpack(header)
+            if magic != CHUNK_MAGIC or version != CHUNK_VERSION:
+                raise ValueError(f"{path}: not a version {CHUNK_VERSION} chunk file")
+            names = f.read(names_size).decode('utf-8')
+        self.path = path
+        self.type_names = names.split('\n') if names else []
+        self.tile_bounds = (min_x, min_y, max_x, max_y)  # tuiles, max exclus
+
+        cs = self.chunk_size
+        offset = CHUNK_HEADER.size + _padded(names_size)
+        table = np.fromfile(path, dtype=CHUNK_DTYPE, count=chunk_count, offset=offset)
+        self.index = {key: i for i, key in enumerate(zip(table['cx'].tolist(), table['cy'].tolist()))}
+        offset += _padded(table.nbytes)
+        if chunk_count:
+            self.data = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(chunk_count, 2, cs, cs))
+        else:
+            self.data = np.zeros((0, 2, cs, cs), dtype=np.uint8)
+        offset += chunk_count * 2 * cs * cs
+        if object_count:
+            self.objects = np.memmap(path, dtype=OBJECT_DTYPE, mode='r', offset=offset, shape=(object_count,))
+        else:
+            self.objects = np.zeros(0, dtype=OBJECT_DTYPE)
+
+    def is_fresh(self, json_path: str) -> bool:
+        """Whether this file was compiled from the current 'json_path' (or the JSON is gone)"""
+        if not os.path.exists(json_path):
+            return True
+        return _source_stamp(json_path) == (self.source_size, self.source_mtime)
+
+    def read(self, cx: int, cy: int) -> tuple | None:
+        """(types, variants) uint8 arrays [CHUNK_SIZE, CHUNK_SIZE] of chunk (cx, cy), None if it is empty"""
+        i = self.index.get((cx, cy))
+        if i is None:
+            return None
+        block = np.array(self.data[i])
+        return block[0], block[1]
+
+    def object_list(self) -> tuple:
+        """(offgrid tiles, grid tiles of OBJECT_TYPES) in the JSON format"""
+        names = self.type_names
+        offgrid, grid = [], []
+        for t, v, on_grid, x, y in self.objects.tolist():
+            if on_grid:
+                grid.append({'type': names[t], 'variant': v, 'pos': [int(x), int(y)]})
+            else:
+                offgrid.append({'type': names[t], 'variant': v, 'pos': [x, y]})
+        return offgrid, grid
+
+
+class ChunkCache:
+    """
+    Chunks of a ChunkFile converted by 'load(cx, cy, types, variants) -> (chunk, nbytes)' and kept in
+    least recently used order within 'budget' bytes; 'unload(chunk)' is called on eviction.
+    Empty chunks (absent from the file) are None and cost nothing.
+    Hot paths can read 'loaded' directly and call get() on a miss: such reads do not refresh
+    the LRU order, get() does.
+    """
+    def __init__(self, chunk_file: ChunkFile, budget: int, load, unload=None):
+        self.file = chunk_file
+        self.budget = budget
+        self.load = load
+        self.unload = unload
+        self.chunks = OrderedDict()   # (cx, cy) -> (chunk, nbytes), du plus ancien au plus récent
+        self.loaded = {}              # (cx, cy) -> chunk, mêmes clés
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, cx: int, cy: int):
+        key = (cx, cy)
+        entry = self.chunks.get(key)
+        if entry is not None:
+            self.chunks.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if key not in self.file.index:
+            return None
+        self.misses += 1
+        types, variants = self.file.read(cx, cy)
+        entry = self.load(cx, cy, types, variants)
+        self.chunks[key] = entry
+        self.loaded[key] = entry[0]
+        self.bytes += entry[1]
+        # Au moins le chunk demandé reste chargé, même au-delà du budget
+        while self.bytes > self.budget and len(self.chunks) > 1:
+            old, (chunk, nbytes) = self.chunks.popitem(last=False)
+            del self.loaded[old]
+            self.bytes -= nbytes
+            self.evictions += 1
+            if self.unload:
+                self.unload(chunk)
+        return entry[0]
+
+    def clear(self) -> None:
+        if self.unload:
+            for chunk, _ in self.chunks.values():
+                self.unload(chunk)
+        self.chunks.clear()
+        self.loaded.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        return {'loaded': len(self.chunks), 'bytes': self.bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+def write(path: str, tile_size: int, tilemap: dict, offgrid: list, source: str = None,
+          chunk_size: int = CHUNK_SIZE) -> None:
+    """Writes a .chunks file from the JSON structures ('source': JSON it was compiled from)"""
+    tiles = list(tilemap.values())
+    type_names = sorted({tile['type'] for tile in tiles} | {tile['type'] for tile in offgrid})
+    if len(type_names) > 255:
+        raise ValueError("too many tile types for a uint8 grid")
+    type_ids = {name: i + 1 for i, name in enumerate(type_names)}
+
+    cs = chunk_size
+    xs = np.array([tile['pos'][0] for tile in tiles], dtype=np.int64)
+    ys = np.array([tile['pos'][1] for tile in tiles], dtype=np.int64)
+    ids = np.array([type_ids[tile['type']] for tile in tiles], dtype=np.uint8)
+    variants = np.array([tile['variant'] for tile in tiles], dtype=np.uint8)
+    if tiles:
+        bounds = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+    else:
+        bounds = (0, 0, 0, 0)
+    # Chunks non vides triés, puis chaque tuile rangée dans le sien
+    keys = np.stack((xs // cs, ys // cs), axis=1)
+    table_keys, chunk_of = np.unique(keys, axis=0, return_inverse=True) if tiles else (np.zeros((0, 2), np.int64), None)
+    table = np.zeros(len(table_keys), dtype=CHUNK_DTYPE)
+    table['cx'], table['cy'] = table_keys[:, 0], table_keys[:, 1]
+    data = np.zeros((len(table_keys), 2, cs, cs), dtype=np.uint8)
+    if tiles:
+        chunk_of = chunk_of.ravel()
+        data[chunk_of, 0, ys % cs, xs % cs] = ids
+        data[chunk_of, 1, ys % cs, xs % cs] = variants
+
+    objects = [(type_ids[tile['type']] - 1, tile['variant'], 0, tile['pos'][0], tile['pos'][1]) for tile in offgrid]
+    objects += [(type_ids[tile['type']] - 1, tile['variant'], 1, tile['pos'][0], tile['pos'][1])
+                for tile in tiles if tile['type'] in OBJECT_TYPES]
+    objects = np.array(objects, dtype=OBJECT_DTYPE)
+    names = '\n'.join(type_names).encode('utf-8')
+    source_size, source_mtime = _source_stamp(source) if source else (0, 0)
+
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(CHUNK_HEADER.pack(CHUNK_MAGIC, CHUNK_VERSION, tile_size, cs, len(table), len(names), len(objects),
+                                  *bounds, source_size, source_mtime))
+        f.write(names.ljust(_padded(len(names)), b'\0'))
+        f.write(table.tobytes().ljust(_padded(table.nbytes), b'\0'))
+        f.write(data.tobytes())
+        f.write(objects.tobytes())
+    os.replace(tmp, path)  # un lecteur ne voit jamais un fichier à moitié écrit
+
+
+def convert(json_path: str, out_path: str = None) -> str:
+    """Compiles a JSON map to its .chunks file, returns the path written"""
+    with open(json_path, 'r') as f:
+        map_data = json.load(f)
+    out_path = out_path or chunk_path(json_path)
+    write(out_path, map_data['tile_size'], map_data['tilemap'], map_data.get('offgrid', []), source=json_path)
+    return out_path
+
+
+def open_fresh(json_path: str) -> ChunkFile | None:
+    """The .chunks file of 'json_path' if it exists and matches the JSON, None otherwise"""
+    path = chunk_path(json_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        chunk_file = ChunkFile(path)
+    except (OSError, ValueError):
+        return None
+    return chunk_file if chunk_file.is_fresh(json_path) else None
+
+
+if __name__ == "__main__":
+    import time
+    for json_path in sys.argv[1:]:
+        start = time.perf_counter()
+        out = convert(json_path)
+        chunk_file = ChunkFile(out)
+        print(f"{json_path} -> {out} : {len(chunk_file.index)} chunks, {os.path.getsize(out) / 1024:.1f} Ko, "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
@@ -3,6 +3,13 @@ import struct
 import threading
 import time
 
+from scripts.snapshot import (PROTOCOL_VERSION, SNAPSHOT_HISTORY, PLAYER_INPUT, decode_delta, decode_compact, decode_legacy,
+                              apply_players_into, apply_enemies_into, apply_compact_players_into,
+                              apply_compact_enemies_into, named_players, named_enemies)
+
+PARTIAL_SNAPSHOTS = 4   # snapshots découpés en cours de réassemblage
+RECV_SIZE = 65535       # taille max d'un datagramme UDP
+
 class ClientNetwork:
     def __init__(self, server_ip="127.0.0.1", server_port=5005):
         self.server = (server_ip, server_port)
@@ -17,6 +24,15 @@ class ClientNetwork:
         self.ping = 0.0
         self.map_change_id = None # <--- Nouveau
 
+        # Snapshots delta : seq -> (players, enemies, quantification) pouvant servir de baseline
+        self.snapshots = {}
+        self.last_snapshot_seq = 0
+        # Snapshots compacts incomplets : seq -> (players, enemies, quantification, quantizer, parts reçues, nb parts)
+        self.partial_snapshots = {}
+
+        # Numéro des mises à jour envoyées, le serveur ne garde que la plus récente par tick
+        self.input_seq = 0
+
         # thread de réception
         threading.Thread(target=self.listen, daemon=True).start()
 
@@ -29,16 +45,19 @@ class ClientNetwork:
         while self.id is None and self.running:
             try:
                 # envoyer le paquet de connexion
-                self.sock.sendto(b'\x0A', self.server)
+                self.sock.sendto(b'\x0A' + struct.pack("B", PROTOCOL_VERSION), self.server)
                 start_time = time.time()
 
                 while time.time() - start_time < 2:  # attente max 2 secondes
                     try:
-                        data, _ = self.sock.recvfrom(4096)
+                        data, _ = self.sock.recvfrom(RECV_SIZE)
                         if len(data) == 4:
                             self.id = struct.unpack("I", data)[0]
                             print(f"Connected with ID {self.id}")
                             break
+                        elif data[0] == 4 and len(data) >= 5:
+                            # map courante du serveur, envoyée avec le PID
+                            self.map_change_id = struct.unpack("<I", data[1:5])[0]
                         else:
                             print("Paquet inattendu reçu, en attente du PID...")
                     except socket.timeout:
@@ -55,7 +74,7 @@ class ClientNetwork:
     def listen(self):
         while self.running:
             try:
-                data, _ = self.sock.recvfrom(4096)
+                data, _ = self.sock.recvfrom(RECV_SIZE)
                 if not data:
                     continue
 
@@ -69,38 +88,15 @@ class ClientNetwork:
 
                 # --- WORLD UPDATE (Type 2) ---
                 if msg_type == 2:
-                    offset = 1
-                    if len(data) < offset + 1: continue
-                    count = data[offset]
-                    offset += 1
-                    new_remote_players = {}
-
-                    for _ in range(count):
-                        if len(data) >= offset + 37:
-                            pid = struct.unpack("I", data[offset:offset+4])[0]
-                            x, y, vx, vy = struct.unpack("ffff", data[offset+4:offset+20])
-                            action = data[offset+20:offset+35].decode('utf-8').rstrip('\x00')
-                            flip = data[offset+35] == 1
-                            weapon_id = data[offset+36]
-                            new_remote_players[pid] = (x, y, action, flip, weapon_id, vx, vy)
-                            offset += 37
-                        else:
-                            break
-                    self.remote_players = new_remote_players
-
-                    if len(data) >= offset + 1:
-                        enemy_count = data[offset]
-                        offset += 1
-                        new_enemies = {}
-                        for _ in range(enemy_count):
-                            # 13 = Iff? (4+4+4+1)
-                            # +15 = taille du state
-                            if len(data) >= offset + 28:  # 13 + 15
-                                eid, x, y, flip = struct.unpack("Iff?", data[offset:offset+13])
-                                state = data[offset+13:offset+28].decode('utf-8').rstrip('\x00')
-                                new_enemies[eid] = (x, y, flip, state)
-                                offset += 28
-                        self.enemies = new_enemies
+                    players, enemies = decode_legacy(data)
+                    self.remote_players = players
+                    if enemies is not None:
+                        self.enemies = enemies
+                    continue
+
+                # --- DELTA WORLD UPDATE (Type 6, Type 8 compact) ---
+                if msg_type == 6 or msg_type == 8:
+                    self.apply_snapshot(data)
                     continue
 
                 # --- MAP CHANGE (Type 4) ---
@@ -110,17 +106,85 @@ class ClientNetwork:
                         self.map_change_id = map_id
                     continue
 
-            except socket.timeout:
-                pass
+            except (socket.timeout, BlockingIOError):
+                # Rien à lire : on ne dort que là, sinon on vide la socket d'une traite
+                # (un snapshot compact arrive en plusieurs datagrammes par tick)
+                time.sleep(0.01)
             except Exception as e:
                 print("Listen error:", e)
                 break
-            time.sleep(0.01)
 
 
+    def apply_snapshot(self, data):
+        """
+        Applies a type 6 snapshot or one part of a type 8 (compact) snapshot.
+        A snapshot is kept as a baseline and acknowledged once all its parts arrived;
+        an incomplete one is still shown with the parts received when a newer one starts.
+        """
+        if data[0] == 8:
+            seq, baseline_seq, quantizer, part, parts, players_delta, enemies_delta = decode_compact(data)
+            quant_key = quantizer.key
+            apply_players, apply_enemies = apply_compact_players_into, apply_compact_enemies_into
+        else:
+            seq, baseline_seq, players_delta, enemies_delta = decode_delta(data)
+            quantizer = quant_key = None
+            part, parts = 0, 1
+            apply_players, apply_enemies = apply_players_into, apply_enemies_into
+        if seq <= self.last_snapshot_seq:
+            return  # paquet en retard
+
+        pending = self.partial_snapshots.get(seq)
+        if pending is None:
+            if baseline_seq == 0:
+                baseline = ({}, {}, quant_key)
+            elif baseline_seq in self.snapshots and self.snapshots[baseline_seq][2] == quant_key:
+                baseline = self.snapshots[baseline_seq]
+            else:
+                return  # baseline inconnue, le serveur renverra un snapshot complet
+            # Un snapshot plus récent commence : on affiche ce qui est arrivé des précédents
+            older = [s for s in self.partial_snapshots if s < seq]
+            if older:
+                self.show_snapshot(self.partial_snapshots[max(older)])
+                for s in older:
+                    del self.partial_snapshots[s]
+            pending = (dict(baseline[0]), dict(baseline[1]), quant_key, quantizer, set(), parts)
+            self.partial_snapshots[seq] = pending
+            if len(self.partial_snapshots) > PARTIAL_SNAPSHOTS:
+                del self.partial_snapshots[min(self.partial_snapshots)]
+
+        players, enemies, _, _, received, _ = pending
+        if part in received:
+            return
+        received.add(part)
+        apply_players(players, *players_delta)
+        apply_enemies(enemies, *enemies_delta)
+        if len(received) < parts:
+            return
+
+        # Snapshot complet : nouvelle baseline possible
+        del self.partial_snapshots[seq]
+        self.snapshots[seq] = (players, enemies, quant_key)
+        self.last_snapshot_seq = seq
+        for old in [s for s in self.snapshots if s <= seq - SNAPSHOT_HISTORY]:
+            del self.snapshots[old]
+        self.show_snapshot(pending)
+
+        self.sock.sendto(b'\x07' + struct.pack("<I", seq), self.server)
+
+    def show_snapshot(self, snapshot):
+        """Hands a (possibly partial) snapshot to the game"""
+        players, enemies, _, quantizer, _, _ = snapshot
+        if quantizer is not None:
+            players = quantizer.dequantize_players(players)
+            enemies = quantizer.dequantize_enemies(enemies)
+        # Nouveaux dicts : le jeu peut retirer des ennemis localement sans toucher aux baselines
+        self.remote_players = named_players(players)
+        self.enemies = named_enemies(enemies)
+
     def send_state(self, x, y, action, flip, weapon_id, vx, vy):
         try:
-            packet = b'\x00' + struct.pack("ffffBBB", x, y, vx, vy, action, flip, weapon_id)
+            self.input_seq = (self.input_seq + 1) & 0xFFFFFFFF
+            packet = b'\x00' + PLAYER_INPUT.pack(x, y, vx, vy, action, flip, weapon_id, self.input_seq)
             self.sock.sendto(packet, self.server)
         except Exception as e:
             print("Send error:", e)
@@ -0,0 +1,84 @@
+import numpy as np
+import pygame
+
+# Couche de collision du client : les tuiles solides fusionnées en grands
+# rectangles (une rangée de sol = un rect) et rangées dans un index spatial en
+# cases de COLLISION_CELL px. Une entité ne teste que les quelques rects des
+# cases qu'elle traverse pendant la frame au lieu de recréer un pygame.Rect par
+# tuile voisine.
+
+COLLISION_CELL = 64     # px, côté des cases de l'index
+
+
+def merge_rects(solid: np.ndarray, origin: tuple, tile_size: int) -> list:
+    """
+    Greedy merge of the True cells of 'solid' (bool [h, w], cell (0, 0) being tile 'origin') into
+    pygame.Rect in pixels: horizontal runs of each row, stacked while the rows below have the same run.
+    """
+    h, w = solid.shape
+    if not solid.any():
+        return []
+    # Début / fin (exclue) de chaque suite de cases pleines, ligne par ligne (ordre ligne par ligne)
+    edges = np.diff(np.pad(solid, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    sy, sx = np.nonzero(edges == 1)
+    _, ex = np.nonzero(edges == -1)
+    rows = [[] for _ in range(h)]
+    for y, x0, x1 in zip(sy.tolist(), sx.tolist(), ex.tolist()):
+        rows[y].append((x0, x1))
+
+    ox, oy = origin
+    rects = []
+    open_runs = {}    # (x0, x1) -> première ligne du rect en cours
+    for y, runs in enumerate(rows + [[]]):
+        still_open = {}
+        for run in runs:
+            still_open[run] = open_runs.pop(run, y)
+        for (x0, x1), top in open_runs.items():
+            rects.append(pygame.Rect((ox + x0) * tile_size, (oy + top) * tile_size,
+                                     (x1 - x0) * tile_size, (y - top) * tile_size))
+        open_runs = still_open
+    return rects
+
+
+class RectIndex:
+    """Uniform grid over pygame.Rect, grouped by owner (e.g. a chunk) so they can be removed together"""
+    def __init__(self, cell: int = COLLISION_CELL):
+        self.cell = cell
+        self.cells = {}      # (cx, cy) -> [id]
+        self.rects = {}      # id -> pygame.Rect
+        self.owners = {}     # propriétaire -> [id]
+        self.next_id = 0
+
+    def _cells(self, rect: pygame.Rect):
+        c = self.cell
+        for cy in range(rect.top // c, (rect.bottom - 1) // c + 1):
+            for cx in range(rect.left // c, (rect.right - 1) // c + 1):
+                yield cx, cy
+
+    def add(self, rects: list, owner=None) -> None:
+        ids = self.owners.setdefault(owner, [])
+        for rect in rects:
+            i = self.next_id
+            self.next_id += 1
+            self.rects[i] = rect
+            ids.append(i)
+            for key in self._cells(rect):
+                self.cells.setdefault(key, []).append(i)
+
+    def remove(self, owner) -> None:
+        for i in self.owners.pop(owner, ()):
+            rect = self.rects.pop(i)
+            for key in self._cells(rect):
+                ids = self.cells[key]
+                ids.remove(i)
+                if not ids:
+                    del self.cells[key]
+
+    def query(self, area: pygame.Rect) -> list:
+        """Rects of the cells covered by 'area' (they may not all overlap it), each once"""
+        found = {}
+        cells = self.cells
+        for key in self._cells(area):
+            for i in cells.get(key, ()):
+                found[i] = None
+        return [self.rects[i] for i in found]
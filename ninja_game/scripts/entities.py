@@ -47,10 +47,22 @@ class PhysicsEntity:
             (movement[1] + self.velocity[1]) * dt
         )
         
+        # Swept AABB, un axe après l'autre : tous les rects traversés pendant la frame comptent, du plus
+        # proche au plus loin, pas seulement ceux autour de la position d'arrivée (un dash à bas FPS
+        # ne passe plus à travers un mur fin)
+        start_rect = self.rect()
         self.pos[0] += frame_movement[0] 
         entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
+        sweep = start_rect.union(entity_rect)
+        rects = tilemap.physics_rects(sweep)
+        if frame_movement[0] < 0:
+            rects.sort(key=lambda rect: -rect.right)
+        else:
+            rects.sort(key=lambda rect: rect.left)
+        for rect in rects:
+            # Chevauche la position d'arrivée, ou a été traversé : entièrement devant la position de départ
+            ahead = rect.left >= start_rect.right if frame_movement[0] > 0 else rect.right <= start_rect.left
+            if entity_rect.colliderect(rect) or (frame_movement[0] and ahead and sweep.colliderect(rect)):
                 if frame_movement[0] > 0:
                     entity_rect.right = rect.left
                     self.collisions['right'] = True
@@ -58,11 +70,20 @@ class PhysicsEntity:
                     entity_rect.left = rect.right
                     self.collisions['left'] = True
                 self.pos[0] = entity_rect.x
+                sweep = start_rect.union(entity_rect)
         
+        start_rect = self.rect()
         self.pos[1] += frame_movement[1] 
         entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
+        sweep = start_rect.union(entity_rect)
+        rects = tilemap.physics_rects(sweep)
+        if frame_movement[1] < 0:
+            rects.sort(key=lambda rect: -rect.bottom)
+        else:
+            rects.sort(key=lambda rect: rect.top)
+        for rect in rects:
+            ahead = rect.top >= start_rect.bottom if frame_movement[1] > 0 else rect.bottom <= start_rect.top
+            if entity_rect.colliderect(rect) or (frame_movement[1] and ahead and sweep.colliderect(rect)):
                 if frame_movement[1] > 0:
                     entity_rect.bottom = rect.top
                     self.collisions['down'] = True
@@ -70,6 +91,7 @@ class PhysicsEntity:
                     entity_rect.top = rect.bottom
                     self.collisions['up'] = True
                 self.pos[1] = entity_rect.y
+                sweep = start_rect.union(entity_rect)
 
         
                 
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import time
 import urllib.request
@@ -53,6 +54,21 @@ class LobbyManager:
         
         self._remove_lobby()
 
+    async def heartbeat_async(self):
+        """(SERVEUR) Même rôle que start_heartbeat, en tâche asyncio (les requêtes HTTP partent dans un thread)."""
+        if self.mode != 'server': return
+
+        self.public_ip = await asyncio.to_thread(get_public_ip)
+        print(f"IP Publique détectée : {self.public_ip}")
+
+        self.running = True
+        while self.running:
+            try:
+                await asyncio.to_thread(self._send_beat)
+            except Exception as e:
+                print(f"Erreur heartbeat: {e}")
+            await asyncio.sleep(5)
+
     def _send_beat(self):
         """Envoie ou met à jour les infos du serveur sur Firebase."""
         data = {
@@ -0,0 +1,183 @@
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+# Format binaire compilé des maps (partagé client / serveur)
+#
+# Un fichier N.map à côté de N.json, lu par numpy.memmap (rien n'est copié en
+# mémoire tant qu'on ne touche pas aux pages) :
+#
+#   en-tête      MAP_HEADER (magic, version, tile_size, origine et taille de la
+#                grille en tuiles, nombre d'objets offgrid, taille de la table des
+#                noms, taille et mtime du JSON source)
+#   noms         types de tuiles en UTF-8 séparés par '\n', complétés à 8 octets
+#   types        uint8 [hauteur, largeur] : 0 = vide, sinon indice dans les noms + 1
+#   variants     uint8 [hauteur, largeur]
+#   offgrid      OFFGRID_DTYPE [n] (type, variant, x, y en pixels), aligné sur 8 octets
+#
+# Le JSON reste la source (éditeur) : le .map est régénéré par l'éditeur à la
+# sauvegarde, par le serveur au premier chargement, ou à la main :
+#
+#     python scripts/mapfile.py data/maps            # tous les .json d'un dossier
+#     python scripts/mapfile.py data/maps/3.json
+
+MAP_MAGIC = b'NMAP'
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct("<4sHHiiIIIIqq")
+OFFGRID_DTYPE = np.dtype([('type', '<u1'), ('variant', '<u1'), ('x', '<f8'), ('y', '<f8')])
+ALIGN = 8
+
+
+def binary_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".map"
+
+
+def _padded(size: int) -> int:
+    return -(-size // ALIGN) * ALIGN
+
+
+def _source_stamp(json_path: str) -> tuple:
+    """(size, mtime_ns) of the JSON source, (0, 0) if it does not exist"""
+    try:
+        st = os.stat(json_path)
+    except OSError:
+        return 0, 0
+    return st.st_size, st.st_mtime_ns
+
+
+class MapFile:
+    """Read-only view of a .map file: grids and offgrid objects are numpy.memmap arrays"""
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header = f.read(MAP_HEADER.size)
+            if len(header) < MAP_HEADER.size:
+                raise ValueError(f"{path}: truncated map file")
+            (magic, version, self.tile_size, ox, oy, width, height, offgrid_count, names_size,
+             self.source_size, self.source_mtime) = MAP_HEADER.unpack(header)
+            if magic != MAP_MAGIC or version != MAP_VERSION:
+                raise ValueError(f"{path}: not a version {MAP_VERSION} map file")
+            names = f.read(names_size).decode('utf-8')
+        self.path = path
+        self.origin = (ox, oy)
+        self.width = width
+        self.height = height
+        self.type_names = names.split('\n') if names else []
+
+        offset = MAP_HEADER.size + _padded(names_size)
+        cells = width * height
+        if cells:
+            self.types = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(height, width))
+            self.variants = np.memmap(path, dtype=np.uint8, mode='r', offset=offset + cells, shape=(height, width))
+        else:
+            self.types = np.zeros((height, width), dtype=np.uint8)
+            self.variants = np.zeros((height, width), dtype=np.uint8)
+        offset += _padded(2 * cells)
+        if offgrid_count:
+            self.offgrid = np.memmap(path, dtype=OFFGRID_DTYPE, mode='r', offset=offset, shape=(offgrid_count,))
+        else:
+            self.offgrid = np.zeros(0, dtype=OFFGRID_DTYPE)
+
+    def is_fresh(self, json_path: str) -> bool:
+        """Whether this file was compiled from the current 'json_path' (or the JSON is gone)"""
+        if not os.path.exists(json_path):
+            return True
+        return _source_stamp(json_path) == (self.source_size, self.source_mtime)
+
+    def grid_tiles(self, type_name: str, variant: int = None) -> np.ndarray:
+        """Tile coordinates (n, 2) of the grid tiles of one type (and variant), in row-major order"""
+        if type_name not in self.type_names:
+            return np.zeros((0, 2), dtype=np.int64)
+        mask = self.types == self.type_names.index(type_name) + 1
+        if variant is not None:
+            mask &= self.variants == variant
+        gy, gx = np.nonzero(mask)
+        return np.stack((gx + self.origin[0], gy + self.origin[1]), axis=1)
+
+    def tilemap_dict(self) -> dict:
+        """The "x;y" -> tile dict of the JSON format (row-major order)"""
+        gy, gx = np.nonzero(self.types)
+        types = self.types[gy, gx].tolist()
+        variants = self.variants[gy, gx].tolist()
+        names = [None] + self.type_names
+        return {f"{x};{y}": {'type': names[t], 'variant': v, 'pos': [x, y]}
+                for x, y, t, v in zip((gx + self.origin[0]).tolist(), (gy + self.origin[1]).tolist(), types, variants)}
+
+    def offgrid_list(self) -> list:
+        """The offgrid tiles of the JSON format"""
+        names = self.type_names
+        return [{'type': names[t], 'variant': v, 'pos': [x, y]}
+                for t, v, x, y in self.offgrid.tolist()]
+
+
+def write(path: str, tile_size: int, tilemap: dict, offgrid: list, source: str = None) -> None:
+    """Writes a .map file from the JSON structures ('source': JSON it was compiled from)"""
+    tiles = list(tilemap.values())
+    type_names = sorted({tile['type'] for tile in tiles} | {tile['type'] for tile in offgrid})
+    if len(type_names) > 255:
+        raise ValueError("too many tile types for a uint8 grid")
+    type_ids = {name: i + 1 for i, name in enumerate(type_names)}
+    if tiles:
+        xs = np.array([tile['pos'][0] for tile in tiles], dtype=np.int64)
+        ys = np.array([tile['pos'][1] for tile in tiles], dtype=np.int64)
+        origin = (int(xs.min()), int(ys.min()))
+        height, width = int(ys.max()) - origin[1] + 1, int(xs.max()) - origin[0] + 1
+    else:
+        origin, width, height = (0, 0), 0, 0
+    types = np.zeros((height, width), dtype=np.uint8)
+    variants = np.zeros((height, width), dtype=np.uint8)
+    if tiles:
+        types[ys - origin[1], xs - origin[0]] = [type_ids[tile['type']] for tile in tiles]
+        variants[ys - origin[1], xs - origin[0]] = [tile['variant'] for tile in tiles]
+    records = np.array([(type_ids[tile['type']] - 1, tile['variant'], tile['pos'][0], tile['pos'][1]) for tile in offgrid],
+                       dtype=OFFGRID_DTYPE)
+    names = '\n'.join(type_names).encode('utf-8')
+    source_size, source_mtime = _source_stamp(source) if source else (0, 0)
+
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, tile_size, origin[0], origin[1], width, height,
+                                len(records), len(names), source_size, source_mtime))
+        f.write(names.ljust(_padded(len(names)), b'\0'))
+        grids = types.tobytes() + variants.tobytes()
+        f.write(grids.ljust(_padded(len(grids)), b'\0'))
+        f.write(records.tobytes())
+    os.replace(tmp, path)  # un lecteur ne voit jamais un fichier à moitié écrit
+
+
+def convert(json_path: str, out_path: str = None) -> str:
+    """Compiles a JSON map to its .map file, returns the path written"""
+    with open(json_path, 'r') as f:
+        map_data = json.load(f)
+    out_path = out_path or binary_path(json_path)
+    write(out_path, map_data['tile_size'], map_data['tilemap'], map_data.get('offgrid', []), source=json_path)
+    return out_path
+
+
+def open_fresh(json_path: str) -> MapFile | None:
+    """The .map file of 'json_path' if it exists and matches the JSON, None otherwise"""
+    path = binary_path(json_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        map_file = MapFile(path)
+    except (OSError, ValueError):
+        return None
+    return map_file if map_file.is_fresh(json_path) else None
+
+
+if __name__ == "__main__":
+    import time
+    targets = sys.argv[1:] or [os.path.join("data", "maps")]
+    for target in targets:
+        if os.path.isdir(target):
+            paths = sorted(os.path.join(target, f) for f in os.listdir(target) if f.endswith(".json"))
+        else:
+            paths = [target]
+        for json_path in paths:
+            start = time.perf_counter()
+            out = convert(json_path)
+            print(f"{json_path} -> {out} : {os.path.getsize(json_path) / 1024:.1f} Ko -> "
+                  f"{os.path.getsize(out) / 1024:.1f} Ko, {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,574 @@
+import struct
+from itertools import islice
+from operator import itemgetter
+
+# Snapshots du monde (partagé client / serveur)
+#
+# Message types:
+#   2 : Snapshot complet historique (clients sans delta)
+#   6 : Snapshot delta  -> seq, baseline, entités modifiées / supprimées
+#   7 : Ack de snapshot (client -> serveur)
+#   8 : Snapshot delta compact (positions quantifiées, ids en varint)
+#
+# Un snapshot complet en mode delta est simplement un delta contre une
+# baseline vide (baseline == 0).
+#
+# Les états sont des {id: tuple} "wire" où l'action / le state sont des ids
+# internés. Le client les retransforme en noms pour le jeu (named_players /
+# named_enemies).
+
+PROTOCOL_LEGACY = 0
+PROTOCOL_DELTA = 1
+PROTOCOL_COMPACT = 2
+PROTOCOL_VERSION = PROTOCOL_COMPACT
+
+SNAPSHOT_HISTORY = 32  # nombre de snapshots gardés comme baselines possibles
+
+# Noms internés, l'ordre des actions est celui de game.py (action_mapping)
+ACTIONS = ('idle', 'run', 'jump', 'wall_slide', 'slide', 'attack_front', 'attack_up', 'attack_down')
+ENEMY_STATES = ('idle', 'rage')
+ACTION_IDS = {name: i for i, name in enumerate(ACTIONS)}
+ENEMY_STATE_IDS = {name: i for i, name in enumerate(ENEMY_STATES)}
+
+
+# Joueur : (x, y, action_id, flip, weapon_id, vx, vy)
+PLAYER_FIELDS = ('f', 'f', 'B', '?', 'B', 'f', 'f')
+# Ennemi : (x, y, flip, state_id)
+ENEMY_FIELDS = ('f', 'f', '?', 'B')
+
+DELTA_HEADER = struct.Struct("<BII")
+COUNT = struct.Struct("<H")
+LEGACY_COUNT = struct.Struct("<B")
+LEGACY_MAX_ENTITIES = 255
+ENTITY_ID = struct.Struct("<I")
+
+# Mise à jour du joueur (type 0, client -> serveur) : x, y, vx, vy, action_id, flip, weapon_id, seq
+# Les anciens clients envoient le même paquet sans le seq (19 octets)
+PLAYER_INPUT = struct.Struct("<ffffBBBI")
+PLAYER_INPUT_LEGACY = struct.Struct("<ffffBBB")
+
+# Format historique (type 2), les noms sont paddés sur 15 octets
+LEGACY_HEADER = struct.Struct("<BB")
+LEGACY_PLAYER = struct.Struct("<Iffff15s?B")
+LEGACY_ENEMY = struct.Struct("<Iff?15s")
+ACTION_BYTES = tuple(name.encode('utf-8') for name in ACTIONS)
+ENEMY_STATE_BYTES = tuple(name.encode('utf-8') for name in ENEMY_STATES)
+
+
+def _compile_records(fields: tuple, prefix: str = "<IB") -> tuple:
+    """
+    Precompiles, for every field mask, the Struct of a record (id: I, mask: B, present fields)
+    and the indices of the fields it carries.
+    """
+    structs = []
+    indices = []
+    for mask in range(1 << len(fields)):
+        present = tuple(i for i in range(len(fields)) if mask & (1 << i))
+        structs.append(struct.Struct(prefix + "".join(fields[i] for i in present)))
+        indices.append(present)
+    return tuple(structs), tuple(indices)
+
+
+def _compile_getters(record_fields: tuple) -> tuple:
+    """For every field mask, a function returning the tuple of the fields present in the mask"""
+    # itemgetter() d'un seul index renvoie la valeur, pas un tuple
+    return tuple(itemgetter(*present) if len(present) > 1 else (lambda v, i=present: tuple(v[j] for j in i))
+                 for present in record_fields)
+
+
+PLAYER_RECORDS, PLAYER_RECORD_FIELDS = _compile_records(PLAYER_FIELDS)
+ENEMY_RECORDS, ENEMY_RECORD_FIELDS = _compile_records(ENEMY_FIELDS)
+PLAYER_GETTERS = _compile_getters(PLAYER_RECORD_FIELDS)
+ENEMY_GETTERS = _compile_getters(ENEMY_RECORD_FIELDS)
+PLAYER_FULL = (1 << len(PLAYER_FIELDS)) - 1
+ENEMY_FULL = (1 << len(ENEMY_FIELDS)) - 1
+
+
+# --- Format compact (type 8) ---
+# Positions : int16 en virgule fixe autour d'une origine (pas de 1/2^shift px) : le centre de la map,
+# ou pour les maps trop larges une origine propre à chaque client, près de son joueur (QUANT_CELL),
+# vitesses : int8 par pas de VELOCITY_STEP px/s, flip et weapon / state dans un octet de flags.
+# Chaque record commence par un varint (id << nombre de champs | masque), un ennemi
+# complet tient donc sur 6 octets (id < 16) ou 7 octets (id < 2048).
+# Les compteurs sont des varints. Un snapshot est découpé en parts de SNAPSHOT_MTU
+# octets max, chacune autonome (même seq / baseline, ses propres records) : le client
+# applique les parts reçues et n'acke le snapshot que quand il les a toutes.
+# Joueur : (x, y, action_id, flags, vx, vy), flags = flip | weapon_id << 1
+COMPACT_PLAYER_FIELDS = ('h', 'h', 'B', 'B', 'b', 'b')
+# Ennemi : (x, y, flags), flags = flip | state_id << 1
+COMPACT_ENEMY_FIELDS = ('h', 'h', 'B')
+
+COMPACT_HEADER = struct.Struct("<BIIiiBBB")  # type, seq, baseline, origine x, origine y, shift, part, nb parts
+SNAPSHOT_MTU = 1200   # octets max par datagramme, sous le MTU courant (pas de fragmentation IP)
+MAX_PARTS = 255
+VELOCITY_STEP = 4.0   # px/s par unité, int8 -> +-508 px/s
+MAX_SHIFT = 4         # précision max : 1/16 px
+QUANT_MARGIN = 512    # px autour des tiles couverts par l'encodage (sauts, chutes)
+QUANT_CELL = 2048     # px, grille des origines locales, déplacées quand le joueur s'en éloigne de plus
+MAX_VARINT_SIZE = 6   # id sur 32 bits + 6 bits de masque
+
+COMPACT_PLAYER_RECORDS, COMPACT_PLAYER_RECORD_FIELDS = _compile_records(COMPACT_PLAYER_FIELDS, "<")
+COMPACT_ENEMY_RECORDS, COMPACT_ENEMY_RECORD_FIELDS = _compile_records(COMPACT_ENEMY_FIELDS, "<")
+COMPACT_PLAYER_GETTERS = _compile_getters(COMPACT_PLAYER_RECORD_FIELDS)
+COMPACT_ENEMY_GETTERS = _compile_getters(COMPACT_ENEMY_RECORD_FIELDS)
+COMPACT_PLAYER_BITS = len(COMPACT_PLAYER_FIELDS)
+COMPACT_ENEMY_BITS = len(COMPACT_ENEMY_FIELDS)
+
+
+# Masques des champs modifiés, déroulés à la main (appelés pour chaque entité qui bouge)
+def player_mask(old: tuple, values: tuple) -> int:
+    x0, y0, a0, f0, w0, vx0, vy0 = old
+    x, y, a, f, w, vx, vy = values
+    return ((x0 != x) | (y0 != y) << 1 | (a0 != a) << 2 | (f0 != f) << 3
+            | (w0 != w) << 4 | (vx0 != vx) << 5 | (vy0 != vy) << 6)
+
+
+def enemy_mask(old: tuple, values: tuple) -> int:
+    x0, y0, f0, s0 = old
+    x, y, f, s = values
+    return (x0 != x) | (y0 != y) << 1 | (f0 != f) << 2 | (s0 != s) << 3
+
+
+def compact_player_mask(old: tuple, values: tuple) -> int:
+    x0, y0, a0, f0, vx0, vy0 = old
+    x, y, a, f, vx, vy = values
+    return (x0 != x) | (y0 != y) << 1 | (a0 != a) << 2 | (f0 != f) << 3 | (vx0 != vx) << 4 | (vy0 != vy) << 5
+
+
+def compact_enemy_mask(old: tuple, values: tuple) -> int:
+    x0, y0, f0 = old
+    x, y, f = values
+    return (x0 != x) | (y0 != y) << 1 | (f0 != f) << 2
+
+
+def _write_varint(buf: bytearray, offset: int, value: int) -> int:
+    """Writes 'value' as an unsigned LEB128 varint, returns the offset after it"""
+    while value >= 0x80:
+        buf[offset] = (value & 0x7F) | 0x80
+        value >>= 7
+        offset += 1
+    buf[offset] = value
+    return offset + 1
+
+
+def _read_varint(view, offset: int) -> tuple:
+    """Reads an unsigned LEB128 varint, returns (value, offset after it)"""
+    value = view[offset]
+    offset += 1
+    if value < 0x80:
+        return value, offset
+    value &= 0x7F
+    shift = 7
+    while True:
+        byte = view[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _clamp16(v: int) -> int:
+    return -32768 if v < -32768 else 32767 if v > 32767 else v
+
+
+def _clamp8(v: int) -> int:
+    return -128 if v < -128 else 127 if v > 127 else v
+
+
+class Quantizer:
+    """
+    Fixed-point conversion between wire states and the compact format.
+    Positions are stored relative to (origin_x, origin_y) in steps of 1 / 2^shift px,
+    both chosen from the map bounds so that the whole map fits in an int16 (from_bounds),
+    or around one player when the map is too wide for that (around).
+    """
+    def __init__(self, origin_x: int = 0, origin_y: int = 0, shift: int = MAX_SHIFT):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.shift = shift
+        self.scale = 1 << shift
+        self.key = (origin_x, origin_y, shift)
+
+    @staticmethod
+    def shift_for(half: float) -> int:
+        """Finest shift at which offsets of +-half px fit in an int16, -1 if whole pixels do not"""
+        shift = MAX_SHIFT
+        while shift >= 0 and half * (1 << shift) > 32767:
+            shift -= 1
+        return shift
+
+    @classmethod
+    def from_bounds(cls, min_x: float, min_y: float, max_x: float, max_y: float) -> "Quantizer":
+        """Quantizer shared by the whole map, ValueError when the map is wider than an int16 of pixels"""
+        shift = cls.shift_for(max(max_x - min_x, max_y - min_y) / 2 + QUANT_MARGIN)
+        if shift < 0:
+            raise ValueError(f"map de {max_x - min_x:.0f}x{max_y - min_y:.0f} px trop grande "
+                             f"pour des positions int16")
+        return cls(int((min_x + max_x) // 2), int((min_y + max_y) // 2), shift)
+
+    @classmethod
+    def around(cls, x: float, y: float, reach: float) -> "Quantizer":
+        """
+        Quantizer local to one client: origin on the QUANT_CELL grid nearest to (x, y), covering the
+        positions up to QUANT_CELL + reach px from it (the player may drift QUANT_CELL away before it moves).
+        """
+        shift = cls.shift_for(QUANT_CELL + reach + QUANT_MARGIN)
+        if shift < 0:
+            raise ValueError(f"portée de {reach:.0f} px trop grande pour des positions int16")
+        return cls(round(x / QUANT_CELL) * QUANT_CELL, round(y / QUANT_CELL) * QUANT_CELL, shift)
+
+    def quantize_players(self, players: dict) -> dict:
+        ox, oy, k = self.origin_x, self.origin_y, self.scale
+        return {pid: (_clamp16(round((x - ox) * k)), _clamp16(round((y - oy) * k)), a, (flip | w << 1) & 0xFF,
+                      _clamp8(round(vx / VELOCITY_STEP)), _clamp8(round(vy / VELOCITY_STEP)))
+                for pid, (x, y, a, flip, w, vx, vy) in players.items()}
+
+    def quantize_enemies(self, enemies: dict) -> dict:
+        ox, oy, k = self.origin_x, self.origin_y, self.scale
+        return {eid: (_clamp16(round((x - ox) * k)), _clamp16(round((y - oy) * k)), (flip | s << 1) & 0xFF)
+                for eid, (x, y, flip, s) in enemies.items()}
+
+    def dequantize_players(self, players: dict) -> dict:
+        ox, oy, k = self.origin_x, self.origin_y, self.scale
+        return {pid: (ox + x / k, oy + y / k, a, bool(flags & 1), flags >> 1, vx * VELOCITY_STEP, vy * VELOCITY_STEP)
+                for pid, (x, y, a, flags, vx, vy) in players.items()}
+
+    def dequantize_enemies(self, enemies: dict) -> dict:
+        ox, oy, k = self.origin_x, self.origin_y, self.scale
+        return {eid: (ox + x / k, oy + y / k, bool(flags & 1), flags >> 1)
+                for eid, (x, y, flags) in enemies.items()}
+
+
+class SnapshotEncoder:
+    """
+    Writes snapshots into one preallocated bytearray with precompiled Structs (pack_into),
+    without any intermediate bytes concatenation.
+    The returned memoryviews are only valid until the next call: it may overwrite them.
+    """
+    def __init__(self, size: int = 4096):
+        self.buf = bytearray(size)
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self.buf):
+            # Nouveau tampon plutôt que extend() : un bytearray dont des memoryview sont encore tenues
+            # (payloads du client précédent) ne peut pas être redimensionné, elles restent valides sur l'ancien
+            self.buf = bytearray(max(size, 2 * len(self.buf)))
+
+    def _encode_section(self, offset: int, records: tuple, getters: tuple, field_mask, baseline: dict, current: dict) -> int:
+        buf = self.buf
+        count_at = offset
+        offset += COUNT.size
+        full_mask = len(records) - 1
+        full = records[full_mask]
+        pack_full = full.pack_into
+        full_size = full.size
+        if not baseline:
+            # Snapshot complet : un seul Struct pour tous les records
+            for eid, values in current.items():
+                pack_full(buf, offset, eid, full_mask, *values)
+                offset += full_size
+            COUNT.pack_into(buf, count_at, len(current))
+            COUNT.pack_into(buf, offset, 0)
+            return offset + COUNT.size
+
+        count = 0
+        for eid, values in current.items():
+            old = baseline.get(eid)
+            if old is None:
+                pack_full(buf, offset, eid, full_mask, *values)
+                offset += full_size
+            elif old is values or old == values:
+                continue
+            else:
+                mask = field_mask(old, values)
+                rec = records[mask]
+                rec.pack_into(buf, offset, eid, mask, *getters[mask](values))
+                offset += rec.size
+            count += 1
+        COUNT.pack_into(buf, count_at, count)
+
+        count_at = offset
+        offset += COUNT.size
+        count = 0
+        for eid in baseline:
+            if eid not in current:
+                ENTITY_ID.pack_into(buf, offset, eid)
+                offset += 4
+                count += 1
+        COUNT.pack_into(buf, count_at, count)
+        return offset
+
+    def encode_delta(self, seq: int, baseline_seq: int, baseline: tuple, current: tuple) -> memoryview:
+        """
+        Encodes a type 6 snapshot of 'current' (players, enemies) against 'baseline'.
+        baseline_seq == 0 means a full snapshot (empty baseline).
+        """
+        players, enemies = current
+        self._reserve(DELTA_HEADER.size + 4 * COUNT.size
+                      + len(players) * PLAYER_RECORDS[PLAYER_FULL].size + len(baseline[0]) * 4
+                      + len(enemies) * ENEMY_RECORDS[ENEMY_FULL].size + len(baseline[1]) * 4)
+        DELTA_HEADER.pack_into(self.buf, 0, 6, seq, baseline_seq)
+        offset = self._encode_section(DELTA_HEADER.size, PLAYER_RECORDS, PLAYER_GETTERS, player_mask, baseline[0], players)
+        offset = self._encode_section(offset, ENEMY_RECORDS, ENEMY_GETTERS, enemy_mask, baseline[1], enemies)
+        return memoryview(self.buf)[:offset]
+
+    @staticmethod
+    def _compact_changes(records: tuple, getters: tuple, field_mask, bits: int, baseline: dict, current: dict) -> tuple:
+        """Returns the changed records [((tag, Struct, values), size)] and the removed ids [(id, size)]"""
+        full_mask = len(records) - 1
+        full = records[full_mask]
+        changes = []
+        removed = []
+        if not baseline:
+            for eid, values in current.items():
+                tag = eid << bits | full_mask
+                changes.append(((tag, full, values), (tag.bit_length() + 6) // 7 + full.size))
+            return changes, removed
+
+        for eid, values in current.items():
+            old = baseline.get(eid)
+            if old is None:
+                mask = full_mask
+            elif old is values or old == values:
+                continue
+            else:
+                mask = field_mask(old, values)
+                values = getters[mask](values)
+            tag = eid << bits | mask
+            rec = records[mask]
+            changes.append(((tag, rec, values), (tag.bit_length() + 6) // 7 + rec.size))
+        for eid in baseline:
+            if eid not in current:
+                removed.append((eid, max(1, (eid.bit_length() + 6) // 7)))
+        return changes, removed
+
+    def encode_compact(self, seq: int, baseline_seq: int, baseline: tuple, current: tuple, quantizer: Quantizer,
+                       mtu: int = SNAPSHOT_MTU) -> list:
+        """
+        Encodes a type 8 snapshot of 'current' against 'baseline', both already quantized by 'quantizer',
+        as a list of parts of at most 'mtu' bytes (one datagram each).
+        baseline_seq == 0 means a full snapshot (empty baseline).
+        """
+        players, enemies = current
+        sections = (self._compact_changes(COMPACT_PLAYER_RECORDS, COMPACT_PLAYER_GETTERS, compact_player_mask,
+                                          COMPACT_PLAYER_BITS, baseline[0], players)
+                    + self._compact_changes(COMPACT_ENEMY_RECORDS, COMPACT_ENEMY_GETTERS, compact_enemy_mask,
+                                            COMPACT_ENEMY_BITS, baseline[1], enemies))
+
+        # Répartition des entrées dans les parts (4 compteurs varint de 3 octets max par part)
+        budget = mtu - COMPACT_HEADER.size - 4 * 3
+        parts = [([], [], [], [])]
+        room = budget
+        total = 0
+        for i, section in enumerate(sections):
+            for entry, size in section:
+                if size > room and room < budget:
+                    parts.append(([], [], [], []))
+                    room = budget
+                parts[-1][i].append(entry)
+                room -= size
+                total += size
+        if len(parts) > MAX_PARTS:
+            raise ValueError(f"snapshot trop gros : {len(parts)} parts")
+
+        self._reserve(total + len(parts) * (COMPACT_HEADER.size + 4 * MAX_VARINT_SIZE))
+        buf = self.buf
+        view = memoryview(buf)
+        res = []
+        offset = 0
+        for index, (player_records, player_removed, enemy_records, enemy_removed) in enumerate(parts):
+            start = offset
+            COMPACT_HEADER.pack_into(buf, offset, 8, seq, baseline_seq, quantizer.origin_x, quantizer.origin_y,
+                                     quantizer.shift, index, len(parts))
+            offset += COMPACT_HEADER.size
+            for records, removed in ((player_records, player_removed), (enemy_records, enemy_removed)):
+                offset = _write_varint(buf, offset, len(records))
+                for tag, rec, values in records:
+                    offset = _write_varint(buf, offset, tag)
+                    rec.pack_into(buf, offset, *values)
+                    offset += rec.size
+                offset = _write_varint(buf, offset, len(removed))
+                for eid in removed:
+                    offset = _write_varint(buf, offset, eid)
+            res.append(view[start:offset])
+        return res
+
+    def encode_legacy(self, state: tuple) -> memoryview:
+        """
+        Encodes a type 2 snapshot (historical format with 15 bytes names).
+        Its counts are single bytes: only the first 255 players / enemies are sent.
+        """
+        players, enemies = state
+        if len(players) > LEGACY_MAX_ENTITIES:
+            players = dict(islice(players.items(), LEGACY_MAX_ENTITIES))
+        if len(enemies) > LEGACY_MAX_ENTITIES:
+            enemies = dict(islice(enemies.items(), LEGACY_MAX_ENTITIES))
+        buf = self.buf
+        self._reserve(LEGACY_HEADER.size + 1 + len(players) * LEGACY_PLAYER.size + len(enemies) * LEGACY_ENEMY.size)
+        LEGACY_HEADER.pack_into(buf, 0, 2, len(players))
+        offset = LEGACY_HEADER.size
+        for pid, (x, y, action, flip, weapon_id, vx, vy) in players.items():
+            LEGACY_PLAYER.pack_into(buf, offset, pid, x, y, vx, vy, ACTION_BYTES[action], flip, weapon_id)
+            offset += LEGACY_PLAYER.size
+        LEGACY_COUNT.pack_into(buf, offset, len(enemies))
+        offset += 1
+        for eid, (x, y, flip, state) in enemies.items():
+            LEGACY_ENEMY.pack_into(buf, offset, eid, x, y, flip, ENEMY_STATE_BYTES[state])
+            offset += LEGACY_ENEMY.size
+        return memoryview(buf)[:offset]
+
+
+def _decode_section(view: memoryview, offset: int, records: tuple) -> tuple:
+    changed = []
+    count = COUNT.unpack_from(view, offset)[0]
+    offset += COUNT.size
+    for _ in range(count):
+        rec = records[view[offset + 4]]
+        raw = rec.unpack_from(view, offset)
+        offset += rec.size
+        changed.append((raw[0], raw[1], raw[2:]))
+    removed = []
+    count = COUNT.unpack_from(view, offset)[0]
+    offset += COUNT.size
+    if count:
+        removed = list(struct.unpack_from(f"<{count}I", view, offset))
+        offset += 4 * count
+    return changed, removed, offset
+
+
+def decode_delta(data) -> tuple:
+    """
+    Decodes a type 6 snapshot.
+    Returns (seq, baseline_seq, (players_changed, players_removed), (enemies_changed, enemies_removed)),
+    each changed entity being (id, mask, values of the fields present in the mask).
+    """
+    view = memoryview(data)
+    _, seq, baseline_seq = DELTA_HEADER.unpack_from(view, 0)
+    players_changed, players_removed, offset = _decode_section(view, DELTA_HEADER.size, PLAYER_RECORDS)
+    enemies_changed, enemies_removed, offset = _decode_section(view, offset, ENEMY_RECORDS)
+    return seq, baseline_seq, (players_changed, players_removed), (enemies_changed, enemies_removed)
+
+
+def _decode_compact_section(view: memoryview, offset: int, records: tuple, bits: int) -> tuple:
+    low = (1 << bits) - 1
+    changed = []
+    count, offset = _read_varint(view, offset)
+    for _ in range(count):
+        tag, offset = _read_varint(view, offset)
+        mask = tag & low
+        rec = records[mask]
+        changed.append((tag >> bits, mask, rec.unpack_from(view, offset)))
+        offset += rec.size
+    removed = []
+    count, offset = _read_varint(view, offset)
+    for _ in range(count):
+        eid, offset = _read_varint(view, offset)
+        removed.append(eid)
+    return changed, removed, offset
+
+
+def decode_compact(data) -> tuple:
+    """
+    Decodes one part of a type 8 snapshot.
+    Returns (seq, baseline_seq, quantizer, part, parts, (players_changed, players_removed),
+    (enemies_changed, enemies_removed)), the values staying quantized (see Quantizer.dequantize_*).
+    """
+    view = memoryview(data)
+    _, seq, baseline_seq, origin_x, origin_y, shift, part, parts = COMPACT_HEADER.unpack_from(view, 0)
+    players_changed, players_removed, offset = _decode_compact_section(
+        view, COMPACT_HEADER.size, COMPACT_PLAYER_RECORDS, COMPACT_PLAYER_BITS)
+    enemies_changed, enemies_removed, offset = _decode_compact_section(
+        view, offset, COMPACT_ENEMY_RECORDS, COMPACT_ENEMY_BITS)
+    return (seq, baseline_seq, Quantizer(origin_x, origin_y, shift), part, parts,
+            (players_changed, players_removed), (enemies_changed, enemies_removed))
+
+
+def decode_legacy(data) -> tuple:
+    """
+    Decodes a type 2 snapshot into (players, enemies), ignoring truncated records.
+    'enemies' is None when the packet stops before the enemies section.
+    """
+    view = memoryview(data)
+    players = {}
+    if len(view) < 2:
+        return players, None
+    count = view[1]
+    offset = 2
+    for _ in range(count):
+        if len(view) < offset + LEGACY_PLAYER.size:
+            return players, None
+        pid, x, y, vx, vy, action, flip, weapon_id = LEGACY_PLAYER.unpack_from(view, offset)
+        players[pid] = (x, y, action.rstrip(b'\x00').decode('utf-8'), flip, weapon_id, vx, vy)
+        offset += LEGACY_PLAYER.size
+    if len(view) < offset + 1:
+        return players, None
+    enemies = {}
+    count = view[offset]
+    offset += 1
+    for _ in range(count):
+        if len(view) < offset + LEGACY_ENEMY.size:
+            break
+        eid, x, y, flip, state = LEGACY_ENEMY.unpack_from(view, offset)
+        enemies[eid] = (x, y, flip, state.rstrip(b'\x00').decode('utf-8'))
+        offset += LEGACY_ENEMY.size
+    return players, enemies
+
+
+def apply_delta(baseline: dict, changed: list, removed: list, record_fields: tuple) -> dict:
+    """Rebuilds a {id: tuple} state from a baseline and a decoded delta."""
+    state = dict(baseline)
+    apply_delta_into(state, changed, removed, record_fields)
+    return state
+
+
+def apply_delta_into(state: dict, changed: list, removed: list, record_fields: tuple) -> None:
+    """Applies a decoded delta (or one part of it) to 'state' in place."""
+    for eid in removed:
+        state.pop(eid, None)
+    full_mask = len(record_fields) - 1
+    for eid, mask, values in changed:
+        old = state.get(eid)
+        if old is None or mask == full_mask:
+            state[eid] = values
+        else:
+            merged = list(old)
+            for i, v in zip(record_fields[mask], values):
+                merged[i] = v
+            state[eid] = tuple(merged)
+
+
+def apply_players_delta(baseline: dict, changed: list, removed: list) -> dict:
+    return apply_delta(baseline, changed, removed, PLAYER_RECORD_FIELDS)
+
+
+def apply_enemies_delta(baseline: dict, changed: list, removed: list) -> dict:
+    return apply_delta(baseline, changed, removed, ENEMY_RECORD_FIELDS)
+
+
+def apply_players_into(state: dict, changed: list, removed: list) -> None:
+    apply_delta_into(state, changed, removed, PLAYER_RECORD_FIELDS)
+
+
+def apply_enemies_into(state: dict, changed: list, removed: list) -> None:
+    apply_delta_into(state, changed, removed, ENEMY_RECORD_FIELDS)
+
+
+def apply_compact_players_into(state: dict, changed: list, removed: list) -> None:
+    apply_delta_into(state, changed, removed, COMPACT_PLAYER_RECORD_FIELDS)
+
+
+def apply_compact_enemies_into(state: dict, changed: list, removed: list) -> None:
+    apply_delta_into(state, changed, removed, COMPACT_ENEMY_RECORD_FIELDS)
+
+
+def named_players(players: dict) -> dict:
+    """Wire players -> (x, y, action, flip, weapon_id, vx, vy) as used by the game"""
+    return {pid: (x, y, ACTIONS[a] if a < len(ACTIONS) else 'idle', flip, w, vx, vy)
+            for pid, (x, y, a, flip, w, vx, vy) in players.items()}
+
+
+def named_enemies(enemies: dict) -> dict:
+    """Wire enemies -> (x, y, flip, state) as used by the game"""
+    return {eid: (x, y, flip, ENEMY_STATES[s] if s < len(ENEMY_STATES) else 'idle')
+            for eid, (x, y, flip, s) in enemies.items()}
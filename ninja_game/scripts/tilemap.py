@@ -1,7 +1,10 @@
 import json
 import random
+import numpy as np
 import pygame
 from scripts.grass import GrassManager  
+from scripts import chunks, mapfile
+from scripts.collision import RectIndex, merge_rects
 import sys, os
 
 def resource_path(relative_path):
@@ -27,6 +30,9 @@ AUTOTILE_MAP = {
 NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone'}
 AUTOTILE_TYPES = {'grass', 'stone'}
+CHUNK_BUDGET = 16 * 1024 * 1024   # octets de tuiles gardés en mémoire pour une map streamée
+TILE_BYTES = 400                  # estimation d'une tuile du dict (clé, dict, liste pos)
+STREAM_MARGIN = 256               # px chargés autour de la caméra
 
 
 class Tilemap:
@@ -35,6 +41,13 @@ class Tilemap:
         self.tile_size = tile_size
         self.tilemap = {}
         self.offgrid_tiles = []
+        # Map streamée (scripts/chunks.py) : self.tilemap ne contient que les chunks chargés
+        self.chunks = None
+        self.grid_objects = {}  # tuiles de grille de chunks.OBJECT_TYPES, connues sans charger les chunks
+        self.removed = set()    # tuiles retirées par extract, à ne pas remettre quand leur chunk revient
+        # Rects de collision fusionnés (scripts/collision.py) : construits à la première requête,
+        # ou chunk par chunk pour une map streamée ; à remettre à None si self.tilemap est modifié
+        self.collision = None
 
         #gestionnaire d’herbe héhé
         self.grass_manager = GrassManager(resource_path("data/images/grass"),
@@ -53,15 +66,21 @@ class Tilemap:
                 if not keep:
                     self.offgrid_tiles.remove(tile)
                     
-        for loc in list(self.tilemap.keys()):
-            tile = self.tilemap[loc]
+        grid_tiles = self.tilemap if self.chunks is None else self.grid_objects
+        for loc in list(grid_tiles.keys()):
+            tile = grid_tiles[loc]
             if (tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 matches[-1]['pos'] = matches[-1]['pos'].copy()
                 matches[-1]['pos'][0] *= self.tile_size
                 matches[-1]['pos'][1] *= self.tile_size
                 if not keep:
-                    del self.tilemap[loc]
+                    del grid_tiles[loc]
+                    if tile['type'] in PHYSICS_TILES and self.chunks is None:
+                        self.collision = None
+                    if self.chunks is not None:
+                        self.tilemap.pop(loc, None)
+                        self.removed.add(loc)
         
         return matches
     
@@ -69,6 +88,8 @@ class Tilemap:
     def tiles_around(self, pos):
         tiles = []
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if self.chunks is not None:
+            self.stream((pos[0] - self.tile_size, pos[1] - self.tile_size, 2 * self.tile_size, 2 * self.tile_size), margin=0)
         for offset in NEIGHBOR_OFFSETS:
             check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
             if check_loc in self.tilemap:
@@ -82,21 +103,86 @@ class Tilemap:
         f.close()
         
         
-    def load(self, path):
-        f = open(resource_path(path), 'r')
-        map_data = json.load(f)
-        f.close()
-        
-        self.tilemap = map_data['tilemap']
-        self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+    def load(self, path, streaming=True):
+        # Les chunks (scripts/chunks.py) d'une grande map, chargés autour de la caméra,
+        # sinon le .map compilé (scripts/mapfile.py) s'il est à jour, sinon le JSON
+        chunk_file = chunks.open_fresh(resource_path(path)) if streaming else None
+        map_file = mapfile.open_fresh(resource_path(path)) if chunk_file is None else None
+        grass_tiles = None
+        self.chunks = None
+        self.grid_objects = {}
+        self.removed = set()
+        self.collision = None
+        if chunk_file is not None:
+            self.tile_size = chunk_file.tile_size
+            self.tilemap = {}
+            self.offgrid_tiles, grid = chunk_file.object_list()
+            self.grid_objects = {f"{tile['pos'][0]};{tile['pos'][1]}": tile for tile in grid}
+            self.chunks = chunks.ChunkCache(chunk_file, CHUNK_BUDGET, self.load_chunk, self.unload_chunk)
+            self.collision = RectIndex()
+            grass_tiles = []  # l'herbe est posée chunk par chunk
+        elif map_file is not None:
+            self.tile_size = map_file.tile_size
+            self.tilemap = map_file.tilemap_dict()
+            self.offgrid_tiles = map_file.offgrid_list()
+            grass_tiles = map_file.grid_tiles('grass', 1).tolist()
+        else:
+            f = open(resource_path(path), 'r')
+            map_data = json.load(f)
+            f.close()
+
+            self.tilemap = map_data['tilemap']
+            self.tile_size = map_data['tile_size']
+            self.offgrid_tiles = map_data['offgrid']
 
         # 🌿 AJOUT — générer l’herbe après chargement
         # On vide l'herbe précédente
         if hasattr(self.grass_manager, 'grass_tiles'):
             self.grass_manager.grass_tiles.clear() # Try clear if list/dict
             
-        self.generate_grass()
+        self.generate_grass(grass_tiles)
+
+    def load_chunk(self, cx, cy, types, variants):
+        """Ajoute les tuiles d'un chunk au dict (avec leur herbe et leurs rects de collision), renvoie ((cx, cy), clés ajoutées) et les octets estimés"""
+        chunk_size = self.chunks.file.chunk_size
+        names = self.chunks.file.type_names
+        gy, gx = np.nonzero(types)
+        locs = []
+        grass_tiles = []
+        solid = np.zeros(types.shape, dtype=bool)
+        for x, y, t, v in zip((gx + cx * chunk_size).tolist(), (gy + cy * chunk_size).tolist(),
+                              types[gy, gx].tolist(), variants[gy, gx].tolist()):
+            loc = f"{x};{y}"
+            if loc in self.removed:
+                continue
+            tile_type = names[t - 1]
+            self.tilemap[loc] = {'type': tile_type, 'variant': v, 'pos': [x, y]}
+            locs.append(loc)
+            if tile_type == 'grass' and v == 1:
+                grass_tiles.append((x, y))
+            if tile_type in PHYSICS_TILES:
+                solid[y - cy * chunk_size, x - cx * chunk_size] = True
+        self.generate_grass(grass_tiles)
+        self.collision.add(merge_rects(solid, (cx * chunk_size, cy * chunk_size), self.tile_size), owner=(cx, cy))
+        return ((cx, cy), locs), len(locs) * TILE_BYTES
+
+    def unload_chunk(self, chunk):
+        key, locs = chunk
+        self.collision.remove(key)
+        for loc in locs:
+            tile = self.tilemap.pop(loc, None)
+            if tile is not None and tile['type'] == 'grass' and tile['variant'] == 1:
+                self.grass_manager.grass_tiles.pop((tile['pos'][0], tile['pos'][1] - 1), None)
+
+    def stream(self, rect, margin=STREAM_MARGIN):
+        """Charge les chunks qui recouvrent 'rect' (x, y, largeur, hauteur en pixels) à 'margin' près, si la map est streamée"""
+        if self.chunks is None:
+            return
+        span = self.tile_size * self.chunks.file.chunk_size
+        x, y, w, h = rect
+        for cy in range(int((y - margin) // span), int((y + h + margin) // span) + 1):
+            for cx in range(int((x - margin) // span), int((x + w + margin) // span) + 1):
+                self.chunks.get(cx, cy)
         
         
     def solid_check(self, pos):
@@ -106,12 +192,31 @@ class Tilemap:
                 return self.tilemap[tile_loc]
     
     
+    def build_collision(self):
+        """Fusionne les tuiles solides de self.tilemap en rects de collision indexés"""
+        self.collision = RectIndex()
+        positions = [tile['pos'] for tile in self.tilemap.values() if tile['type'] in PHYSICS_TILES]
+        if not positions:
+            return
+        xs = np.array([p[0] for p in positions], dtype=np.int64)
+        ys = np.array([p[1] for p in positions], dtype=np.int64)
+        origin = (int(xs.min()), int(ys.min()))
+        solid = np.zeros((int(ys.max()) - origin[1] + 1, int(xs.max()) - origin[0] + 1), dtype=bool)
+        solid[ys - origin[1], xs - origin[0]] = True
+        self.collision.add(merge_rects(solid, origin, self.tile_size))
+
+    def physics_rects(self, area):
+        """Rects de collision (partagés, à ne pas modifier) des cases de l'index couvertes par 'area' (pygame.Rect)"""
+        if self.chunks is not None:
+            self.stream(area, margin=0)
+        elif self.collision is None:
+            self.build_collision()
+        return self.collision.query(area)
+
     def physics_rects_around(self, pos):
-        rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
-        return rects
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        return self.physics_rects(pygame.Rect((tile_loc[0] - 1) * self.tile_size, (tile_loc[1] - 1) * self.tile_size,
+                                              3 * self.tile_size, 3 * self.tile_size))
     
     
     def autotile(self):
@@ -128,18 +233,21 @@ class Tilemap:
                 tile['variant'] = AUTOTILE_MAP[neighbors]
 
     
-    def generate_grass(self):
-        for loc, tile in self.tilemap.items():
-            if tile['type'] == 'grass' and tile['variant'] == 1:
-                # position en TUILES
-                pos = (tile['pos'][0], tile['pos'][1] - 1)  # léger décalage vers le haut
-                density = random.randint(3, 7)
-                self.grass_manager.place_tile(pos, density, [0, 1, 2])
+    def generate_grass(self, grass_tiles=None):
+        # grass_tiles : positions des tuiles grass variant 1 déjà connues (.map), sinon on parcourt la tilemap
+        if grass_tiles is None:
+            grass_tiles = [tile['pos'] for tile in self.tilemap.values() if tile['type'] == 'grass' and tile['variant'] == 1]
+        for x, y in grass_tiles:
+            # position en TUILES
+            pos = (x, y - 1)  # léger décalage vers le haut
+            density = random.randint(3, 7)
+            self.grass_manager.place_tile(pos, density, [0, 1, 2])
 
 
     
     # 🌿 MODIFIÉ — ajout du paramètre dt
     def render(self, surf, offset=(0, 0), dt=0):
+        self.stream((offset[0], offset[1], surf.get_width(), surf.get_height()))
         for tile in self.offgrid_tiles:
             surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
             
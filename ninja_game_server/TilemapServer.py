@@ -1,26 +1,76 @@
 import json
+import os
+import sys
+
+import numpy as np
+
+from distance_field import DistanceField
+from visibility import VisibilityTable
+
+# Format binaire des maps, partagé avec le client (ninja_game/scripts/mapfile.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../ninja_game/scripts')))
+import chunks
+import mapfile
 
 PHYSICS_TILES = {'grass', 'stone'}
+CHUNK_BUDGET = 64 * 1024 * 1024     # octets de chunks gardés en mémoire par une map streamée
+STREAM_RADIUS = 2                   # chunks chargés autour de chaque joueur, en plus du sien
 
 class TilemapServer:
     def __init__(self, tile_size=16):
         self.tile_size = tile_size
         self.tilemap = {}
-    
-    def load(self, path):
-        """Charge la map depuis le JSON généré par le client."""
-        with open(path, 'r') as f:
-            map_data = json.load(f)
-        
+        self.spawners = []
+        self.visibility = None  # VisibilityTable, seulement pour les maps chargées depuis un fichier
+        self.compile()
+
+    def load(self, path, map_data=None):
+        """
+        Charge la map 'path' (JSON généré par l'éditeur) : depuis son fichier binaire .map s'il est à jour,
+        sinon depuis le JSON ('map_data' s'il est déjà lu), le .map étant alors réécrit pour les chargements suivants.
+        """
+        map_file = mapfile.open_fresh(path) if map_data is None else None
+        if map_file is not None:
+            self.load_binary(map_file)
+        else:
+            self.load_json(path, map_data)
+        self.visibility = VisibilityTable.for_map(self, path)
+
+    def load_binary(self, map_file):
+        """Grilles lues dans le .map (numpy.memmap copié), sans dict de tuiles."""
+        self.tilemap = {}
+        self.tile_size = map_file.tile_size
+        self.spawners = []
+        if 'spawners' in map_file.type_names:
+            spawner_type = map_file.type_names.index('spawners')
+            for t, variant, x, y in map_file.offgrid.tolist():
+                if t == spawner_type:
+                    self.spawners.append({'type': 'spawners', 'variant': variant, 'pos': [x, y]})
+            for tx, ty in map_file.grid_tiles('spawners').tolist():
+                variant = int(map_file.variants[ty - map_file.origin[1], tx - map_file.origin[0]])
+                self.spawners.append({'type': 'spawners', 'variant': variant,
+                                      'pos': [tx * self.tile_size, ty * self.tile_size]})
+        self.type_names = map_file.type_names
+        self.origin = map_file.origin
+        # Copie : la map reste chargée toute la vie du serveur (MapCatalog) et un memmap ouvert
+        # empêcherait sous Windows de remplacer le .map (sauvegarde de l'éditeur, recompilation)
+        self.types = np.array(map_file.types)
+        self.index()
+
+    def load_json(self, path, map_data=None):
+        if map_data is None:
+            with open(path, 'r') as f:
+                map_data = json.load(f)
+
         self.tilemap = map_data['tilemap']
         self.tile_size = map_data['tile_size']
-        
+
         self.spawners = []
         if 'offgrid' in map_data:
             for item in map_data['offgrid']:
                 if item['type'] == 'spawners':
                     self.spawners.append(item)
-                    
+
         # Check grid tiles for spawners
         for loc, tile in self.tilemap.items():
             if tile['type'] == 'spawners':
@@ -30,13 +80,113 @@ class TilemapServer:
                 spawner['pos'] = [tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size]
                 self.spawners.append(spawner)
 
+        self.compile()
+        try:
+            mapfile.write(mapfile.binary_path(path), self.tile_size, self.tilemap, map_data.get('offgrid', []),
+                          source=path)
+        except (OSError, ValueError) as e:
+            print(f"Map binaire non écrite ({path}) : {e}")
+
+    def compile(self):
+        """
+        Compile self.tilemap en grilles denses indexées [ty - origin_y, tx - origin_x] :
+        'types' (uint8, 0 = vide, sinon indice dans type_names + 1) et 'solid' (bool).
+        Le dict "x;y" ne sert plus qu'aux métadonnées ; à rappeler s'il est modifié à la main.
+        """
+        tiles = list(self.tilemap.values())
+        self.type_names = sorted({tile['type'] for tile in tiles})
+        if len(self.type_names) > 255:
+            raise ValueError("too many tile types for a uint8 grid")
+        if not tiles:
+            self.origin = (0, 0)
+            self.types = np.zeros((0, 0), dtype=np.uint8)
+        else:
+            xs = np.array([tile['pos'][0] for tile in tiles], dtype=np.int64)
+            ys = np.array([tile['pos'][1] for tile in tiles], dtype=np.int64)
+            type_ids = {name: i + 1 for i, name in enumerate(self.type_names)}
+            self.origin = (int(xs.min()), int(ys.min()))
+            self.types = np.zeros((int(ys.max()) - self.origin[1] + 1, int(xs.max()) - self.origin[0] + 1), dtype=np.uint8)
+            self.types[ys - self.origin[1], xs - self.origin[0]] = [type_ids[tile['type']] for tile in tiles]
+        self.index()
+
+    def index(self):
+        """Grille solide et copies en listes, à partir de 'types' / 'type_names' / 'origin'."""
+        solid_ids = [i + 1 for i, name in enumerate(self.type_names) if name in PHYSICS_TILES]
+        self.solid = np.isin(self.types, solid_ids)
+        self.height, self.width = self.types.shape
+        # Copies en listes Python pour les requêtes unitaires (plus rapides que l'indexation NumPy scalaire)
+        self.type_rows = self.types.tolist()
+        self.solid_rows = self.solid.tolist()
+        # Distance signée aux murs (distance_field.py) : dégagement en O(1), unstuck, sphere tracing
+        self.distance_field = DistanceField(self)
+
+    def stream(self, positions):
+        """Chunks à garder chargés autour des joueurs : rien à faire, la grille est entière en mémoire."""
+
+    def bounds(self):
+        """Bornes en pixels (min_x, min_y, max_x, max_y) des tiles de la grille."""
+        if not self.types.size:
+            return (0, 0, 0, 0)
+        return (self.origin[0] * self.tile_size, self.origin[1] * self.tile_size,
+                (self.origin[0] + self.width) * self.tile_size, (self.origin[1] + self.height) * self.tile_size)
+
+    def is_solid(self, tx, ty):
+        """Vérifie si la tuile (tx, ty) (coordonnées en tuiles) est solide."""
+        gx = tx - self.origin[0]
+        gy = ty - self.origin[1]
+        return 0 <= gx < self.width and 0 <= gy < self.height and self.solid_rows[gy][gx]
+
     def solid_check(self, pos):
         """Vérifie si une position est dans une tuile solide."""
-        tile_loc = f"{int(pos[0] // self.tile_size)};{int(pos[1] // self.tile_size)}"
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return True
-        return False
+        return self.is_solid(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+
+    def solid_check_many(self, points):
+        """solid_check pour un tableau de positions en pixels de forme (..., 2), renvoie un tableau de bool (...)."""
+        points = np.asarray(points, dtype=np.float64)
+        gx = np.floor(points[..., 0] / self.tile_size).astype(np.int64) - self.origin[0]
+        gy = np.floor(points[..., 1] / self.tile_size).astype(np.int64) - self.origin[1]
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        res = np.zeros(inside.shape, dtype=bool)
+        res[inside] = self.solid[gy[inside], gx[inside]]
+        return res
+
+    def segments_clear(self, ox, oy, tx, ty, stop=0.0):
+        """
+        Pour des tableaux de segments (ox, oy) -> (tx, ty) en pixels, vérifie qu'aucune tuile solide
+        n'est traversée avant 'stop' pixels de la cible (comme raycast_grid, sans pas fixe) : les distances
+        où chaque rayon croise une frontière de tuile sont triées et chaque morceau est testé en son milieu.
+        Un segment plus court que 'stop' est toujours dégagé.
+        """
+        ox, oy, tx, ty = (np.asarray(v, dtype=np.float64) for v in (ox, oy, tx, ty))
+        if len(ox) == 0:
+            return np.ones(0, dtype=bool)
+        ts = self.tile_size
+        dx = tx - ox
+        dy = ty - oy
+        a = np.arctan2(dy, dx)
+        cos_a, sin_a = np.cos(a), np.sin(a)
+        dist_max = np.hypot(dx, dy) - stop
+        active = dist_max >= 0
+        dist_max = np.maximum(dist_max, 0)
+
+        def crossings(o, d):
+            """Distances le long de chaque rayon des frontières croisées sur un axe (complété par inf)"""
+            start = np.floor(o / ts)
+            count = np.abs(np.floor((o + d * dist_max) / ts) - start).astype(np.int64)
+            k = np.arange(max(1, int(count.max())))
+            border = np.where(d[:, None] > 0, start[:, None] + 1 + k[None, :], start[:, None] - k[None, :]) * ts
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (border - o[:, None]) / d[:, None]
+            return np.where(k[None, :] < count[:, None], t, np.inf)
+
+        t = np.concatenate((np.zeros((len(ox), 1)), crossings(ox, cos_a), crossings(oy, sin_a),
+                            dist_max[:, None]), axis=1)
+        t.sort(axis=1)
+        valid = np.isfinite(t[:, 1:])
+        mid = np.where(valid, (t[:, :-1] + np.where(valid, t[:, 1:], 0)) / 2, 0)
+        points = np.stack((ox[:, None] + cos_a[:, None] * mid, oy[:, None] + sin_a[:, None] * mid), axis=-1)
+        hit = self.solid_check_many(points) & valid
+        return ~(hit.any(axis=1) & active)
 
     def rects_around(self, pos):
         """Retourne les rectangles de collision autour d'une position."""
@@ -44,15 +194,131 @@ class TilemapServer:
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         for x in range(tile_loc[0] - 1, tile_loc[0] + 2):
             for y in range(tile_loc[1] - 1, tile_loc[1] + 2):
-                loc = f"{x};{y}"
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    if tile['type'] in PHYSICS_TILES:
-                        rects.append(((x * self.tile_size, y * self.tile_size),
-                                      self.tile_size, self.tile_size))
+                if self.is_solid(x, y):
+                    rects.append(((x * self.tile_size, y * self.tile_size),
+                                  self.tile_size, self.tile_size))
         return rects
-    
+
+    def tile_type(self, tx, ty):
+        """Type de la tuile de la grille en (tx, ty) (coordonnées en tuiles), None si vide."""
+        gx = tx - self.origin[0]
+        gy = ty - self.origin[1]
+        if 0 <= gx < self.width and 0 <= gy < self.height:
+            type_id = self.type_rows[gy][gx]
+            if type_id:
+                return self.type_names[type_id - 1]
+        return None
+
     def check_type(self, pos):
-        tile_loc = f"{int(pos[0] // self.tile_size)};{int(pos[1] // self.tile_size)}"
-        if tile_loc in self.tilemap:
-            return self.tilemap[tile_loc]['type']
\ No newline at end of file
+        return self.tile_type(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+
+
+class StreamingTilemapServer(TilemapServer):
+    """
+    Map découpée en chunks (ninja_game/scripts/chunks.py) : les chunks sont lus à la demande par les
+    requêtes de collision / type / raycast et gardés dans un LRU de 'budget' octets.
+    Pas de grille dense (width = height = 0) donc ni table de visibilité, ni champ de flux, ni champ de
+    distance : les ennemis retombent sur le lancer de rayons, la poursuite directe et la recherche par sondes.
+    """
+    def __init__(self, chunk_file, budget=CHUNK_BUDGET):
+        super().__init__(chunk_file.tile_size)
+        self.type_names = chunk_file.type_names
+        self.chunk_size = chunk_file.chunk_size
+        self.tile_bounds = chunk_file.tile_bounds
+        solid = np.zeros(256, dtype=bool)
+        solid[[i + 1 for i, name in enumerate(self.type_names) if name in PHYSICS_TILES]] = True
+        self.solid_lut = solid
+        self.distance_field = None
+        self.chunks = chunks.ChunkCache(chunk_file, budget, self.load_chunk)
+        # Lecture directe des chunks chargés ; l'ordre du LRU n'est rafraîchi que par stream() et les défauts
+        self.loaded = self.chunks.loaded
+
+        offgrid, grid = chunk_file.object_list()
+        self.spawners = [tile for tile in offgrid if tile['type'] == 'spawners']
+        for tile in grid:
+            if tile['type'] == 'spawners':
+                self.spawners.append({'type': 'spawners', 'variant': tile['variant'],
+                                      'pos': [tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size]})
+
+    def load_chunk(self, cx, cy, types, variants):
+        """(lignes de types, lignes solides, grille solide) d'un chunk et sa taille en octets."""
+        solid = self.solid_lut[types]
+        type_rows = types.tolist()
+        solid_rows = solid.tolist()
+        nbytes = solid.nbytes + sum(sys.getsizeof(row) for row in type_rows) * 2 + sys.getsizeof(type_rows) * 2
+        return (type_rows, solid_rows, solid), nbytes
+
+    def stream(self, positions):
+        """Charge (ou garde en tête du LRU) les chunks à STREAM_RADIUS chunks autour de chaque position en pixels."""
+        span = self.tile_size * self.chunk_size
+        for x, y in positions:
+            cx, cy = int(x // span), int(y // span)
+            for ny in range(cy - STREAM_RADIUS, cy + STREAM_RADIUS + 1):
+                for nx in range(cx - STREAM_RADIUS, cx + STREAM_RADIUS + 1):
+                    self.chunks.get(nx, ny)
+
+    def bounds(self):
+        ts = self.tile_size
+        min_x, min_y, max_x, max_y = self.tile_bounds
+        return (min_x * ts, min_y * ts, max_x * ts, max_y * ts)
+
+    def is_solid(self, tx, ty):
+        cs = self.chunk_size
+        cx = tx // cs
+        cy = ty // cs
+        chunk = self.loaded.get((cx, cy)) or self.chunks.get(cx, cy)
+        return chunk is not None and chunk[1][ty % cs][tx % cs]
+
+    def tile_type(self, tx, ty):
+        cs = self.chunk_size
+        cx = tx // cs
+        cy = ty // cs
+        chunk = self.loaded.get((cx, cy)) or self.chunks.get(cx, cy)
+        if chunk is not None:
+            type_id = chunk[0][ty % cs][tx % cs]
+            if type_id:
+                return self.type_names[type_id - 1]
+        return None
+
+    def solid_check_many(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        tx = np.floor(points[..., 0] / self.tile_size).astype(np.int64)
+        ty = np.floor(points[..., 1] / self.tile_size).astype(np.int64)
+        cx, gx = np.divmod(tx, self.chunk_size)
+        cy, gy = np.divmod(ty, self.chunk_size)
+        res = np.zeros(tx.shape, dtype=bool)
+        # Un accès au LRU par chunk distinct touché, puis indexation vectorisée dans chacun
+        keys = np.stack((cx.ravel(), cy.ravel()), axis=1)
+        if not len(keys):
+            return res
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(tx.shape)
+        for i, (kx, ky) in enumerate(unique.tolist()):
+            chunk = self.chunks.get(kx, ky)
+            if chunk is not None:
+                mask = inverse == i
+                res[mask] = chunk[2][gy[mask], gx[mask]]
+        return res
+
+
+def load_map(path):
+    """
+    TilemapServer de la map 'path' : un StreamingTilemapServer si elle a un .chunks à jour ou si sa grille
+    dense dépasserait chunks.STREAM_MIN_CELLS cases (le .chunks est alors écrit), sinon des grilles denses.
+    """
+    chunk_file = chunks.open_fresh(path)
+    if chunk_file is None:
+        map_data = None
+        map_file = mapfile.open_fresh(path)
+        if map_file is None or map_file.width * map_file.height > chunks.STREAM_MIN_CELLS:
+            with open(path, 'r') as f:
+                map_data = json.load(f)
+            if chunks.grid_cells(map_data['tilemap']) > chunks.STREAM_MIN_CELLS:
+                chunks.write(chunks.chunk_path(path), map_data['tile_size'], map_data['tilemap'],
+                             map_data.get('offgrid', []), source=path)
+                chunk_file = chunks.open_fresh(path)
+        if chunk_file is None:
+            tilemap = TilemapServer()
+            tilemap.load(path, map_data)
+            return tilemap
+    return StreamingTilemapServer(chunk_file)
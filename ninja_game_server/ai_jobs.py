@@ -0,0 +1,142 @@
+import heapq
+import time
+
+# File de travaux coûteux de l'IA (rayons de ligne de vue hors de la table de
+# visibilité, recherche de la position d'apparition d'un blob, nouvelle position
+# d'errance). Les ennemis soumettent un travail au lieu de le faire tout de suite ;
+# EnemyManager.update en exécute à la fin du tick, les plus proches des joueurs
+# d'abord, jusqu'à épuiser le budget de temps. Le résultat sert aux ticks suivants :
+# un pic d'ennemis allonge la file au lieu d'allonger le tick.
+#
+# Un travail accepté est toujours exécuté. Quand la file contient déjà plus de
+# MAX_QUEUE_TICKS ticks de budget (estimés d'après la durée moyenne des derniers
+# travaux), les nouveaux sont refusés : l'appelant garde sa dernière réponse
+# (ligne de vue, position d'errance) et redemande au tick suivant.
+# Un travail peut aussi être annulé (cancel) ou expirer (tick limite à la soumission) :
+# une réponse trop tardive ne sert plus, l'appelant qui ne peut plus attendre la
+# calcule lui-même (voir MAX_LOS_WAIT dans enemy_manager.py).
+
+AI_JOB_BUDGET = 0.002     # s de travaux par tick (le tick dure 1/60 s), 0 = tout de suite comme avant
+MAX_QUEUE_TICKS = 30      # ticks de budget en attente au-delà desquels les nouveaux travaux sont refusés
+MAX_BACKLOG = 2048        # travaux en attente au plus, tant que leur durée n'est pas encore mesurée
+AGING = 16                # priorité gagnée par tick d'attente (px pour les ennemis) : les travaux lointains passent aussi
+JOB_COST_SMOOTHING = 0.25 # poids de chaque tick dans la moyenne glissante de la durée d'un travail
+STATS_WINDOW = 600        # travaux exécutés gardés pour les statistiques de latence
+
+
+class AIJobQueue:
+    """
+    Priority queue of deferred AI work. A job is a callable and its arguments, identified by a
+    key: submitting a key that is still pending does nothing. Lower priorities run first, each
+    tick waited counting as AGING less.
+    New jobs are rejected while the pending ones would take more than MAX_QUEUE_TICKS budgets.
+    A pending job can be cancelled, or expire when it did not run by the tick given to submit();
+    its heap entry is then skipped when popped.
+    """
+    def __init__(self, budget: float = AI_JOB_BUDGET):
+        self.budget = budget
+        self.heap = []            # (priorité, numéro, clé)
+        self.pending = {}         # clé -> (job, args, instant de soumission, tick de soumission, numéro, tick limite)
+        self.counter = 0
+        self.tick = 0
+        self.job_cost = 0.0       # s, moyenne glissante de la durée d'un travail (0 : pas encore mesurée)
+        # Statistiques
+        self.submitted = 0
+        self.processed = 0
+        self.rejected = 0
+        self.expired = 0          # travaux annulés ou expirés sans être exécutés
+        self.last_run = 0         # travaux exécutés au dernier tick
+        self.latencies = []       # (s, ticks) des derniers travaux exécutés
+        self.max_backlog = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def full(self) -> bool:
+        """Whether the pending jobs already fill MAX_QUEUE_TICKS budgets (MAX_BACKLOG jobs until timed)"""
+        if self.job_cost:
+            return len(self.pending) * self.job_cost > self.budget * MAX_QUEUE_TICKS
+        return len(self.pending) >= MAX_BACKLOG
+
+    def submit(self, key, priority: float, job, *args, expires: int = None) -> bool:
+        """
+        Queues job(*args), run right away if the queue is disabled. If it has not run by the tick
+        'expires' (see the 'tick' attribute), it is dropped.
+        Returns False if 'key' is already queued or the queue is full (the job is then not queued).
+        """
+        if not self.enabled:
+            job(*args)
+            return True
+        if key in self.pending:
+            return False
+        if self.full():
+            self.rejected += 1
+            return False
+        self.pending[key] = (job, args, time.perf_counter(), self.tick, self.counter, expires)
+        heapq.heappush(self.heap, (priority + self.tick * AGING, self.counter, key))
+        self.counter += 1
+        self.submitted += 1
+        self.max_backlog = max(self.max_backlog, len(self.pending))
+        return True
+
+    def cancel(self, key) -> bool:
+        """Drops the pending job 'key', returns False if it was not queued"""
+        if self.pending.pop(key, None) is None:
+            return False
+        self.expired += 1
+        return True
+
+    def clear(self) -> None:
+        self.heap.clear()
+        self.pending.clear()
+
+    def run(self) -> int:
+        """Runs queued jobs by priority until the budget is spent (at least one), returns how many ran"""
+        start = time.perf_counter()
+        deadline = start + self.budget
+        heap, pending = self.heap, self.pending
+        done = 0
+        now = start
+        while heap and (done == 0 or now < deadline):
+            _, number, key = heapq.heappop(heap)
+            entry = pending.get(key)
+            if entry is None or entry[4] != number:
+                continue  # annulé (et peut-être soumis à nouveau depuis)
+            del pending[key]
+            job, args, submitted_at, submitted_tick, _, expires = entry
+            if expires is not None and self.tick > expires:
+                self.expired += 1
+                continue
+            job(*args)
+            now = time.perf_counter()
+            self.latencies.append((now - submitted_at, self.tick - submitted_tick))
+            done += 1
+        if done:
+            cost = (now - start) / done
+            self.job_cost = cost if not self.job_cost else self.job_cost + (cost - self.job_cost) * JOB_COST_SMOOTHING
+        if len(self.latencies) > STATS_WINDOW:
+            del self.latencies[:-STATS_WINDOW]
+        self.processed += done
+        self.last_run = done
+        self.tick += 1
+        return done
+
+    def stats(self) -> dict:
+        """Backlog and latency (submission to execution) of the last STATS_WINDOW jobs"""
+        seconds = [s for s, _ in self.latencies]
+        ticks = [t for _, t in self.latencies]
+        return {
+            'backlog': len(self.pending),
+            'max_backlog': self.max_backlog,
+            'submitted': self.submitted,
+            'processed': self.processed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'latency_avg': sum(seconds) / len(seconds) if seconds else 0.0,
+            'latency_max': max(seconds, default=0.0),
+            'latency_ticks_max': max(ticks, default=0),
+        }
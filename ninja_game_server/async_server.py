@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from tick_scheduler import IDLE_WAIT
+
+# Mode asyncio : la réception, le tick de simulation, le heartbeat du lobby et
+# l'UPnP tournent tous sur une seule boucle d'événements. Plusieurs GameServer
+# (rooms) peuvent partager la même boucle. handle_message reste le dispatcher.
+
+
+class GameServerProtocol(asyncio.DatagramProtocol):
+    """Feeds the datagrams received by the event loop to GameServer.handle_message"""
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.server.transport = transport
+
+    def datagram_received(self, data, addr):
+        if not data:
+            return
+        metrics = self.server.metrics
+        if metrics:
+            start = time.monotonic()
+            self.server.handle_message(data, addr)
+            metrics.receive.observe(time.monotonic() - start)
+        else:
+            self.server.handle_message(data, addr)
+
+    def error_received(self, exc):
+        # Ignore les erreurs quand un client quitte brutalement
+        if not isinstance(exc, ConnectionResetError):
+            print("Erreur socket:", exc)
+
+    def connection_lost(self, exc):
+        self.server.transport = None
+
+
+async def tick_loop(server) -> None:
+    """Runs GameServer.update_world at a fixed rate with the server's TickScheduler"""
+    scheduler = server.scheduler
+    while True:
+        if not server.players.clients:
+            server.report_stats()
+            await asyncio.sleep(IDLE_WAIT)
+            scheduler.resync()
+            continue
+
+        await asyncio.sleep(scheduler.time_until_next())
+        for _ in range(scheduler.due_ticks()):
+            server.run_tick()
+
+        server.print_reports(f"[{server.port}] ")
+        server.report_stats()
+
+
+async def serve(server) -> None:
+    """Runs one GameServer on the current event loop until cancelled"""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: GameServerProtocol(server), sock=server.sock)
+
+    tasks = [asyncio.create_task(tick_loop(server))]
+    if not server.local:
+        tasks.append(asyncio.create_task(asyncio.to_thread(server.init_upnp)))
+    if server.lobby:
+        tasks.append(asyncio.create_task(server.lobby.heartbeat_async()))
+
+    print(f"Serveur (asyncio) en cours d’exécution sur le port {server.port}...")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if server.lobby:
+            server.lobby.stop()
+        if server.metrics:
+            server.metrics.close()
+        transport.close()
+
+
+async def serve_rooms(servers: list) -> None:
+    """Runs several GameServer (one per port) on the same event loop"""
+    await asyncio.gather(*(serve(server) for server in servers))
@@ -0,0 +1,74 @@
+"""
+Tick durations of EnemyManager.update around a spike of enemies (many spawned at once
+next to the players), with the expensive AI work done inline (budget 0) or deferred to
+the time-budgeted job queue (ai_jobs.py). Uses the generated map of bench_enemies.py.
+
+    python benchmarks/bench_ai_jobs.py
+
+Limit of the queue: it bounds the deferred work (raycasts, spawns, wander targets) to its
+budget, about 2 ms a tick here, and refuses new jobs rather than letting them wait more than
+MAX_QUEUE_TICKS ticks ('rejected' counts every refused call, retried on the next ticks).
+Bound on the answers: a queued job expires if it did not run within MAX_LOS_WAIT (4) ticks of the
+first request for its line of sight, and the next request runs the ray inline ('inline LOS');
+spawns and wander targets do not expire ('max wait' covers every job). An enemy asking at every tick is answered at most MAX_LOS_WAIT
+ticks late, one at a reduced level of detail (asking every LOD_REDUCED_INTERVAL ticks) at most
+MAX_LOS_WAIT + LOD_REDUCED_INTERVAL - 1 = 7 ticks ('LOS wait', the longest measured). It
+does not make the Python path hold 60 Hz through this spike: with 1200 patrols, about 1060 of
+them at full level of detail, Enemy.physics_process alone takes 45-55 ms a tick, against a
+16.7 ms tick. At that load a stable tick needs the NumPy engine (--vectorized-enemies, about
+10 ms a tick).
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_jobs import AI_JOB_BUDGET
+from bench_enemies import make_map, players_at
+from enemy_manager import EnemyManager, MAX_LOS_WAIT
+
+ENEMIES = 200
+SPIKE = 1000              # ennemis ajoutés d'un coup au tick SPIKE_TICK
+SPIKE_TICK = 30
+TICKS = 150
+
+
+def run(budget: float, vectorized: bool) -> tuple:
+    """(mean ms before the spike, mean ms after, worst tick ms after, stats of the queue, manager)"""
+    tilemap = make_map(ENEMIES)
+    width = max(64, ENEMIES * 3) * 16
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = EnemyManager(tilemap, vectorized=vectorized, ai_budget=budget)
+    before, after = [], []
+    for tick in range(TICKS):
+        players = players_at(tick, width)
+        if tick == SPIKE_TICK:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for i in range(SPIKE):
+                    player = players[i % len(players) + 1]
+                    manager.create_enemy([player.x + (i % 40 - 20) * 6, 19 * 16 - 30 - (i // 40) * 4], "patrol")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.update(players)
+        (before if tick < SPIKE_TICK else after).append((time.perf_counter() - start) * 1000)
+    return sum(before) / len(before), sum(after) / len(after), max(after), manager.jobs.stats(), manager
+
+
+def main():
+    print(f"{ENEMIES} enemies, +{SPIKE} at tick {SPIKE_TICK}, line of sight answered within {MAX_LOS_WAIT} ticks")
+    print(f"{'engine':>7} | {'budget':>7} | {'before ms':>9} | {'after ms':>8} | {'worst ms':>8} | "
+          f"{'max backlog':>11} | {'rejected':>8} | {'latency ms':>10} | {'max wait':>8} | {'inline LOS':>10} | "
+          f"{'LOS wait':>8}")
+    for vectorized in (False, True):
+        for budget in (0, AI_JOB_BUDGET):
+            mean_before, mean_after, worst, stats, manager = run(budget, vectorized)
+            print(f"{'numpy' if vectorized else 'python':>7} | {budget * 1000:>5.1f}ms | {mean_before:>9.2f} | "
+                  f"{mean_after:>8.2f} | {worst:>8.2f} | {stats['max_backlog']:>11} | {stats['rejected']:>8} | "
+                  f"{stats['latency_avg'] * 1000:>10.2f} | {stats['latency_ticks_max']:>8} | {manager.los_inline:>10} | "
+                  f"{manager.los_wait_max:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of EnemyManager.update: Python objects (physics_process per enemy) against
+the NumPy struct-of-arrays engine (enemy_engine.py), with and without the AI level
+of detail, on a generated map with 4 players walking among the enemies.
+
+    python benchmarks/bench_enemies.py
+"""
+import contextlib
+import io
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from TilemapServer import TilemapServer
+from enemy_manager import EnemyManager, LOD_NEAR_DISTANCE
+from player_state import PlayerState
+
+SIZES = (20, 200, 2000)
+TICKS = 60
+TIME_BUDGET = 5.0   # s par mesure (au moins un tick) : le chemin Python à 2000 ennemis est très lent
+PLAYERS = 4
+
+
+def make_map(enemies: int) -> TilemapServer:
+    """A wide floor with random platforms and one enemy spawner every few tiles"""
+    rnd = random.Random(enemies)
+    width = max(64, enemies * 3)
+    tilemap = TilemapServer()
+    tilemap.tile_size = 16
+    tilemap.tilemap = {}
+    for x in range(width):
+        tilemap.tilemap[f"{x};20"] = {'type': 'grass', 'variant': 0, 'pos': [x, 20]}
+    for _ in range(width // 4):
+        x, y = rnd.randrange(width), rnd.randrange(8, 18)
+        for dx in range(rnd.randrange(2, 6)):
+            tilemap.tilemap[f"{x + dx};{y}"] = {'type': 'stone', 'variant': 0, 'pos': [x + dx, y]}
+    tilemap.compile()
+    tilemap.spawners = [{'variant': 1, 'pos': [(i * width // enemies) * 16 + 4, 19 * 16 - 30]} for i in range(enemies)]
+    return tilemap
+
+
+def players_at(tick: int, width: float) -> dict:
+    return {pid: PlayerState(width * (pid + 0.5) / PLAYERS + 200 * math.sin(tick / 30 + pid), 19 * 16 - 20, 'run')
+            for pid in range(1, PLAYERS + 1)}
+
+
+def run(enemies: int, vectorized: bool, lod: bool) -> float:
+    """Average duration of one update, in ms"""
+    tilemap = make_map(enemies)
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = EnemyManager(tilemap, vectorized=vectorized, lod_near=LOD_NEAR_DISTANCE if lod else 0)
+    width = max(64, enemies * 3) * 16
+    if vectorized:
+        manager.update(players_at(0, width))  # construction des tableaux hors mesure
+    start = time.perf_counter()
+    ticks = 0
+    while ticks < TICKS and (ticks == 0 or time.perf_counter() - start < TIME_BUDGET):
+        ticks += 1
+        manager.update(players_at(ticks, width))
+    return (time.perf_counter() - start) / ticks * 1000
+
+
+def main():
+    print(f"{'enemies':>8} | {'python ms/tick':>14} | {'python + LOD':>12} | {'numpy ms/tick':>13} | "
+          f"{'numpy + LOD':>11} | {'speedup':>7}")
+    for n in SIZES:
+        python_ms = run(n, False, False)
+        python_lod_ms = run(n, False, True)
+        numpy_ms = run(n, True, False)
+        numpy_lod_ms = run(n, True, True)
+        print(f"{n:>8} | {python_ms:>14.2f} | {python_lod_ms:>12.2f} | {numpy_ms:>13.2f} | {numpy_lod_ms:>11.2f} | "
+              f"{python_ms / numpy_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
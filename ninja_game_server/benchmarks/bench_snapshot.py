@@ -0,0 +1,116 @@
+"""
+Microbenchmark of the snapshot codec.
+Compares the historical encoder / decoder (payload += struct.pack, 15 bytes names,
+slicing + struct.unpack) with the type 6 encoder (precompiled Struct / pack_into,
+interned ids) and its unpack_from decoder, for full and delta snapshots, and the
+size of the type 8 compact (quantized) format.
+
+    python benchmarks/bench_snapshot.py
+"""
+import os
+import random
+import struct
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../ninja_game/scripts')))
+from snapshot import (ACTIONS, ENEMY_STATES, SnapshotEncoder, Quantizer, decode_delta,
+                      apply_players_delta, apply_enemies_delta, named_players, named_enemies)
+
+SIZES = (8, 64, 512)
+
+
+def make_state(n: int) -> tuple:
+    """n entities: a few players, the rest enemies (wire tuples)"""
+    rnd = random.Random(n)
+    n_players = max(1, n // 16)
+    players = {pid: (rnd.uniform(0, 500), rnd.uniform(0, 500), rnd.randrange(len(ACTIONS)), rnd.random() < 0.5, 1,
+                     rnd.uniform(-100, 100), rnd.uniform(-100, 100)) for pid in range(1, n_players + 1)}
+    enemies = {eid: (rnd.uniform(0, 500), rnd.uniform(0, 500), rnd.random() < 0.5, rnd.randrange(len(ENEMY_STATES)))
+               for eid in range(1, n - n_players + 1)}
+    return players, enemies
+
+
+def move(state: tuple) -> tuple:
+    """Next tick: every enemy moved, players unchanged"""
+    players, enemies = state
+    return players, {eid: (x + 1.5, y, flip, s) for eid, (x, y, flip, s) in enemies.items()}
+
+
+def encode_concat(state: tuple) -> bytes:
+    """Historical broadcast_state encoder (16 bits enemy count so that 512 entities fit)"""
+    players, enemies = state
+    payload = struct.pack("BB", 2, len(players))
+    for pid, (x, y, action, flip, weapon_id, vx, vy) in players.items():
+        action_bytes = ACTIONS[action].encode('utf-8')[:15]
+        action_bytes += b'\x00' * (15 - len(action_bytes))
+        flip_byte = b'\x01' if flip else b'\x00'
+        payload += struct.pack("Iffff", pid, x, y, vx, vy) + action_bytes + flip_byte + struct.pack("B", weapon_id)
+    payload += struct.pack("H", len(enemies))
+    for eid, (x, y, flip, state) in enemies.items():
+        state_bytes = ENEMY_STATES[state].encode("utf-8")[:15]
+        state_bytes += b'\x00' * (15 - len(state_bytes))
+        payload += struct.pack("Iff?", eid, x, y, flip) + state_bytes
+    return payload
+
+
+def decode_slices(data: bytes) -> tuple:
+    """Historical ClientNetwork.listen decoder (16 bits enemy count)"""
+    offset = 2
+    players = {}
+    for _ in range(data[1]):
+        pid = struct.unpack("I", data[offset:offset+4])[0]
+        x, y, vx, vy = struct.unpack("ffff", data[offset+4:offset+20])
+        action = data[offset+20:offset+35].decode('utf-8').rstrip('\x00')
+        players[pid] = (x, y, action, data[offset+35] == 1, data[offset+36], vx, vy)
+        offset += 37
+    enemies = {}
+    count = struct.unpack("H", data[offset:offset+2])[0]
+    offset += 2
+    for _ in range(count):
+        if len(data) >= offset + 28:
+            eid, x, y, flip = struct.unpack("Iff?", data[offset:offset+13])
+            enemies[eid] = (x, y, flip, data[offset+13:offset+28].decode('utf-8').rstrip('\x00'))
+            offset += 28
+    return players, enemies
+
+
+def rate(func, number: int) -> float:
+    """Calls per second, best of 5"""
+    return number / min(timeit.repeat(func, number=number, repeat=5))
+
+
+def decode_full(data) -> tuple:
+    seq, baseline_seq, players, enemies = decode_delta(data)
+    return named_players(apply_players_delta({}, *players)), named_enemies(apply_enemies_delta({}, *enemies))
+
+
+def main():
+    encoder = SnapshotEncoder()
+    print(f"{'entities':>8} | {'concat enc/s':>12} | {'pack_into enc/s':>15} | {'delta enc/s':>11} | "
+          f"{'slices dec/s':>12} | {'unpack_from dec/s':>17} | {'old B':>6} | {'full B':>6} | {'delta B':>7} | "
+          f"{'compact B':>9} | {'c.delta B':>9} | {'compact enc/s':>13}")
+    quantizer = Quantizer.from_bounds(0, 0, 500, 500)
+    for n in SIZES:
+        state = make_state(n)
+        nxt = move(state)
+        number = max(20, 20000 // n)
+        legacy = encode_concat(state)
+        full = bytes(encoder.encode_delta(1, 0, ({}, {}), state))
+        delta_size = len(encoder.encode_delta(2, 1, state, nxt))
+        q_state = (quantizer.quantize_players(state[0]), quantizer.quantize_enemies(state[1]))
+        q_nxt = (q_state[0], quantizer.quantize_enemies(nxt[1]))
+        compact_size = sum(map(len, encoder.encode_compact(1, 0, ({}, {}), q_state, quantizer)))
+        compact_delta_size = sum(map(len, encoder.encode_compact(2, 1, q_state, q_nxt, quantizer)))
+        print(f"{n:>8} | {rate(lambda: encode_concat(state), number):>12.0f}"
+              f" | {rate(lambda: encoder.encode_delta(1, 0, ({}, {}), state), number):>15.0f}"
+              f" | {rate(lambda: encoder.encode_delta(2, 1, state, nxt), number):>11.0f}"
+              f" | {rate(lambda: decode_slices(legacy), number):>12.0f}"
+              f" | {rate(lambda: decode_full(full), number):>17.0f}"
+              f" | {len(legacy):>6} | {len(full):>6} | {delta_size:>7}"
+              f" | {compact_size:>9} | {compact_delta_size:>9}"
+              f" | {rate(lambda: encoder.encode_compact(1, 0, ({}, {}), q_state, quantizer), number):>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
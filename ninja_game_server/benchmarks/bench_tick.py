@@ -0,0 +1,113 @@
+"""
+Benchmark of the two halves of a server tick, EnemyManager.update (Python path) and
+GameServer.broadcast_state, on the generated map of bench_enemies.py with real UDP
+clients (sockets that never read, the kernel drops what overflows), plus the memory
+held per enemy and per player record.
+
+    python benchmarks/bench_tick.py
+"""
+import contextlib
+import gc
+import io
+import math
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # data/maps du serveur
+from bench_enemies import make_map
+from server import GameServer, PROTOCOL_VERSION, PLAYER_INPUT
+
+SIZES = (200, 2000)
+CLIENTS = 8
+TICKS = 120
+TIME_BUDGET = 5.0   # s par mesure (au moins un tick)
+REPEAT = 3          # mesures par taille, on garde la meilleure
+
+
+def deep_size(obj) -> int:
+    """Bytes of an object, its attribute dict and the dicts / lists / tuples it holds directly"""
+    size = sys.getsizeof(obj)
+    fields = list(getattr(obj, '__dict__', {}).values())
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    for name in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, name):
+            fields.append(getattr(obj, name))
+    if isinstance(obj, tuple):
+        fields = list(obj)
+    for value in fields:
+        if isinstance(value, (dict, list, tuple)):
+            size += sys.getsizeof(value)
+    return size
+
+
+def make_server(enemies: int) -> tuple:
+    """A GameServer on an ephemeral port, on the generated map, with CLIENTS compact protocol clients"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        server = GameServer(True, ip="127.0.0.1", port=0)
+        server.map = make_map(enemies)
+        server.update_quantizer()
+        server.EnemyManager.reset(server.map)
+    sinks = []
+    for _ in range(CLIENTS):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(("127.0.0.1", 0))
+        sinks.append(sink)
+        with contextlib.redirect_stdout(io.StringIO()):
+            server.handle_message(bytes((10, PROTOCOL_VERSION)), sink.getsockname())
+    return server, sinks
+
+
+def move_players(server: GameServer, tick: int, width: float) -> None:
+    """Queues one input per client, walking back and forth among the enemies"""
+    for i, addr in enumerate(server.players.clients):
+        x = width * (i + 0.5) / CLIENTS + 200 * math.sin(tick / 30 + i)
+        data = PLAYER_INPUT.pack(x, 19 * 16 - 20, 1.0, 0.0, 1, i % 2, 1, tick)
+        server.players.queue_update(addr, data)
+
+
+def run(enemies: int) -> tuple:
+    """(ms per EnemyManager.update with apply_pending, ms per broadcast_state, bytes per enemy, bytes per player)"""
+    random.seed(enemies)
+    server, sinks = make_server(enemies)
+    width = max(64, enemies * 3) * 16
+    update_time = broadcast_time = 0.0
+    ticks = 0
+    start = time.perf_counter()
+    gc.collect()
+    while ticks < TICKS and (ticks == 0 or time.perf_counter() - start < TIME_BUDGET):
+        ticks += 1
+        move_players(server, ticks, width)
+        t0 = time.perf_counter()
+        server.players.apply_pending()
+        server.EnemyManager.update(server.players.players)
+        t1 = time.perf_counter()
+        server.broadcast_state()
+        t2 = time.perf_counter()
+        update_time += t1 - t0
+        broadcast_time += t2 - t1
+    enemy_bytes = sum(deep_size(e) for e in server.EnemyManager.enemies.values()) / len(server.EnemyManager.enemies)
+    player_bytes = sum(deep_size(p) for p in server.players.players.values()) / len(server.players.players)
+    server.sock.close()
+    for sink in sinks:
+        sink.close()
+    return update_time / ticks * 1000, broadcast_time / ticks * 1000, enemy_bytes, player_bytes
+
+
+def main():
+    print(f"{CLIENTS} clients")
+    print(f"{'enemies':>8} | {'update ms':>9} | {'broadcast ms':>12} | {'B/enemy':>7} | {'B/player':>8}")
+    for n in SIZES:
+        runs = [run(n) for _ in range(REPEAT)]
+        update_ms = min(r[0] for r in runs)
+        broadcast_ms = min(r[1] for r in runs)
+        enemy_bytes, player_bytes = runs[0][2:]
+        print(f"{n:>8} | {update_ms:>9.2f} | {broadcast_ms:>12.2f} | {enemy_bytes:>7.0f} | {player_bytes:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
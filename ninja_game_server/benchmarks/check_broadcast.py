@@ -0,0 +1,180 @@
+"""
+Regression check of GameServer.broadcast_state with clients of every protocol whose snapshots
+have very different sizes in the same tick (a crowd of enemies next to an almost empty area).
+Every datagram is read back by the client code (ClientNetwork) and acknowledged, and the world
+each client rebuilds must match the entities the server selected for it, tick after tick.
+The compact snapshots of the crowd must be split in several parts of at most SNAPSHOT_MTU bytes.
+The same clients are then checked on a map too wide for a shared quantization (WIDE_X px), with
+clients at its far end and one running across several origins of the local quantization.
+
+    python benchmarks/check_broadcast.py
+
+Exits with status 1 on the first difference (or if the tick raises).
+"""
+import contextlib
+import io
+import math
+import os
+import socket
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../ninja_game')))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # data/maps du serveur
+from bench_enemies import make_map
+from scripts.client_network import ClientNetwork
+from scripts.snapshot import COMPACT_HEADER, SNAPSHOT_MTU, decode_legacy
+from server import (GameServer, PLAYER_INPUT, ENEMY_STATE_IDS, PROTOCOL_LEGACY, PROTOCOL_DELTA,
+                    PROTOCOL_COMPACT)
+
+ENEMIES = 200
+CROWD = 800               # patrouilles ajoutées autour de CROWD_X
+CROWD_X = 300.0
+FAR_X = 6000.0            # au milieu des ennemis épars de make_map
+WIDE_X = 79000.0          # bout de la map large, hors de portée d'une origine commune en int16
+WIDE_ENEMIES = 50         # patrouilles autour de WIDE_X
+RUN_SPEED = 200.0         # px par tick du client qui traverse la map large
+TICKS = 30
+POS_TOLERANCE = 0.5       # px (positions en float32, ou quantifiées)
+# (protocole, x, vitesse) : les petits snapshots d'abord, pour que les suivants fassent grossir le tampon de l'encodeur
+CLIENTS = ((PROTOCOL_LEGACY, FAR_X, 0), (PROTOCOL_DELTA, CROWD_X, 0), (PROTOCOL_COMPACT, FAR_X, 0),
+           (PROTOCOL_COMPACT, CROWD_X, 0), (PROTOCOL_DELTA, FAR_X, 0), (PROTOCOL_LEGACY, CROWD_X, 0))
+WIDE_CLIENTS = CLIENTS + ((PROTOCOL_COMPACT, WIDE_X, 0), (PROTOCOL_DELTA, WIDE_X, 0), (PROTOCOL_COMPACT, CROWD_X, RUN_SPEED))
+
+ENEMY_STATE_NAMES = {i: name for name, i in ENEMY_STATE_IDS.items()}
+
+
+def make_client(sink: socket.socket, server_addr: tuple) -> ClientNetwork:
+    """ClientNetwork state without its threads: datagrams are handed over by receive()"""
+    client = ClientNetwork.__new__(ClientNetwork)
+    client.sock = sink
+    client.server = server_addr
+    client.remote_players = {}
+    client.enemies = {}
+    client.snapshots = {}
+    client.last_snapshot_seq = 0
+    client.partial_snapshots = {}
+    return client
+
+
+def receive(client: ClientNetwork, data: bytes) -> None:
+    """Same dispatch as ClientNetwork.listen for the world updates"""
+    if data[0] == 2:
+        client.remote_players, client.enemies = decode_legacy(data)
+    elif data[0] in (6, 8):
+        client.apply_snapshot(data)
+
+
+def drain(sock: socket.socket) -> list:
+    datagrams = []
+    while True:
+        try:
+            datagrams.append(sock.recvfrom(65535))
+        except BlockingIOError:
+            return datagrams
+
+
+def check_client(server: GameServer, addr: tuple, client: ClientNetwork, world: tuple, tick: int) -> bool:
+    visible_players, visible_enemies = server.interest.visible[addr]
+    if client.remote_players.keys() != visible_players or client.enemies.keys() != visible_enemies:
+        print(f"tick {tick}, client {addr}: {len(client.remote_players)} players / {len(client.enemies)} enemies "
+              f"received, {len(visible_players)} / {len(visible_enemies)} selected")
+        return False
+    for eid, (x, y, flip, state) in client.enemies.items():
+        ex, ey, eflip, estate = world[1][eid]
+        if abs(x - ex) > POS_TOLERANCE or abs(y - ey) > POS_TOLERANCE or flip != eflip \
+                or state != ENEMY_STATE_NAMES[estate]:
+            print(f"tick {tick}, client {addr}, enemy {eid}: received {(x, y, flip, state)}, "
+                  f"sent {(ex, ey, eflip, ENEMY_STATE_NAMES[estate])}")
+            return False
+    return True
+
+
+def make_wide_map():
+    """make_map plus a floor around WIDE_X"""
+    tilemap = make_map(ENEMIES)
+    for x in range(int(WIDE_X // 16) - 40, int(WIDE_X // 16) + 40):
+        tilemap.tilemap[f"{x};20"] = {'type': 'grass', 'variant': 0, 'pos': [x, 20]}
+    tilemap.compile()
+    return tilemap
+
+
+def run(wide: bool) -> bool:
+    client_specs = WIDE_CLIENTS if wide else CLIENTS
+    with contextlib.redirect_stdout(io.StringIO()):
+        server = GameServer(True, ip="127.0.0.1", port=0)
+        server.map = make_wide_map() if wide else make_map(ENEMIES)
+        server.update_quantizer()
+        server.EnemyManager.reset(server.map)
+        for i in range(CROWD):
+            server.EnemyManager.create_enemy([CROWD_X - 100 + (i % 40) * 5, 19 * 16 - 30 - (i // 40) * 4], "patrol")
+        if wide:
+            for i in range(WIDE_ENEMIES):
+                server.EnemyManager.create_enemy([WIDE_X - 200 + i * 8, 19 * 16 - 30], "patrol")
+    if wide and server.quantizer is not None:
+        print(f"map of {server.map.bounds()}: shared quantization, it should not fit in an int16")
+        return False
+    server.sock.setblocking(False)
+    server_addr = server.sock.getsockname()
+
+    clients = []
+    for version, x, speed in client_specs:
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        sink.bind(("127.0.0.1", 0))
+        sink.setblocking(False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            server.handle_message(bytes((10, version)), sink.getsockname())
+        drain(sink)  # PID et map courante
+        clients.append((sink, x, speed, make_client(sink, server_addr)))
+
+    ok = True
+    max_parts = 0
+    for tick in range(1, TICKS + 1):
+        for sink, x, speed, _ in clients:
+            server.players.queue_update(sink.getsockname(), PLAYER_INPUT.pack(
+                x + speed * tick + 40 * math.sin(tick / 5), 19 * 16 - 20, 0.0, 0.0, 1, 0, 1, tick))
+        server.players.apply_pending()
+        with contextlib.redirect_stdout(io.StringIO()):
+            server.EnemyManager.update(server.players.players)
+            try:
+                server.broadcast_state()
+            except Exception as e:
+                print(f"tick {tick}: broadcast_state raised {type(e).__name__}: {e}", file=sys.stderr)
+                return False
+        world = server.build_world_state()
+        for sink, _, _, client in clients:
+            for data, _ in drain(sink):
+                if data[0] == 8:
+                    if len(data) > SNAPSHOT_MTU:
+                        print(f"tick {tick}: compact part of {len(data)} bytes (> {SNAPSHOT_MTU})")
+                        ok = False
+                    max_parts = max(max_parts, COMPACT_HEADER.unpack_from(data)[-1])
+                receive(client, data)
+        for data, addr in drain(server.sock):
+            server.handle_message(data, addr)  # acks
+        for sink, _, _, client in clients:
+            ok = ok and check_client(server, sink.getsockname(), client, world, tick)
+        if not ok:
+            break
+
+    if ok and max_parts < 2:
+        print("no compact snapshot was split: the crowd is too small to check the parts")
+        ok = False
+    sizes = ", ".join(f"{len(client.enemies)}" for _, _, _, client in clients)
+    print(f"{'wide map, ' if wide else ''}{len(clients)} clients, {TICKS} ticks: {'OK' if ok else 'FAILED'} "
+          f"(enemies per client: {sizes}, up to {max_parts} compact parts)")
+    server.sock.close()
+    for sink, _, _, _ in clients:
+        sink.close()
+    return ok
+
+
+def main():
+    ok = run(False)
+    ok = run(True) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Equivalence check of the NumPy enemy engine (enemy_engine.py) against the Python Patrol / Blob
+objects: each map is simulated with both for TICKS ticks, with the same players on fixed paths
+(one of them leaving half way), and the position, flip, state and target of every enemy are
+compared after every tick. Run it after any change to Patrol, Blob or VectorEnemyEngine.
+
+    python benchmarks/check_enemy_engine.py          # every map of data/maps
+    python benchmarks/check_enemy_engine.py 0 3
+
+The two paths draw their random numbers in a different order, so both are given the same
+deterministic generator: uniform draws return the middle of their range and every blob that
+does not see a player spawns a new one on the ticks multiple of SPAWN_INTERVAL only.
+
+Each map runs in two configurations:
+- exact: AI job queue and per-tick line of sight cache disabled, both paths run every query
+  inline and must give the same enemies, tick after tick.
+- server defaults (the GameServer one): the Python path defers its wander targets and the rays
+  missing from the visibility table to the job queue (answered up to MAX_LOS_WAIT ticks later),
+  the engine computes them inline; the cache answers a pair of tiles with the first ray cast
+  for it, and the paths do not cast their rays in the same order (patrols and blobs are batched
+  apart). The trajectories drift apart, so only these divergences are allowed: the same enemies
+  alive at every tick, a mean position gap of at most MAX_MEAN_GAP px, and a state or target
+  differing on at most MAX_MISMATCH of the (enemy, tick) pairs. Both bounds are about twice the
+  gaps measured on data/maps: a wrong chase or wander speed in the engine exceeds them, finer
+  differences (e.g. where a ray stops) are only caught by the exact configuration.
+Exits with status 1 if any map differs.
+"""
+import contextlib
+import io
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import enemy_manager
+from enemy_manager import EnemyManager
+from map_catalog import MAPS_DIR
+from player_state import PlayerState
+from TilemapServer import load_map
+
+TICKS = 400
+LEAVE_TICK = 200          # le joueur 1 se déconnecte à ce tick
+SPAWN_INTERVAL = 100      # ticks entre deux vagues d'apparition de blobs
+BLOBS = 3                 # blobs ajoutés loin du point d'apparition des joueurs
+POS_TOLERANCE = 1e-6      # px
+MAX_MEAN_GAP = 8.0        # px, écart moyen des positions toléré avec la configuration du serveur
+MAX_MISMATCH = 0.05       # part des (ennemi, tick) dont l'état ou la cible diffère, idem
+# (nom, arguments d'EnemyManager, identique tick à tick)
+CONFIGS = (("exact", {'los_cache': False, 'ai_budget': 0}, True),
+           ("server defaults", {}, False))
+
+
+class Draws:
+    """Deterministic stand-in for the 'random' module (Python path) and the engine's numpy Generator"""
+    def __init__(self):
+        self.tick = 0
+
+    def spawning(self) -> bool:
+        return self.tick > 0 and self.tick % SPAWN_INTERVAL == 0
+
+    # --- module random (Patrol, Blob) ---
+    def uniform(self, a, b, n=None):
+        if n is None:
+            return (a + b) / 2
+        return np.full(n, (a + b) / 2)
+
+    def randint(self, a, b):
+        return a if self.spawning() else a + 1
+
+    # --- numpy.random.Generator (VectorEnemyEngine) ---
+    def random(self, n):
+        return np.zeros(n) if self.spawning() else np.ones(n)
+
+
+def players_at(tick: int, sx: float, sy: float) -> dict:
+    players = {1: PlayerState(sx + 150 * math.sin(tick / 40), sy, 'run'),
+               2: PlayerState(sx + 60, sy - 20 + 30 * math.cos(tick / 25), 'run')}
+    if tick >= LEAVE_TICK:
+        del players[1]
+    return players
+
+
+def simulate(path: str, vectorized: bool, config: dict) -> list:
+    """[{eid: (x, y, flip, state, target)}] after every tick"""
+    draws = Draws()
+    enemy_manager.random = draws
+    try:
+        tilemap = load_map(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = EnemyManager(tilemap, vectorized=vectorized, **config)
+            spawn = [s['pos'] for s in tilemap.spawners if s['variant'] == 0] or [[50, 50]]
+            sx, sy = spawn[0]
+            # Blobs sur les apparitions d'ennemis les plus loin des joueurs, pour qu'ils en fassent naître d'autres
+            far = sorted((s['pos'] for s in tilemap.spawners if s['variant'] != 0),
+                         key=lambda pos: -math.hypot(pos[0] - sx, pos[1] - sy))
+            for pos in far[:BLOBS]:
+                manager.create_enemy([pos[0], pos[1]], "blob")
+        if vectorized:
+            manager.engine.rng = draws
+        states = []
+        previous = set()
+        for tick in range(TICKS):
+            draws.tick = tick
+            players = players_at(tick, sx, sy)
+            # Comme GameServer à la déconnexion d'un joueur
+            for pid in previous - players.keys():
+                for enemy in manager.enemies.values():
+                    if enemy.target_player == pid:
+                        enemy.target_player = None
+            previous = set(players)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.update(players)
+            states.append({eid: (e.x, e.y, e.flip, e.state, e.target_player) for eid, e in manager.enemies.items()})
+        return states
+    finally:
+        enemy_manager.random = __import__('random')
+
+
+def compare(path: str, name: str, config: dict, exact: bool) -> bool:
+    python_states = simulate(path, False, config)
+    numpy_states = simulate(path, True, config)
+    worst = gaps = 0.0
+    pairs = mismatches = 0
+    for tick, (a, b) in enumerate(zip(python_states, numpy_states)):
+        if a.keys() != b.keys():
+            print(f"{path} ({name}): tick {tick}, enemies {sorted(a.keys() ^ b.keys())} only on one path")
+            return False
+        for eid, sa in a.items():
+            sb = b[eid]
+            gap = math.hypot(sa[0] - sb[0], sa[1] - sb[1])
+            worst = max(worst, gap)
+            if exact and (worst > POS_TOLERANCE or sa[2:] != sb[2:]):
+                print(f"{path} ({name}): tick {tick}, enemy {eid}: python {sa}, numpy {sb}")
+                return False
+            gaps += gap
+            pairs += 1
+            mismatches += sa[3:] != sb[3:]
+    if exact:
+        print(f"{path} ({name}): {len(python_states[-1])} enemies, {TICKS} ticks identical "
+              f"(max position diff {worst:.2g} px)")
+        return True
+    mean_gap = gaps / max(pairs, 1)
+    mismatch = mismatches / max(pairs, 1)
+    ok = mean_gap <= MAX_MEAN_GAP and mismatch <= MAX_MISMATCH
+    print(f"{path} ({name}): {len(python_states[-1])} enemies, {TICKS} ticks {'within bounds' if ok else 'DIFFER'} "
+          f"(mean position gap {mean_gap:.2f} px, max {worst:.1f}, state / target differ on {mismatch:.1%})")
+    return ok
+
+
+def main():
+    ids = sys.argv[1:] or sorted(int(f[:-5]) for f in os.listdir(MAPS_DIR) if f.endswith(".json") and f[:-5].isdigit())
+    ok = True
+    for map_id in ids:
+        for name, config, exact in CONFIGS:
+            ok &= compare(os.path.join(MAPS_DIR, f"{map_id}.json"), name, config, exact)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from math import ceil, hypot, sqrt
+
+import numpy as np
+
+# Champ de distance signé d'une map, calculé au chargement de la grille.
+# La grille solide est échantillonnée SDF_SUBDIV x SDF_SUBDIV fois par tuile ;
+# chaque échantillon garde la distance exacte (en px) de son centre à la tuile
+# solide la plus proche (positive dehors, négative dedans : distance à la tuile
+# libre la plus proche), bornée à SDF_MAX_DISTANCE. Une position quelconque est
+# à moins de 'slack' px de son échantillon : distance - slack est un minorant sûr
+# de l'espace libre autour d'elle (test de dégagement en O(1), sphere tracing),
+# et le gradient pointe vers l'extérieur des murs (Enemy.unstuck).
+
+SDF_SUBDIV = 4              # échantillons par tuile et par axe (pas de 4 px pour des tuiles de 16)
+SDF_MAX_DISTANCE = 64       # px, au-delà les distances sont bornées (rayon de recherche de Enemy.unstuck)
+
+
+def _shifted(arr: np.ndarray, shift: int, axis: int, fill) -> np.ndarray:
+    """arr[i + shift] along 'axis', 'fill' where i + shift is outside the array"""
+    out = np.full_like(arr, fill)
+    n = arr.shape[axis]
+    src = [slice(None)] * arr.ndim
+    dst = [slice(None)] * arr.ndim
+    if shift >= 0:
+        src[axis], dst[axis] = slice(shift, n), slice(0, max(n - shift, 0))
+    else:
+        src[axis], dst[axis] = slice(0, max(n + shift, 0)), slice(-shift, n)
+    out[tuple(dst)] = arr[tuple(src)]
+    return out
+
+
+def tile_distances(mask: np.ndarray, tile_size: int, subdiv: int, max_distance: float, outside: bool) -> np.ndarray:
+    """
+    Distance from the centre of every sample (subdiv x subdiv per tile) to the nearest True tile of
+    'mask', capped at 'max_distance'; tiles outside the mask count as 'outside'. Exact Euclidean
+    distance to the tile squares, computed separably (columns, then rows) within the capping window.
+    Returns a float32 array [height * subdiv, width * subdiv].
+    """
+    h, w = mask.shape
+    radius = ceil(max_distance / tile_size)
+    step = tile_size / subdiv
+    local = (np.arange(subdiv) + 0.5) * step
+    # Distance sur un axe d'un échantillon (position locale 'a') à la tuile décalée de k : [k*ts, (k+1)*ts]
+    offsets = np.arange(-radius, radius + 1)
+    axis_dist = np.maximum.reduce([offsets[:, None] * tile_size - local[None, :],
+                                   local[None, :] - (offsets[:, None] + 1) * tile_size,
+                                   np.zeros((len(offsets), subdiv))])
+    axis_sq = (axis_dist ** 2).astype(np.float32)
+    cap = np.float32(max_distance ** 2)
+
+    # Colonnes : carré de la distance verticale à la tuile vraie la plus proche de la même colonne
+    column = np.full((h, subdiv, w), cap, dtype=np.float32)
+    for k, dy in enumerate(offsets):
+        hit = _shifted(mask, int(dy), 0, outside)
+        np.minimum(column, np.where(hit[:, None, :], axis_sq[k][None, :, None], cap), out=column)
+    # Lignes : minimum sur les colonnes voisines de (distance horizontale)² + (distance verticale)²
+    dist = np.full((h, subdiv, w, subdiv), cap, dtype=np.float32)
+    fill = 0.0 if outside else cap
+    for k, dx in enumerate(offsets):
+        np.minimum(dist, _shifted(column, int(dx), 2, fill)[..., None] + axis_sq[k][None, None, None, :], out=dist)
+    return np.sqrt(np.minimum(dist, cap)).reshape(h * subdiv, w * subdiv)
+
+
+class DistanceField:
+    """
+    Signed distance field of the solid tiles of a TilemapServer grid (see the module comment),
+    padded around the grid so that positions near its border are covered too.
+    """
+    def __init__(self, tilemap, subdiv: int = SDF_SUBDIV, max_distance: float = SDF_MAX_DISTANCE):
+        ts = tilemap.tile_size
+        self.step = ts / subdiv
+        self.max_distance = max_distance
+        self.slack = self.step * sqrt(0.5)   # distance au plus d'une position au centre de son échantillon
+        pad = ceil(max_distance / ts) + 1
+        solid = np.pad(np.asarray(tilemap.solid, dtype=bool), pad)
+        self.origin = ((tilemap.origin[0] - pad) * ts, (tilemap.origin[1] - pad) * ts)
+        to_solid = tile_distances(solid, ts, subdiv, max_distance, outside=False)
+        to_free = tile_distances(~solid, ts, subdiv, max_distance, outside=True)
+        self.values = to_solid - to_free
+        self.rows, self.cols = self.values.shape
+
+    def distance(self, x: float, y: float) -> float:
+        """Signed distance (px) of the sample under (x, y) to the nearest solid tile, max_distance off the field"""
+        i = int((y - self.origin[1]) // self.step)
+        j = int((x - self.origin[0]) // self.step)
+        if 0 <= i < self.rows and 0 <= j < self.cols:
+            return self.values.item(i, j)
+        return self.max_distance
+
+    def clearance(self, x: float, y: float) -> float:
+        """Radius (px) of a disk around (x, y) that is certainly free of solid tiles (<= 0: no guarantee)"""
+        return self.distance(x, y) - self.slack
+
+    def gradient(self, x: float, y: float) -> tuple:
+        """Unit direction of increasing distance at (x, y) (away from the walls), (0, 0) if flat"""
+        i = int((y - self.origin[1]) // self.step)
+        j = int((x - self.origin[0]) // self.step)
+        if not (1 <= i < self.rows - 1 and 1 <= j < self.cols - 1):
+            return 0.0, 0.0
+        values = self.values
+        gx = values.item(i, j + 1) - values.item(i, j - 1)
+        gy = values.item(i + 1, j) - values.item(i - 1, j)
+        norm = hypot(gx, gy)
+        if norm == 0:
+            return 0.0, 0.0
+        return gx / norm, gy / norm
@@ -0,0 +1,440 @@
+from math import pi
+
+import numpy as np
+
+from enemy_manager import (Patrol, Blob, distane_to,
+                           VISION_DISTANCE_PATROL, DIST_WANDER, MIN_WANDER_DIST, MIN_WANDER_SPEED,
+                           WANDER_SPEED_DECAY, MAX_DISTANCE_FROM_SPAWN)
+
+# Moteur vectorisé des ennemis (optionnel, EnemyManager(vectorized=True)).
+# Tous les ennemis sont stockés en colonnes NumPy (struct of arrays) et chaque
+# étape du comportement de Patrol / Blob (choix de la cible, déplacement,
+# errance, collisions par axe, lignes de vue) est faite pour tous les ennemis
+# d'un coup. Les objets Enemy restent la référence pour le reste du serveur :
+# leurs champs (x, y, vx, ...) sont réécrits à chaque tick, l'état interne (errance,
+# dernières positions vues) quand la liste des ennemis change.
+
+KIND_PATROL = 0
+KIND_BLOB = 1
+STATE_IDLE = 0
+STATE_RAGE = 1
+STATES = ("idle", "rage")
+
+NO_TARGET = -1
+BLOB_VISION = 16 * 30
+BLOB_SPAWN_CHANCE = 1 / 501  # random.randint(0, 500) == 0
+HITBOX_EPSILON = 0.1
+LOS_STOP = 10             # les rayons de ligne de vue s'arrêtent 10 px avant la cible (can_see_player)
+
+
+class VectorEnemyEngine:
+    """Struct of arrays simulation of every enemy of an EnemyManager"""
+    def __init__(self, manager, seed=None):
+        self.manager = manager
+        self.rng = np.random.default_rng(seed)
+        self.tilemap = None
+        self.objects = []       # ligne -> objet Enemy
+        self.ids = ()
+        self.pids = []          # colonne -> pid (ordre du dict des joueurs)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forgets the arrays (new map): the next update rebuilds everything from the Enemy objects"""
+        self.tilemap = None
+        self.objects = []
+        self.ids = ()
+        self.rows = {}
+        self.pids = []
+
+    # --- Synchronisation avec les objets Enemy ---
+    def load(self) -> None:
+        """Builds the arrays from the manager's Enemy objects"""
+        self.objects = list(self.manager.enemies.values())
+        self.ids = tuple(self.manager.enemies.keys())
+        self.rows = {eid: i for i, eid in enumerate(self.ids)}
+        objs = self.objects
+        n = len(objs)
+        self.x = np.array([o.x for o in objs], dtype=np.float64)
+        self.y = np.array([o.y for o in objs], dtype=np.float64)
+        self.vx = np.array([o.vx for o in objs], dtype=np.float64)
+        self.vy = np.array([o.vy for o in objs], dtype=np.float64)
+        self.flip = np.array([o.flip for o in objs], dtype=bool)
+        self.state = np.array([STATES.index(o.state) if o.state in STATES else 0 for o in objs], dtype=np.int8)
+        self.target = np.array([NO_TARGET if o.target_player is None else o.target_player for o in objs],
+                               dtype=np.int64)
+        self.kind = np.array([KIND_BLOB if isinstance(o, Blob) else KIND_PATROL for o in objs], dtype=np.int8)
+        self.speed = np.array([o.speed for o in objs], dtype=np.float64)
+        self.w = np.array([o.size[0] for o in objs], dtype=np.float64)
+        self.h = np.array([o.size[1] for o in objs], dtype=np.float64)
+        self.spawn_x = np.array([o.spawn_position[0] for o in objs], dtype=np.float64)
+        self.spawn_y = np.array([o.spawn_position[1] for o in objs], dtype=np.float64)
+
+        # Errance (Patrol), None -> NaN / has_wander False
+        self.wander_angle = np.full(n, np.nan)
+        self.wander_dist = np.full(n, np.nan)
+        self.wander_x = np.zeros(n)
+        self.wander_y = np.zeros(n)
+        self.has_wander = np.zeros(n, dtype=bool)
+        self.wander_speed = self.speed.copy()
+        for i, o in enumerate(objs):
+            if not isinstance(o, Patrol):
+                continue
+            if o.wander_angle is not None:
+                self.wander_angle[i] = o.wander_angle
+            if o.wander_dist is not None:
+                self.wander_dist[i] = o.wander_dist
+            if o.wander_pos:
+                self.wander_x[i], self.wander_y[i] = o.wander_pos
+                self.has_wander[i] = True
+            self.wander_speed[i] = o.wander_speed
+
+        # Dernières positions vues des joueurs (Patrol) : une colonne par joueur
+        self.pids = []
+        self.known = np.zeros((n, 0), dtype=bool)
+        self.last_x = np.zeros((n, 0))
+        self.last_y = np.zeros((n, 0))
+        self.loaded_last_pos = [o.players_last_pos if isinstance(o, Patrol) else {} for o in objs]
+
+    def store(self) -> None:
+        """Writes the internal state (wander, last seen positions) back into the Enemy objects"""
+        wander_angle = self.wander_angle.tolist()
+        wander_dist = self.wander_dist.tolist()
+        wander_x = self.wander_x.tolist()
+        wander_y = self.wander_y.tolist()
+        has_wander = self.has_wander.tolist()
+        wander_speed = self.wander_speed.tolist()
+        for i, o in enumerate(self.objects):
+            if not isinstance(o, Patrol):
+                continue
+            o.wander_angle = None if wander_angle[i] != wander_angle[i] else wander_angle[i]
+            o.wander_dist = None if wander_dist[i] != wander_dist[i] else wander_dist[i]
+            o.wander_pos = [wander_x[i], wander_y[i]] if has_wander[i] else None
+            o.wander_speed = wander_speed[i]
+            o.players_last_pos = {pid: [float(self.last_x[i, c]), float(self.last_y[i, c])]
+                                  for c, pid in enumerate(self.pids) if self.known[i, c]}
+
+    def write_fields(self, rows: np.ndarray) -> None:
+        """Writes this tick's x, y, vx, vy, flip, state and target of 'rows' into the Enemy objects"""
+        objects = self.objects
+        for i, x, y, vx, vy, flip, state, target in zip(
+                rows.tolist(), self.x[rows].tolist(), self.y[rows].tolist(), self.vx[rows].tolist(),
+                self.vy[rows].tolist(), self.flip[rows].tolist(), self.state[rows].tolist(), self.target[rows].tolist()):
+            o = objects[i]
+            o.x = x
+            o.y = y
+            o.vx = vx
+            o.vy = vy
+            o.flip = flip
+            o.state = STATES[state]
+            o.target_player = None if target == NO_TARGET else target
+
+    def sync_players(self, players: dict) -> None:
+        """Reorders the last seen positions columns to follow the current players dict"""
+        pids = list(players.keys())
+        if pids == self.pids and not self.loaded_last_pos:
+            return
+        n = len(self.objects)
+        known = np.zeros((n, len(pids)), dtype=bool)
+        last_x = np.zeros((n, len(pids)))
+        last_y = np.zeros((n, len(pids)))
+        old = {pid: c for c, pid in enumerate(self.pids)}
+        gone = [pid for pid in self.pids if pid not in players]
+        if gone:
+            # Comme GameServer à la déconnexion : plus de cible vers ce joueur
+            self.target[np.isin(self.target, gone)] = NO_TARGET
+        for c, pid in enumerate(pids):
+            if pid in old:
+                known[:, c] = self.known[:, old[pid]]
+                last_x[:, c] = self.last_x[:, old[pid]]
+                last_y[:, c] = self.last_y[:, old[pid]]
+        if self.loaded_last_pos:
+            column = {pid: c for c, pid in enumerate(pids)}
+            for i, last in enumerate(self.loaded_last_pos):
+                for pid, (lx, ly) in last.items():
+                    if pid in column:
+                        known[i, column[pid]] = True
+                        last_x[i, column[pid]] = lx
+                        last_y[i, column[pid]] = ly
+            self.loaded_last_pos = None
+        self.pids = pids
+        self.known, self.last_x, self.last_y = known, last_x, last_y
+
+    # --- Physique en lot ---
+    def solid_at(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """TilemapServer.solid_check for arrays of pixel positions"""
+        return self.tilemap.solid_check_many(np.stack((x, y), axis=-1))
+
+    def collides(self, idx: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Enemy.check_collision for the enemies 'idx' placed at (x, y)"""
+        w = self.w[idx]
+        h = self.h[idx]
+        e = HITBOX_EPSILON
+        solid = self.solid_at
+        return (solid(x + e + 3, y + e) | solid(x + w - e + 3, y + e)
+                | solid(x + e, y + h - e) | solid(x + w - e, y + h - e))
+
+    def line_of_sight(self, ox: np.ndarray, oy: np.ndarray, tx: np.ndarray, ty: np.ndarray) -> np.ndarray:
+        """
+        EnemyManager.can_see for arrays of (origin, target) pairs: one ray per pair of tiles in the
+        batch (same key as the manager's per-tick cache), counted in the manager's hit / miss counters.
+        """
+        manager = self.manager
+        if not manager.use_los_cache or len(ox) == 0:
+            return self.raycast_los(ox, oy, tx, ty)
+        ts = self.tilemap.tile_size
+        # Une clé entière par paire de tuiles (coordonnées décalées en positif sur 16 bits chacune)
+        tiles = (np.floor(np.stack((ox, oy, tx, ty)) / ts).astype(np.int64) + 0x8000) & 0xFFFF
+        keys = (tiles[0] << 48) | (tiles[1] << 32) | (tiles[2] << 16) | tiles[3]
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        manager.los_misses += len(unique)
+        manager.los_hits += len(keys) - len(unique)
+        if len(unique) == len(keys):
+            return self.raycast_los(ox, oy, tx, ty)
+        return self.raycast_los(ox[first], oy[first], tx[first], ty[first])[inverse.reshape(-1)]
+
+    def raycast_los(self, ox: np.ndarray, oy: np.ndarray, tx: np.ndarray, ty: np.ndarray) -> np.ndarray:
+        """EnemyManager.raycast_los for arrays of (origin, target) pairs"""
+        if len(ox) == 0:
+            return np.zeros(0, dtype=bool)
+        visibility = self.tilemap.visibility
+        if visibility is None:
+            return self.tilemap.segments_clear(ox, oy, tx, ty, LOS_STOP)
+        known, visible = visibility.visible_many(ox, oy, tx, ty)
+        if not known.all():
+            far = ~known
+            visible[far] = self.tilemap.segments_clear(ox[far], oy[far], tx[far], ty[far], LOS_STOP)
+        return visible
+
+    def create_wander_pos(self, idx: np.ndarray, hit_x=None, hit_y=None) -> None:
+        """Patrol.create_wander_pos for the enemies 'idx'"""
+        if len(idx) == 0:
+            return
+        a = self.wander_angle[idx]
+        first = np.isnan(a)
+        a = np.where(first, np.arctan2(self.vy[idx], self.vx[idx]),
+                     a + self.rng.uniform(-pi / 6, pi / 6, len(idx)))
+        a = np.where(a > pi, a - 2 * pi, a)
+        a = np.where(a < -pi, a + 2 * pi, a)
+
+        d = self.wander_dist[idx]
+        d = np.where(np.isnan(d), self.rng.uniform(DIST_WANDER // 2, DIST_WANDER, len(idx)),
+                     np.maximum(d + self.rng.uniform(-(DIST_WANDER // 4), DIST_WANDER // 4, len(idx)), MIN_WANDER_DIST))
+
+        x = self.x[idx]
+        y = self.y[idx]
+        if hit_x is None:
+            hit_x = hit_y = np.zeros(len(idx), dtype=bool)
+        only_x = hit_x & ~hit_y
+        only_y = hit_y & ~hit_x
+        a = np.where(only_x, np.where((a >= 0) & (a <= pi), pi / 2, -pi / 2), a)
+        a = np.where(only_y, np.where((a >= -pi / 2) & (a <= pi / 2), 0.0, pi), a)
+        no_hit = ~hit_x & ~hit_y
+        sx = self.spawn_x[idx] - x
+        sy = self.spawn_y[idx] - y
+        far = no_hit & (np.hypot(sx, sy) > MAX_DISTANCE_FROM_SPAWN)
+        a = np.where(far, np.arctan2(sy, sx), a)
+
+        self.wander_angle[idx] = a
+        self.wander_dist[idx] = d
+        self.wander_x[idx] = x + np.cos(a) * d
+        self.wander_y[idx] = y + np.sin(a) * d
+        self.has_wander[idx] = True
+
+    def wander(self, idx: np.ndarray, delta: np.ndarray) -> tuple:
+        """Patrol.wander for the enemies 'idx' ('delta' ticks each), returns their velocities (vx, vy)"""
+        vel_x = np.zeros(len(idx))
+        vel_y = np.zeros(len(idx))
+        if len(idx) == 0:
+            return vel_x, vel_y
+        self.state[idx] = STATE_IDLE
+        self.create_wander_pos(idx[~self.has_wander[idx]])
+
+        x = self.x[idx]
+        y = self.y[idx]
+        dx = self.wander_x[idx] - x
+        dy = self.wander_y[idx] - y
+        d = np.hypot(dx, dy)
+        moving = d > 1
+
+        m = idx[moving]
+        dm = delta[moving]
+        speed = np.maximum(self.wander_speed[m] - WANDER_SPEED_DECAY * dm, MIN_WANDER_SPEED)
+        self.wander_speed[m] = speed
+        vx = dx[moving] / d[moving] * speed
+        vy = dy[moving] / d[moving] * speed
+        # does_collide : chaque axe depuis la position actuelle
+        hit_x = self.collides(m, x[moving] + vx * dm, y[moving])
+        hit_y = self.collides(m, x[moving], y[moving] + vy * dm)
+        hit = hit_x | hit_y
+        self.create_wander_pos(m[hit], hit_x[hit], hit_y[hit])
+        vel_x[moving] = np.where(hit, 0.0, vx)
+        vel_y[moving] = np.where(hit, 0.0, vy)
+
+        # Position d'errance atteinte : on en choisit une autre, vitesse nulle
+        self.create_wander_pos(idx[~moving])
+        return vel_x, vel_y
+
+    def update_patrols(self, idx: np.ndarray, px: np.ndarray, py: np.ndarray, pid_array: np.ndarray,
+                       delta: np.ndarray) -> None:
+        """Patrol.physics_process for the enemies 'idx', 'delta' ticks each"""
+        n = len(idx)
+        if n == 0:
+            return
+        x0 = self.x[idx].copy()
+        y0 = self.y[idx].copy()
+        known = self.known[idx]
+        last_x = self.last_x[idx]
+        last_y = self.last_y[idx]
+
+        # --- Cible : la dernière position vue la plus proche ---
+        d2 = np.where(known, (last_x - x0[:, None]) ** 2 + (last_y - y0[:, None]) ** 2, np.inf)
+        col = np.argmin(d2, axis=1) if d2.shape[1] else np.zeros(n, dtype=np.int64)
+        has_target = known.any(axis=1)
+        rows = np.arange(n)
+        dist = np.sqrt(d2[rows, col]) if d2.shape[1] else np.full(n, np.inf)
+
+        vel_x = np.zeros(n)
+        vel_y = np.zeros(n)
+        t = idx[has_target]
+        self.state[t] = STATE_RAGE
+        self.wander_angle[t] = np.nan
+        self.wander_dist[t] = np.nan
+        self.has_wander[t] = False
+        self.wander_speed[t] = self.speed[t]
+        self.target[t] = pid_array[col[has_target]]
+
+        chase = has_target & (dist > 5)
+        c = col[chase]
+        tx = last_x[chase, c]
+        ty = last_y[chase, c]
+        vel_x[chase] = (tx - x0[chase]) / dist[chase] * self.speed[idx[chase]]
+        vel_y[chase] = (ty - y0[chase]) / dist[chase] * self.speed[idx[chase]]
+        # Cible cachée ou mur devant : suit le champ de flux (Patrol.follow_flow)
+        chase_rows = np.flatnonzero(chase)
+        blocked = (self.collides(idx[chase_rows], x0[chase_rows] + vel_x[chase_rows], y0[chase_rows])
+                   | self.collides(idx[chase_rows], x0[chase_rows], y0[chase_rows] + vel_y[chase_rows])
+                   | ~self.line_of_sight(x0[chase_rows], y0[chase_rows], tx, ty))
+        if blocked.any():
+            b = chase_rows[blocked]
+            found, wx, wy = self.manager.flow.waypoints_many(x0[b], y0[b])
+            d = np.hypot(wx - x0[b], wy - y0[b])
+            found &= d > 0
+            b, d = b[found], d[found]
+            vel_x[b] = (wx[found] - x0[b]) / d * self.speed[idx[b]]
+            vel_y[b] = (wy[found] - y0[b]) / d * self.speed[idx[b]]
+
+        # Arrivé sur la dernière position vue sans voir le joueur : reprend l'errance
+        close = has_target & ~chase
+        close_rows = np.flatnonzero(close)
+        sees = self.line_of_sight(x0[close], y0[close], px[col[close]], py[col[close]])
+        wandering = ~has_target
+        wandering[close_rows[~sees]] = True
+        vel_x[wandering], vel_y[wandering] = self.wander(idx[wandering], delta[wandering])
+
+        # --- move_and_slide ---
+        nx = x0 + vel_x * delta
+        ny = y0 + vel_y * delta
+        hit_x = self.collides(idx, nx, y0)
+        hit_y = self.collides(idx, x0, ny)
+        self.vx[idx] = np.where(hit_x, 0.0, vel_x)
+        self.vy[idx] = np.where(hit_y, 0.0, vel_y)
+        self.x[idx] = np.where(hit_x, x0, nx)
+        self.y[idx] = np.where(hit_y, y0, ny)
+
+        # --- Animations ---
+        flip = self.flip[idx]
+        vx = self.vx[idx]
+        flip = np.where(chase & (vx < 0), True, np.where(chase & (vx > 0), False, flip))
+        a = self.wander_angle[idx]
+        with np.errstate(invalid='ignore'):
+            inner = (a > -pi / 3) & (a < pi / 3)
+            outer = (a < -2 * pi / 3) | (a > 2 * pi / 3)
+        no_target = ~has_target
+        flip = np.where(no_target & flip & inner, False, np.where(no_target & ~flip & outer, True, flip))
+        self.flip[idx] = flip
+
+        # --- Dernières positions vues (ligne de vue depuis la nouvelle position, distances depuis l'ancienne) ---
+        if len(px):
+            dpx = px[None, :] - x0[:, None]
+            dpy = py[None, :] - y0[:, None]
+            d_player = np.hypot(dpx, dpy)
+            near = (d_player < VISION_DISTANCE_PATROL) & (d_player > 1)
+            check = near | known
+            r, c = np.nonzero(check)
+            visible = np.zeros(check.shape, dtype=bool)
+            visible[r, c] = self.line_of_sight(self.x[idx][r], self.y[idx][r], px[c], py[c])
+            seen = visible & near
+            keep = ~visible & known & (np.hypot(last_x - x0[:, None], last_y - y0[:, None]) > 5)
+            self.last_x[idx] = np.where(seen, px[None, :], last_x)
+            self.last_y[idx] = np.where(seen, py[None, :], last_y)
+            self.known[idx] = seen | keep
+
+    def update_blobs(self, idx: np.ndarray, px: np.ndarray, py: np.ndarray, pid_array: np.ndarray, players: dict,
+                     delta: np.ndarray) -> None:
+        """Blob.physics_process for the enemies 'idx', 'delta' ticks each"""
+        if len(idx) == 0:
+            return
+        x = self.x[idx]
+        y = self.y[idx]
+        vy = np.where(self.solid_at(x, y + 4), 0.0, self.vy[idx])
+
+        d2 = (px[None, :] - x[:, None]) ** 2 + (py[None, :] - y[:, None]) ** 2
+        col = np.argmin(d2, axis=1)
+        dist = np.sqrt(d2[np.arange(len(idx)), col])
+        tx = px[col]
+        ty = py[col]
+        in_range = dist < BLOB_VISION
+        sees = np.zeros(len(idx), dtype=bool)
+        sees[in_range] = self.line_of_sight(x[in_range], y[in_range], tx[in_range], ty[in_range])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            step_x = np.where(dist > 1, (tx - x) / dist * self.speed[idx], 0.0)
+            step_y = np.where(dist > 1, (ty - y) / dist * self.speed[idx], 0.0)
+        vx = np.where(self.collides(idx, x + step_x * delta, y), 0.0, step_x)
+        vy = np.where(self.collides(idx, x, y + (step_y + vy) * delta), 0.0, vy + step_y)
+        self.x[idx] = np.where(sees, np.clip(x + vx * delta, 0, 1000), x)
+        self.y[idx] = np.where(sees, np.clip(y + vy * delta, 0, 1000), y)
+        self.vx[idx] = np.where(sees, vx, 0.0)
+        self.vy[idx] = 0.0
+        self.target[idx] = np.where(sees, pid_array[col], NO_TARGET)
+
+        # Apparition (rare) d'un nouveau blob, vers le dernier joueur du dict comme Blob.physics_process
+        spawn = ~sees & (self.rng.random(len(idx)) < BLOB_SPAWN_CHANCE)
+        if spawn.any():
+            player = players[pid_array[-1]]
+            for i in idx[spawn]:
+                pos = [float(self.x[i]), float(self.y[i])]
+                self.manager.jobs.submit(('spawn', self.ids[i]), distane_to(pos, player),
+                                         self.objects[i].spawn_towards, pos, player)
+
+    def update(self, players: dict, due: list) -> None:
+        """
+        One tick of the (enemy, delta) pairs chosen by EnemyManager.schedule, same behaviour
+        as calling physics_process(delta) on each of them
+        """
+        if self.tilemap is None:
+            self.tilemap = self.manager.tilemap
+        if tuple(self.manager.enemies.keys()) != self.ids:
+            # Ennemis tués / créés : on repart des objets (après y avoir rangé l'état courant)
+            if self.objects:
+                self.store()
+            self.load()
+        if not self.objects:
+            return
+        self.sync_players(players)
+
+        pid_array = np.array(self.pids, dtype=np.int64)
+        px = np.array([p[0] for p in players.values()], dtype=np.float64)
+        py = np.array([p[1] for p in players.values()], dtype=np.float64)
+        delta = np.zeros(len(self.objects))
+        rows = self.rows
+        for enemy, d in due:
+            row = rows.get(enemy.eid)
+            if row is not None:
+                delta[row] = d
+        patrols = np.flatnonzero((self.kind == KIND_PATROL) & (delta > 0))
+        blobs = np.flatnonzero((self.kind == KIND_BLOB) & (delta > 0))
+        self.update_patrols(patrols, px, py, pid_array, delta[patrols])
+        self.update_blobs(blobs, px, py, pid_array, players, delta[blobs])
+        self.write_fields(np.flatnonzero(delta > 0))  # les ennemis endormis ou sautés n'ont pas changé
+
@@ -3,19 +3,69 @@ import pygame
 from math import *
 
 from TilemapServer import PHYSICS_TILES
+from ai_jobs import AIJobQueue, AI_JOB_BUDGET
+from flow_field import FlowField
+from spatial_grid import SpatialGrid
+
+# Niveaux de détail de l'IA selon la distance au joueur le plus proche
+LOD_FULL = 0              # mis à jour à chaque tick
+LOD_REDUCED = 1           # mis à jour tous les LOD_REDUCED_INTERVAL ticks, déplacement multiplié d'autant
+LOD_ASLEEP = 2            # plus du tout mis à jour jusqu'à ce qu'un joueur s'approche
+LOD_NAMES = ("full", "reduced", "asleep")
+LOD_NEAR_DISTANCE = 16*30   # px, au-delà de la zone d'intérêt des clients (400 px + hystérésis)
+LOD_FAR_DISTANCE = 16*60    # px
+LOD_REDUCED_INTERVAL = 4    # ticks
+LOD_CHECK_INTERVAL = 8      # ticks entre deux réévaluations du niveau d'un ennemi (étalées selon l'id)
+LOS_RESULTS_MAX = 50_000    # lignes de vue calculées par la file de travaux gardées d'un tick à l'autre
+MAX_LOS_WAIT = 4            # ticks d'attente (en file ou refusée) après lesquels une ligne de vue est calculée tout de suite
+UNSTUCK_RADIUS = 64         # px, déplacement maximal pour sortir un ennemi d'un mur
+UNSTUCK_STEPS = 8           # pas le long du gradient du champ de distance avant la recherche par sondes
+UNSTUCK_MIN_STEP = 2        # px
 
 class EnemyManager:
-    def __init__(self, tilemap, num_enemies=20):
+    def __init__(self, tilemap, num_enemies=20, vectorized=False, los_cache=True,
+                 lod_near=LOD_NEAR_DISTANCE, lod_far=LOD_FAR_DISTANCE, ai_budget=AI_JOB_BUDGET):
         self.tilemap = tilemap
         self.enemies = {}
         self.next_enemy_id = 1
-        self.players = []
+        self.players = {}         # pid -> PlayerState
+        self.positions = {}       # pid -> (x, y), reconstruit une fois par tick pour les calculs des ennemis
+        # Niveaux de détail : lod_near <= 0 désactive (tout le monde à chaque tick)
+        self.lod_near = lod_near
+        self.lod_far = max(lod_near, lod_far)
+        self.lod_grid = SpatialGrid(max(128, self.lod_far))
+        self.lod_counts = [0, 0, 0]
+        self.tick = 0
+        # Cache des lignes de vue, vidé à chaque tick : (tuile source, tuile cible) -> visible
+        self.use_los_cache = los_cache
+        self.los_cache = {}
+        self.los_hits = 0
+        self.los_misses = 0
+        # Travaux coûteux différés (ai_jobs.py), ai_budget <= 0 : faits tout de suite
+        self.jobs = AIJobQueue(ai_budget)
+        self.los_results = {}     # (tuile source, tuile cible) -> visible, rempli par la file de travaux
+        self.los_waiting = {}     # (tuile source, tuile cible) -> [tick de la première demande sans réponse, de la dernière]
+        self.los_inline = 0       # lignes de vue calculées tout de suite après MAX_LOS_WAIT ticks d'attente
+        self.los_wait_max = 0     # ticks, plus longue attente d'une réponse (file ou calcul tout de suite)
+        # Moteur NumPy optionnel (enemy_engine.py), même comportement que physics_process
+        self.engine = None
+        if vectorized:
+            from enemy_engine import VectorEnemyEngine
+            self.engine = VectorEnemyEngine(self)
         self.reset(tilemap)
 
     def reset(self, tilemap) -> None:
         """Resets all the enemies on the map"""
         self.tilemap = tilemap
         self.enemies.clear()
+        self.jobs.clear()
+        self.los_results.clear()
+        self.los_waiting.clear()
+        # Champ de flux vers les joueurs, pour contourner les murs pendant une poursuite
+        # (vide sur une map streamée par chunks, qui n'a pas de grille dense)
+        self.flow = FlowField(tilemap)
+        if self.engine:
+            self.engine.invalidate()
         # Find spawners
         spawners = getattr(self.tilemap, 'spawners', [])
         for spawner in spawners:
@@ -36,56 +86,211 @@ class EnemyManager:
         if not players:
             return
         self.players = players
+        positions = self.positions = {pid: (player.x, player.y) for pid, player in players.items()}
+        self.los_cache.clear()
+        self.flow.update(positions)
+        due = self.schedule(positions)
+        if self.engine:
+            self.engine.update(positions, due)
+        else:
+            for enemy, delta in due:
+                enemy.physics_process(delta)
+        self.jobs.run()
 
-        enemies = list_copy(self.enemies.items()) #dict can change size when running for loop
-        for _, enemy in enemies:
-            enemy.physics_process(0.0)
+    def schedule(self, positions: dict) -> list:
+        """
+        Level of detail of the AI: returns the (enemy, delta) pairs to update this tick, 'delta'
+        being the number of ticks since the enemy's last update. Enemies further than 'lod_near'
+        from every player update every LOD_REDUCED_INTERVAL ticks, beyond 'lod_far' they sleep.
+        """
+        self.tick += 1
+        tick = self.tick
+        enemies = list_copy(self.enemies.values()) #dict can change size when running for loop
+        if self.lod_near <= 0:
+            self.lod_counts = [len(enemies), 0, 0]
+            return [(enemy, 1) for enemy in enemies]
+
+        grid = self.lod_grid
+        grid.rebuild((pid, p[0], p[1]) for pid, p in positions.items())
+        due = []
+        counts = [0, 0, 0]
+        check = tick % LOD_CHECK_INTERVAL
+        for enemy in enemies:
+            if enemy.lod is None or enemy.eid % LOD_CHECK_INTERVAL == check:
+                x, y = enemy.x, enemy.y
+                if not grid.any_within(x, y, self.lod_far):
+                    lod = LOD_ASLEEP
+                elif grid.any_within(x, y, self.lod_near):
+                    lod = LOD_FULL
+                else:
+                    lod = LOD_REDUCED
+                if lod != LOD_ASLEEP and enemy.lod in (None, LOD_ASLEEP):
+                    enemy.last_tick = tick - 1  # nouveau ou réveillé : pas de rattrapage du temps passé endormi
+                enemy.lod = lod
+            counts[enemy.lod] += 1
+            if enemy.lod == LOD_FULL or (enemy.lod == LOD_REDUCED and (tick + enemy.eid) % LOD_REDUCED_INTERVAL == 0):
+                delta = min(tick - enemy.last_tick, LOD_REDUCED_INTERVAL)
+                enemy.last_tick = tick
+                due.append((enemy, delta))
+        self.lod_counts = counts
+        return due
+
+    def can_see(self, pos: list, target: list, last: bool = False) -> bool:
+        """
+        Returns whether 'target' is visible from 'pos' (nothing from PHYSICS_TILES on the way).
+        Within a tick, the answer is shared by every pair of positions in the same pair of tiles.
+        'last' (the caller's previous answer) is returned while the ray waits in the AI job queue.
+        """
+        if not self.use_los_cache:
+            visible = self.raycast_los(pos, target)
+            return last if visible is None else visible
+        ts = self.tilemap.tile_size
+        key = (int(pos[0] // ts), int(pos[1] // ts), int(target[0] // ts), int(target[1] // ts))
+        visible = self.los_cache.get(key)
+        if visible is None:
+            self.los_misses += 1
+            visible = self.raycast_los(pos, target)
+            if visible is None:
+                return last  # rayon en attente : propre à l'appelant, pas mis en cache
+            self.los_cache[key] = visible
+        else:
+            self.los_hits += 1
+        return visible
+
+    def raycast_los(self, pos: list, target: list) -> bool:
+        """
+        Uncached line of sight, the ray stops 10 px before 'target'.
+        Answered from the map's precomputed visibility table when both tiles are in it,
+        None while the ray waits in the AI job queue (see deferred_los).
+        """
+        visibility = getattr(self.tilemap, 'visibility', None)
+        if visibility is not None:
+            ts = self.tilemap.tile_size
+            visible = visibility.visible(int(pos[0] // ts), int(pos[1] // ts), int(target[0] // ts), int(target[1] // ts))
+            if visible is not None:
+                return visible
+        return self.deferred_los(pos, target)
+
+    def deferred_los(self, pos: list, target: list) -> bool | None:
+        """
+        Ray cast line of sight, as a job of the AI queue: answers with the result of an earlier
+        tick for the same pair of tiles, or None while the ray is queued (or refused, queue full).
+        A pair of tiles asked for MAX_LOS_WAIT ticks without an answer gets its ray cast right
+        away and its queued job cancelled; a queued job not run within MAX_LOS_WAIT ticks of the
+        first request expires. The wait restarts when nobody asked for MAX_LOS_WAIT ticks.
+        """
+        if not self.jobs.enabled:
+            return self.cast_los(pos, target)
+        ts = self.tilemap.tile_size
+        key = (int(pos[0] // ts), int(pos[1] // ts), int(target[0] // ts), int(target[1] // ts))
+        visible = self.los_results.get(key)
+        if visible is None:
+            tick = self.jobs.tick
+            asked = self.los_waiting.get(key)
+            if asked is None or tick - asked[1] > MAX_LOS_WAIT:
+                if len(self.los_waiting) >= LOS_RESULTS_MAX:
+                    self.los_waiting.clear()
+                asked = self.los_waiting[key] = [tick, tick]
+            elif tick - asked[0] >= MAX_LOS_WAIT:
+                self.jobs.cancel(('los', key))
+                self.los_inline += 1
+                self.los_job(key, pos, target)
+                return self.los_results[key]
+            asked[1] = tick
+            # Les rayons les plus courts (ennemis les plus proches des joueurs) passent en premier
+            self.jobs.submit(('los', key), distane_to(pos, target), self.los_job,
+                             key, [pos[0], pos[1]], [target[0], target[1]], expires=asked[0] + MAX_LOS_WAIT)
+        return visible
+
+    def los_job(self, key: tuple, pos: list, target: list) -> None:
+        if len(self.los_results) >= LOS_RESULTS_MAX:
+            self.los_results.clear()
+        self.los_results[key] = self.cast_los(pos, target)
+        asked = self.los_waiting.pop(key, None)
+        if asked is not None:
+            self.los_wait_max = max(self.los_wait_max, self.jobs.tick - asked[0])
+
+    def cast_los(self, pos: list, target: list) -> bool:
+        """Line of sight by a grid raycast, stopped 10 px before 'target'"""
+        return not raycast_collide(pos, angle(vector_to(pos, target)), self.tilemap,
+                                   distane_to(pos, target) - 10, 4, PHYSICS_TILES)
+
+    def player_distance(self, pos: list) -> float:
+        """Distance from 'pos' to the closest player (priority of the AI jobs)"""
+        return min((distane_to(pos, player) for player in self.positions.values()), default=inf)
 
 class Enemy:
+    # Champs fixes (pas de __dict__ ni de dict 'properties') : moins de mémoire par ennemi et accès plus rapides
+    __slots__ = ('eid', 'x', 'y', 'vx', 'vy', 'target_player', 'flip', 'state',
+                 'enemy_manager', 'speed', 'size', 'spawn_position', 'lod', 'last_tick', 'seen')
+    type = "enemy"
+
     def __init__(self, eid: int, pos: list, enemy_manager: EnemyManager, speed: float, size: tuple = (18, 25)):
         self.eid = eid
-        self.properties = {
-            'x': pos[0],
-            'y': pos[1],
-            'vx': 0.0,
-            'vy': 0.0,
-            'target_player': None,
-            'flip': False,
-            'state': "idle",
-        }
+        self.x: float = pos[0]
+        self.y: float = pos[1]
+        self.vx: float = 0.0
+        self.vy: float = 0.0
+        self.target_player: int | None = None
+        self.flip: bool = False
+        self.state: str = "idle"   # "idle" ou "rage"
         self.enemy_manager = enemy_manager
         self.speed = speed
         self.size = size
         self.spawn_position = pos
+        self.lod = None           # niveau de détail attribué par EnemyManager.schedule
+        self.last_tick = None     # tick de la dernière mise à jour
+        self.seen = {}            # pid -> dernière réponse de can_see_player, reprise tant qu'un rayon est en attente
         print(f"ennemi créé en {pos} !")
         self.unstuck()
 
-    def can_see_player(self, player: list) -> None:
-        """Returns a boolean indicating whether the enemy can see the player"""
-        return not raycast_collide([self.properties['x'], self.properties['y']],
-                                    angle(vector_to([self.properties['x'], self.properties['y']], player)),
-                                    self.enemy_manager.tilemap,
-                                    distane_to([self.properties['x'], self.properties['y']], player) - 10,
-                                    4,
-                                    PHYSICS_TILES
-                                    )
+    def can_see_player(self, player: list, pid: int) -> bool:
+        """Returns a boolean indicating whether the enemy can see the player 'pid' at 'player'"""
+        self.seen[pid] = self.enemy_manager.can_see([self.x, self.y], player, self.seen.get(pid, False))
+        return self.seen[pid]
     def create_enemy(self, pos: list, enemy_type: str) -> None:
         self.enemy_manager.create_enemy(pos, enemy_type)
 
     def unstuck(self): 
 
         """deplace patrol si spawn dans mur"""
-        if not self.check_collision((self.properties['x'], self.properties['y'])):
+        field = self.enemy_manager.tilemap.distance_field
+        w, h = self.size
+        # Hitbox de check_collision (points du haut décalés de 3 px) vue comme un disque autour de son centre
+        half_w, half_h = (w + 3) / 2, h / 2
+        radius = hypot(half_w, half_h)
+        cx, cy = self.x + half_w, self.y + half_h
+        if field is not None and field.clearance(cx, cy) >= radius:
+            return  # loin de tout mur, sans tester les coins
+        if not self.check_collision((self.x, self.y)):
             return
 
-        for r in range(2, 64, 4):
+        if field is not None:
+            # Remonte le gradient de la distance aux murs jusqu'à une position où la hitbox est libre
+            x, y = cx, cy
+            for _ in range(UNSTUCK_STEPS):
+                gx, gy = field.gradient(x, y)
+                if gx == 0 and gy == 0:
+                    break
+                # Demi-pas vers le dégagement du disque : s'arrête près du mur plutôt qu'au milieu du vide
+                move = max((radius - field.distance(x, y)) / 2, UNSTUCK_MIN_STEP)
+                x += gx * move
+                y += gy * move
+                if hypot(x - cx, y - cy) > UNSTUCK_RADIUS:
+                    break
+                if not self.check_collision((x - half_w, y - half_h)):
+                    self.x = x - half_w
+                    self.y = y - half_h
+                    return
+
+        for r in range(2, UNSTUCK_RADIUS, 4):
             for angle_deg in range(0, 360, 45):
                 rad = radians(angle_deg)
-                nx = self.properties['x'] + cos(rad) * r
-                ny = self.properties['y'] + sin(rad) * r
+                nx = self.x + cos(rad) * r
+                ny = self.y + sin(rad) * r
                 if not self.check_collision((nx, ny)):
-                    self.properties['x'] = nx
-                    self.properties['y'] = ny
+                    self.x = nx
+                    self.y = ny
                     return
 
     def check_collision(self, pos: list) -> bool:
@@ -112,29 +317,29 @@ class Enemy:
         [False, True]: collision on the y-axis
         """
         res = [False, False]
-        if self.check_collision((new_pos[0], self.properties['y'])):
+        if self.check_collision((new_pos[0], self.y)):
             res[0] = True
-        if self.check_collision((self.properties['x'], new_pos[1])):
+        if self.check_collision((self.x, new_pos[1])):
             res[1] = True
         return res
 
     def move_and_slide(self, velocity: list, delta: float) -> None:
         """
-        Applies the velocity and updates the position
+        Applies the velocity (per tick) for 'delta' ticks and updates the position
         (verifying collisions) 
         """
-        self.properties['vx'] = velocity[0]
-        self.properties['vy'] = velocity[1]
-        new_pos = [self.properties['x'] + self.properties['vx'], self.properties['y'] + self.properties['vy']]
+        self.vx = velocity[0]
+        self.vy = velocity[1]
+        new_pos = [self.x + self.vx * delta, self.y + self.vy * delta]
         collision = self.does_collide(new_pos)
         if collision[0]:
-            self.properties['vx'] = 0
+            self.vx = 0
         else:
-            self.properties['x'] = new_pos[0]
+            self.x = new_pos[0]
         if collision[1]:
-            self.properties['vy'] = 0
+            self.vy = 0
         else:
-            self.properties['y'] = new_pos[1]
+            self.y = new_pos[1]
 
     def damage():
         pass
@@ -143,15 +348,17 @@ class Enemy:
         pass
 
 class Blob(Enemy):
+    __slots__ = ()
+    type = "blob"
+
     def __init__(self, eid: int, pos: list, enemy_manager: EnemyManager):
         super().__init__(eid, pos, enemy_manager, 1.5)
-        self.properties['type'] = "blob"
     
     def physics_process(self, delta: float) -> None:
         """The physics engine of the enemy called every tick by EnemyManager.update()"""
-        pos = [self.properties['x'], self.properties['y']]
-        velocity = [self.properties['vx'], self.properties['vy']]
-        players = self.enemy_manager.players
+        pos = [self.x, self.y]
+        velocity = [self.vx, self.vy]
+        players = self.enemy_manager.positions
         tilemap = self.enemy_manager.tilemap
 
         # --- Gravité ---
@@ -168,8 +375,8 @@ class Blob(Enemy):
             if closest_dist == None or closest_dist > dist:
                 closest_dist,closest_pid = dist,pid
 
-        if distane_to(pos, players[closest_pid]) < 16*30 and self.can_see_player(players[closest_pid]):
-            self.properties['target_player'] = closest_pid
+        if distane_to(pos, players[closest_pid]) < 16*30 and self.can_see_player(players[closest_pid], closest_pid):
+            self.target_player = closest_pid
             step = [0,0]
             dist = distane_to(pos, players[closest_pid])
             if dist > 1:
@@ -177,8 +384,8 @@ class Blob(Enemy):
                 step = [i * self.speed for i in step]
 
             # --- Test collisions map ---
-            new_x = pos[0] + step[0]
-            new_y = pos[1] + step[1] + velocity[1]
+            new_x = pos[0] + step[0] * delta
+            new_y = pos[1] + (step[1] + velocity[1]) * delta
 
             if not self.check_collision((new_x, pos[1])):
                 velocity[0] = step[0]
@@ -191,26 +398,31 @@ class Blob(Enemy):
                 velocity[1] = 0
 
             # Limites de la map
-            pos[0] = max(0, min(pos[0] + velocity[0], 1000))
-            pos[1] = max(0, min(pos[1] + velocity[1], 1000))
+            pos[0] = max(0, min(pos[0] + velocity[0] * delta, 1000))
+            pos[1] = max(0, min(pos[1] + velocity[1] * delta, 1000))
 
             velocity[1] = 0
 
         else:
-            self.properties['target_player'] = None
+            self.target_player = None
             velocity = [0,0]
             
             # test
             if random.randint(0, 500) == 0:
-                new_blob_pos = raycast_pos(pos, angle(vector_to(pos, players[pid])), tilemap, distane_to(pos, players[pid]) - 10, 4, PHYSICS_TILES, 10, True)
-                if new_blob_pos != None:
-                    self.create_enemy(new_blob_pos, "blob")
-                else:
-                    print("raycast_pos failed")
-        self.properties['x'] = pos[0]
-        self.properties['y'] = pos[1]
-        self.properties['vx'] = velocity[0]
-        self.properties['vy'] = velocity[1]
+                self.enemy_manager.jobs.submit(('spawn', self.eid), distane_to(pos, players[pid]),
+                                               self.spawn_towards, [pos[0], pos[1]], players[pid])
+        self.x = pos[0]
+        self.y = pos[1]
+        self.vx = velocity[0]
+        self.vy = velocity[1]
+
+    def spawn_towards(self, pos: list, player: list) -> None:
+        """Spawns a new blob against the first wall between 'pos' and 'player' (AI job)"""
+        new_blob_pos = raycast_pos(pos, angle(vector_to(pos, player)), self.enemy_manager.tilemap, distane_to(pos, player) - 10, 4, PHYSICS_TILES, 10, True)
+        if new_blob_pos != None:
+            self.create_enemy(new_blob_pos, "blob")
+        else:
+            print("raycast_pos failed")
 
 VISION_DISTANCE_PATROL = 16*8
 DIST_WANDER = 8
@@ -220,9 +432,11 @@ WANDER_SPEED_DECAY = 0.01
 MAX_DISTANCE_FROM_SPAWN = 16*12
 
 class Patrol(Enemy):
+    __slots__ = ('players_last_pos', 'wander_pos', 'wander_angle', 'wander_dist', 'wander_speed')
+    type = "patrol"
+
     def __init__(self, eid: int, pos: list, enemy_manager: EnemyManager):
         super().__init__(eid, pos, enemy_manager, 1.5 * 1.5)
-        self.properties['type'] = "patrol"
         self.players_last_pos = {}
         self.wander_pos = []
         self.wander_angle = None
@@ -231,9 +445,9 @@ class Patrol(Enemy):
     
     def create_wander_pos(self, hit_result: list = [False, False]) -> None:
         """Creates a wandering position when the patrol doesn't see the player"""
-        pos = [self.properties['x'], self.properties['y']]
+        pos = [self.x, self.y]
         if self.wander_angle == None:
-            self.wander_angle = angle([self.properties['vx'], self.properties['vy']])
+            self.wander_angle = angle([self.vx, self.vy])
             #print("first", self.wander_angle)
         else:
             self.wander_angle += random.uniform(-pi/6, pi/6)
@@ -245,7 +459,7 @@ class Patrol(Enemy):
         else:
             self.wander_dist = max(self.wander_dist + random.uniform(-DIST_WANDER//4, DIST_WANDER//4), MIN_WANDER_DIST)
         
-        #self.wander_pos = [self.properties['x'] + random.choice((-1, 1)) * dist, self.properties['y'] + random.randint(int(-dist), int(dist))]
+        #self.wander_pos = [self.x + random.choice((-1, 1)) * dist, self.y + random.randint(int(-dist), int(dist))]
 
         if hit_result[0] and not hit_result[1]: # round angle to -pi/2 or pi/2
             if self.wander_angle >= 0 and self.wander_angle <= pi:
@@ -262,37 +476,53 @@ class Patrol(Enemy):
             if distane_to(pos, self.spawn_position) > MAX_DISTANCE_FROM_SPAWN:
                 self.wander_angle = angle(sub_vecs(self.spawn_position, pos))
         self.wander_pos = add_vecs(vec_from_angle(self.wander_dist, self.wander_angle), pos)
-        #print(self.wander_pos, self.properties['x'], self.properties['y'])
+        #print(self.wander_pos, self.x, self.y)
         #print(f"dist : {self.wander_dist}")
         #print(f"angle : {self.wander_angle}")
 
-    def wander(self) -> list:
-        pos = [self.properties['x'], self.properties['y']]
-        self.properties['state'] = 'idle'
+    def request_wander_pos(self, hit_result: list = [False, False]) -> None:
+        """create_wander_pos as a job of the AI queue, the new position is used from the next tick"""
+        pos = [self.x, self.y]
+        self.enemy_manager.jobs.submit(('wander', self.eid), self.enemy_manager.player_distance(pos),
+                                       self.create_wander_pos, hit_result)
+
+    def follow_flow(self, velocity: list) -> list:
+        """Velocity along the flow field (around the walls), or 'velocity' if the field doesn't reach the patrol"""
+        pos = [self.x, self.y]
+        waypoint = self.enemy_manager.flow.waypoint(pos[0], pos[1])
+        if waypoint is None or distane_to(pos, waypoint) == 0:
+            return velocity
+        return [i * self.speed for i in normalized(vector_to(pos, waypoint))]
+
+    def wander(self, delta: float = 1) -> list:
+        pos = [self.x, self.y]
+        self.state = 'idle'
         if not self.wander_pos:
-            self.create_wander_pos()
+            self.request_wander_pos()
+            if not self.wander_pos:
+                return [0, 0] # position d'errance pas encore calculée
         #print(distane_to(self.wander_pos, pos))
         velocity = [0,0]
         if distane_to(self.wander_pos, pos) > 1:
             velocity = normalized(vector_to(pos, self.wander_pos))
-            self.wander_speed = max(self.wander_speed - WANDER_SPEED_DECAY, MIN_WANDER_SPEED) # * delta
+            self.wander_speed = max(self.wander_speed - WANDER_SPEED_DECAY * delta, MIN_WANDER_SPEED)
             velocity = [i * self.wander_speed for i in velocity]
-            new_x = pos[0] + velocity[0] # * delta
-            new_y = pos[1] + velocity[1] # * delta
+            new_x = pos[0] + velocity[0] * delta
+            new_y = pos[1] + velocity[1] * delta
             hit_result = self.does_collide([new_x, new_y])
             if hit_result != [False, False]: # encountered a wall
                 #print(f"{self.eid} encountered a wall")
-                self.create_wander_pos(hit_result)
+                self.request_wander_pos(hit_result)
                 velocity = [0,0]
         else: # reached wander pos
             #print(f"{self.eid} reached wander pos")
-            self.create_wander_pos()
+            self.request_wander_pos()
         return velocity
 
     def physics_process(self, delta: float) -> None:
         """The physics engine of the enemy called every tick by EnemyManager.update()"""
-        pos = [self.properties['x'], self.properties['y']]
-        players = self.enemy_manager.players
+        pos = [self.x, self.y]
+        players = self.enemy_manager.positions
         
         # --- Trouver la cible la plus proche ---
         closest_dist = None
@@ -306,19 +536,23 @@ class Patrol(Enemy):
         velocity = [0,0]
         if closest_pid: # if has target
             dist = sqrt(closest_dist)
-            self.properties['state'] = 'rage'
+            self.state = 'rage'
             self.wander_angle = None
             self.wander_dist = None
             self.wander_pos = None
             self.wander_speed = self.speed
-            self.properties['target_player'] = closest_pid
+            self.target_player = closest_pid
             if dist > 5:
                 velocity = normalized(vector_to(pos, self.players_last_pos[closest_pid]))
                 velocity = [i * self.speed for i in velocity]
-            elif not self.can_see_player(players[closest_pid]):
-                velocity = self.wander()
+                # Cible cachée ou mur devant : contourne par le champ de flux
+                if (not self.enemy_manager.can_see(pos, self.players_last_pos[closest_pid], self.seen.get(closest_pid, False))
+                        or self.does_collide(add_vecs(pos, velocity)) != [False, False]):
+                    velocity = self.follow_flow(velocity)
+            elif not self.can_see_player(players[closest_pid], closest_pid):
+                velocity = self.wander(delta)
         else:
-            velocity = self.wander()
+            velocity = self.wander(delta)
         
         self.move_and_slide(velocity, delta)
 
@@ -326,19 +560,19 @@ class Patrol(Enemy):
 
         if closest_pid:
             if sqrt(closest_dist) > 5:
-                if self.properties['vx'] < 0:
-                    self.properties['flip'] = True
-                elif self.properties['vx'] > 0:
-                    self.properties['flip'] = False
-        else:
-            if self.properties['flip'] and self.wander_angle > -pi/3 and self.wander_angle < pi/3:
-                self.properties['flip'] = False
-            elif (not self.properties['flip']) and (self.wander_angle < -2*pi/3 or self.wander_angle > 2*pi/3):
-                self.properties['flip'] = True
+                if self.vx < 0:
+                    self.flip = True
+                elif self.vx > 0:
+                    self.flip = False
+        elif self.wander_angle is not None: # None tant que la position d'errance est en attente
+            if self.flip and self.wander_angle > -pi/3 and self.wander_angle < pi/3:
+                self.flip = False
+            elif (not self.flip) and (self.wander_angle < -2*pi/3 or self.wander_angle > 2*pi/3):
+                self.flip = True
 
         players_last_pos = {}
         for pid in players.keys():
-            if self.can_see_player(players[pid]):
+            if self.can_see_player(players[pid], pid):
                 if distane_to(players[pid], pos) < VISION_DISTANCE_PATROL and distane_to(players[pid], pos) > 1:
                     players_last_pos[pid] = [players[pid][0],players[pid][1]]
             else:
@@ -440,25 +674,110 @@ def is_within(pos: list, pos1: list, pos2: list) -> bool:
     pos_r2 = [pos1[i] >= pos[i] and pos2[i] <= pos[i] for i in range(2)]
     return (pos_r1[0] and pos_r1[1]) or (pos_r2[0] and pos_r2[1])
 
+HIT_EPSILON = 1e-9 # recul hors de la tuile touchée (raycast_pos avec fix_collisions)
+SPHERE_MIN_STEP = 8 # px, en dessous le parcours tuile par tuile reprend (raycast_grid)
+
+class RaycastHit:
+    """
+    Result of a grid raycast: the 'tile' hit (tile coordinates), its 'tile_type', the 'face'
+    the ray entered it through ('left', 'right', 'top', 'bottom', or None if the ray started
+    inside it), the exact impact position 'pos' and the distance 'dist' from the origin.
+    """
+    def __init__(self, tile: tuple, tile_type: str, face: str | None, pos: list, dist: float):
+        self.tile = tile
+        self.tile_type = tile_type
+        self.face = face
+        self.pos = pos
+        self.dist = dist
+
+def raycast_grid(pos: list, angle: float, tilemap, dist_max: float = 1000, mask: list = []) -> RaycastHit | None:
+    """
+    Casts a ray from 'pos' with a given 'angle' through the tile grid of the 'tilemap' (Amanatides & Woo traversal):
+    every tile crossed by the ray is visited exactly once, in order, until one belongs to the 'mask'
+    (any tile if 'mask' is empty) or the ray is longer than 'dist_max'.
+    Returns a RaycastHit for the first tile hit, or 'None' otherwise.
+    When the mask is PHYSICS_TILES, the free space given by the map's distance field is skipped
+    first (sphere tracing), the traversal only starts near the walls.
+    """
+    if dist_max < 0:
+        return None
+    ts = tilemap.tile_size
+    tx, ty = int(pos[0] // ts), int(pos[1] // ts)
+    tile_type = tilemap.tile_type(tx, ty)
+    if (mask == [] and tile_type != None) or (tile_type in mask):
+        return RaycastHit((tx, ty), tile_type, None, [pos[0], pos[1]], 0.0)
+
+    dx, dy = cos(angle), sin(angle)
+    # Sphere tracing : avance tant que le champ de distance garantit qu'aucun mur n'est à portée
+    start = 0.0
+    ox, oy = pos[0], pos[1]
+    field = getattr(tilemap, 'distance_field', None)
+    if field is not None and (mask is PHYSICS_TILES or mask == PHYSICS_TILES):
+        while True:
+            step = field.clearance(pos[0] + dx * start, pos[1] + dy * start)
+            if step < SPHERE_MIN_STEP:
+                break
+            start += step
+            if start > dist_max:
+                return None
+        if start:
+            ox, oy = pos[0] + dx * start, pos[1] + dy * start
+            tx, ty = int(ox // ts), int(oy // ts)
+
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # Distance le long du rayon jusqu'à la prochaine frontière verticale / horizontale, et entre deux frontières
+    if dx != 0:
+        t_max_x = start + ((tx + (dx > 0)) * ts - ox) / dx
+        t_delta_x = ts / abs(dx)
+    else:
+        t_max_x = t_delta_x = inf
+    if dy != 0:
+        t_max_y = start + ((ty + (dy > 0)) * ts - oy) / dy
+        t_delta_y = ts / abs(dy)
+    else:
+        t_max_y = t_delta_y = inf
+
+    while True:
+        if t_max_x < t_max_y:
+            dist = t_max_x
+            tx += step_x
+            t_max_x += t_delta_x
+            face = 'left' if step_x > 0 else 'right'
+        else:
+            dist = t_max_y
+            ty += step_y
+            t_max_y += t_delta_y
+            face = 'top' if step_y > 0 else 'bottom'
+        if dist > dist_max:
+            return None
+        tile_type = tilemap.tile_type(tx, ty)
+        if (mask == [] and tile_type != None) or (tile_type in mask):
+            hit_pos = [pos[0] + dx * dist, pos[1] + dy * dist]
+            # La coordonnée de la face touchée est exacte
+            if face == 'left':
+                hit_pos[0] = tx * ts
+            elif face == 'right':
+                hit_pos[0] = (tx + 1) * ts
+            elif face == 'top':
+                hit_pos[1] = ty * ts
+            else:
+                hit_pos[1] = (ty + 1) * ts
+            return RaycastHit((tx, ty), tile_type, face, hit_pos, dist)
+
 def raycast_collide(pos: list, angle: float, tilemap, dist_max: float = 1000, dist_check: float = 4, mask: list = [], return_pos: bool = False) -> bool | list:
     """
     Creates a raycast starting from 'pos' with a given 'angle', and checks whether it hits an element of the 'tilemap' belonging to the 'mask' (if 'mask' is not empty).
-    The raycast uses a maximum distance 'dist_max' and a step distance 'dist_check'.
+    The raycast uses a maximum distance 'dist_max'; every tile crossed is checked (see raycast_grid), 'dist_check' is only kept for compatibility.
     Returns a boolean indicating whether the raycast hit something.
-    Optional parameter: 'return_pos', which returns the first (approximate) position where the raycast hits something, if any, instead of a boolean.
-    """
-    vec = vec_from_angle(dist_check, angle)
-    dist = 0
-    pos_check = pos
-    while dist <= dist_max:
-        check_type = tilemap.check_type((pos_check))
-        if (mask == [] and check_type != None) or (check_type in mask):
-            if return_pos:
-                return pos_check
-            return True
-        pos_check = add_vecs(pos_check, vec)
-        dist += dist_check
-    return False
+    Optional parameter: 'return_pos', which returns the exact position where the raycast hits something, if any, instead of a boolean.
+    """
+    hit = raycast_grid(pos, angle, tilemap, dist_max, mask)
+    if hit is None:
+        return False
+    if return_pos:
+        return hit.pos
+    return True
 
 def is_round(num: float) -> bool:
     """
@@ -481,41 +800,22 @@ def round_pos_if_possible(pos: list, margin: float) -> list:
 def raycast_pos(pos: list, angle: float, tilemap, dist_max: float = 1000, dist_check: float = 4, mask: list = [], precision : int = 10, fix_collisions: bool = False) -> list | None:
     """
     Creates a raycast starting from 'pos' with a given 'angle', and checks whether it hits an element of the 'tilemap' belonging to the 'mask' (if the 'mask' is not empty).
-    The raycast uses a maximum distance 'dist_max' and a step distance 'dist_check'.
-    Returns the impact position of the raycast if it hits something, or 'None' otherwise.
+    The raycast uses a maximum distance 'dist_max'.
+    Returns the exact impact position of the raycast if it hits something, or 'None' otherwise.
 
     Optional parameters:
-        'precision': sets the number of steps used to make the impact position more accurate
+        'precision', 'dist_check': kept for compatibility, the impact position from raycast_grid is already exact
         'fix_collision': adjusts the returned position so it is outside the hit tile (useful for spawning a monster at the desired position)
 
     """
-    vec = vec_from_angle(dist_check, angle)
-    dist = 0
-    pos_check = raycast_collide(pos, angle, tilemap, dist_max, dist_check, mask, True)
-    if not pos_check:
+    hit = raycast_grid(pos, angle, tilemap, dist_max, mask)
+    if hit is None:
         return None
-    
-    for _ in range(precision):
-        vec = [i / 2 for i in vec]
-        check_type = tilemap.check_type((pos_check))
-        if (mask == [] and check_type != None) or (check_type in mask):
-            pos_check = sub_vecs(pos_check, vec)
-        else:
-            pos_check = add_vecs(pos_check, vec)
-    
-    # Adjustments
-    if precision >= 10:
-        pos_check = round_pos_if_possible(pos_check, dist_check * 2**-(precision - 1))
-        if fix_collisions:
-            if is_round(pos_check[0]) and angle >= -pi/2 and angle <= pi/2: # collides with left side of a tile
-                pos_check[0] -= 0.0000000000001
-            if is_round(pos_check[1]) and angle >= 0 and angle <= pi: # collides with up side of a tile
-                pos_check[1] -= 0.0000000000001
-
+    pos_check = hit.pos
+    if fix_collisions:
+        # Les faces droite / bas sont déjà hors de la tuile touchée (floor)
+        if hit.face == 'left':
+            pos_check[0] -= HIT_EPSILON
+        elif hit.face == 'top':
+            pos_check[1] -= HIT_EPSILON
     return pos_check
-
-""" todo:
-create class for raycast and vectors
-add documentation
-add side of block raycast hit in class
-"""
\ No newline at end of file
@@ -0,0 +1,131 @@
+from collections import deque
+from math import ceil
+
+import numpy as np
+
+# Champ de flux partagé par tous les ennemis : un seul parcours en largeur
+# (multi-sources, depuis les tuiles des joueurs) sur la grille de collision donne
+# pour chaque case atteinte la case suivante vers le joueur le plus proche.
+# Un ennemi bloqué par un mur lit juste sa case au lieu de chercher un chemin.
+# Le parcours est refait paresseusement, seulement quand un joueur a changé de
+# tuile depuis le dernier et qu'un ennemi demande une direction.
+
+FLOW_MAX_DISTANCE = 48        # cases parcourues au plus depuis un joueur (coût borné sur les grandes maps)
+HITBOX_OFFSET_X = 3           # les points hauts de Enemy.check_collision sont décalés de 3 px à droite
+
+# Voisins (dx, dy) : orthogonaux puis diagonaux (une diagonale ne coupe pas de coin)
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+class FlowField:
+    """
+    Next step towards the closest player for every cell of a TilemapServer grid.
+    A cell is the top-left tile of an enemy hitbox ('size', in px): it is passable when
+    every tile under the hitbox is free.
+    """
+    def __init__(self, tilemap, size: tuple = (18, 25)):
+        self.tilemap = tilemap
+        ts = tilemap.tile_size
+        self.origin = tilemap.origin
+        self.width = tilemap.width
+        self.height = tilemap.height
+        self.block = (ceil((size[0] + HITBOX_OFFSET_X) / ts), ceil(size[1] / ts))
+        # Position visée dans une case : la hitbox centrée dans le bloc de tuiles libres
+        self.anchor = ((self.block[0] * ts - size[0] - HITBOX_OFFSET_X) / 2, (self.block[1] * ts - size[1]) / 2)
+
+        bw, bh = self.block
+        free = np.ones((self.height + bh - 1, self.width + bw - 1), dtype=bool)  # hors de la grille : vide
+        free[:self.height, :self.width] = ~tilemap.solid
+        passable = np.ones((self.height, self.width), dtype=bool)
+        for dy in range(bh):
+            for dx in range(bw):
+                passable &= free[dy:dy + self.height, dx:dx + self.width]
+        self.passable = passable.ravel().tolist()
+
+        self.sources = ()
+        self.dirty = False
+        self.next_cell = [-1] * (self.width * self.height)
+        self.next_array = None
+        self.rebuilds = 0
+
+    def update(self, players: dict) -> None:
+        """Records the players' tiles, the field is rebuilt on the next query if they changed"""
+        ts = self.tilemap.tile_size
+        sources = set()
+        for player in players.values():
+            tx = int(player[0] // ts) - self.origin[0]
+            ty = int(player[1] // ts) - self.origin[1]
+            # Toutes les cases dont la hitbox recouvre la tuile du joueur
+            for dy in range(self.block[1]):
+                for dx in range(self.block[0]):
+                    x, y = tx - dx, ty - dy
+                    if 0 <= x < self.width and 0 <= y < self.height and self.passable[y * self.width + x]:
+                        sources.add(y * self.width + x)
+        sources = tuple(sorted(sources))
+        if sources != self.sources:
+            self.sources = sources
+            self.dirty = True
+
+    def rebuild(self) -> None:
+        """Multi-source BFS from the players' cells, each reached cell points to the one it was reached from"""
+        w, h = self.width, self.height
+        passable = self.passable
+        next_cell = [-1] * (w * h)
+        dist = {cell: 0 for cell in self.sources}
+        queue = deque(self.sources)
+        while queue:
+            cell = queue.popleft()
+            d = dist[cell] + 1
+            if d > FLOW_MAX_DISTANCE:
+                continue
+            y, x = divmod(cell, w)
+            for dx, dy in NEIGHBOURS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < w and 0 <= ny < h):
+                    continue
+                n = ny * w + nx
+                if n in dist or not passable[n]:
+                    continue
+                if dx and dy and not (passable[y * w + nx] and passable[ny * w + x]):
+                    continue
+                dist[n] = d
+                next_cell[n] = cell
+                queue.append(n)
+        self.next_cell = next_cell
+        self.next_array = None
+        self.dirty = False
+        self.rebuilds += 1
+
+    def waypoint(self, x: float, y: float) -> list | None:
+        """Pixel position the enemy at (x, y) should head for, None if the field does not reach it"""
+        if self.dirty:
+            self.rebuild()
+        ts = self.tilemap.tile_size
+        gx = int(x // ts) - self.origin[0]
+        gy = int(y // ts) - self.origin[1]
+        if not (0 <= gx < self.width and 0 <= gy < self.height):
+            return None
+        n = self.next_cell[gy * self.width + gx]
+        if n < 0:
+            return None
+        ny, nx = divmod(n, self.width)
+        return [(nx + self.origin[0]) * ts + self.anchor[0], (ny + self.origin[1]) * ts + self.anchor[1]]
+
+    def waypoints_many(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """waypoint() for arrays of positions, returns (found, wx, wy)"""
+        if self.dirty:
+            self.rebuild()
+        if self.next_array is None:
+            self.next_array = np.array(self.next_cell, dtype=np.int64)
+        ts = self.tilemap.tile_size
+        gx = np.floor(x / ts).astype(np.int64) - self.origin[0]
+        gy = np.floor(y / ts).astype(np.int64) - self.origin[1]
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        n = np.full(len(x), -1, dtype=np.int64)
+        if len(self.next_array):
+            n[inside] = self.next_array[gy[inside] * self.width + gx[inside]]
+        found = n >= 0
+        ny, nx = np.divmod(n, max(1, self.width))
+        wx = (nx + self.origin[0]) * ts + self.anchor[0]
+        wy = (ny + self.origin[1]) * ts + self.anchor[1]
+        return found, wx, wy
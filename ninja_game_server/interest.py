@@ -0,0 +1,54 @@
+from spatial_grid import SpatialGrid
+
+INTEREST_RADIUS = 400      # px, couvre la vue du client (320x180) même dézoomée
+INTEREST_HYSTERESIS = 64   # px en plus avant qu'une entité visible ne sorte
+MAX_ENTITIES_PER_SNAPSHOT = 0xFFFF  # les compteurs du snapshot delta (type 6) sont des u16
+
+
+class InterestManager:
+    """
+    Area-of-interest filtering: every client only receives the players and enemies
+    within 'radius' of its own player. An entity already sent to a client stays
+    until it goes further than 'radius + hysteresis', so nothing flickers at the border.
+    """
+    def __init__(self, radius: float = INTEREST_RADIUS, hysteresis: float = INTEREST_HYSTERESIS):
+        self.radius = radius
+        self.hysteresis = hysteresis
+        self.players_grid = SpatialGrid()
+        self.enemies_grid = SpatialGrid()
+        self.visible = {}  # addr -> (set des pids, set des eids) envoyés au dernier tick
+
+    def rebuild(self, players: dict, enemies: dict) -> None:
+        """Indexes this tick's (id: tuple) states, x and y being the first two fields"""
+        self.players_grid.rebuild((pid, p[0], p[1]) for pid, p in players.items())
+        self.enemies_grid.rebuild((eid, e[0], e[1]) for eid, e in enemies.items())
+
+    def remove_client(self, addr) -> None:
+        self.visible.pop(addr, None)
+
+    def _select(self, grid: SpatialGrid, x: float, y: float, previous: set, limit: int) -> set:
+        enter2 = self.radius * self.radius
+        selected = []
+        for eid, d2 in grid.query_radius(x, y, self.radius + self.hysteresis):
+            if d2 <= enter2 or eid in previous:
+                selected.append((d2, eid))
+        if len(selected) > limit:
+            selected.sort()
+            selected = selected[:limit]
+        return {eid for _, eid in selected}
+
+    def filter(self, addr, pid, players: dict, enemies: dict, limit: int = MAX_ENTITIES_PER_SNAPSHOT) -> tuple:
+        """
+        Returns the (players, enemies) subset of the world that 'addr' (player 'pid') should receive,
+        at most the 'limit' nearest of each (the legacy snapshot only has one byte counts).
+        """
+        me = players.get(pid)
+        if me is None:
+            return {}, {}
+        previous_players, previous_enemies = self.visible.get(addr, (set(), set()))
+        visible_players = self._select(self.players_grid, me[0], me[1], previous_players, limit)
+        visible_players.add(pid)
+        visible_enemies = self._select(self.enemies_grid, me[0], me[1], previous_enemies, limit)
+        self.visible[addr] = (visible_players, visible_enemies)
+        return ({p: players[p] for p in visible_players},
+                {e: enemies[e] for e in visible_enemies})
@@ -0,0 +1,300 @@
+import asyncio
+import json
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+# Générateur de charge : des centaines de clients "bots" sans affichage dans un
+# seul processus (une boucle asyncio, un socket UDP par bot), éventuellement
+# répartis sur plusieurs processus. Chaque bot parle le vrai protocole de
+# ClientNetwork : connexion (10), état du joueur (0) avec seq, ping (9),
+# suppression d'ennemi (3), snapshots 2 / 6 / 8 avec ack (7).
+#
+#     python loadgen.py --bots 200 --rate 60 --duration 60
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../ninja_game/scripts')))
+from snapshot import PROTOCOL_VERSION, PLAYER_INPUT, ACTION_IDS, decode_delta, decode_compact
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "maps")
+PHYSICS_TILES = {'grass', 'stone'}
+RUN_SPEED = 120           # px/s, comme le joueur du jeu
+REPORT_INTERVAL = 5.0
+CONNECT_RETRY = 1.0
+PING_INTERVAL = 1.0
+PARTIAL_SNAPSHOTS = 4
+
+
+def load_walkable(map_id: int) -> list:
+    """Pixel positions just above every solid tile of a map, where a bot can stand"""
+    try:
+        with open(os.path.join(MAPS_DIR, f"{map_id}.json")) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return [(50.0, 50.0)]
+    ts = data['tile_size']
+    solid = {(t['pos'][0], t['pos'][1]) for t in data['tilemap'].values() if t['type'] in PHYSICS_TILES}
+    spots = [(x * ts, (y - 1) * ts) for x, y in solid if (x, y - 1) not in solid]
+    return spots or [(50.0, 50.0)]
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+class Bot(asyncio.DatagramProtocol):
+    """One simulated client"""
+    def __init__(self, number: int, movement: str, kill_rate: float, maps: dict):
+        self.number = number
+        self.movement = movement
+        self.kill_rate = kill_rate
+        self.maps = maps            # map_id -> positions praticables (partagé entre bots)
+        self.rnd = random.Random(number)
+        self.transport = None
+        self.id = None
+        self.connected = asyncio.get_running_loop().create_future()
+
+        self.map_id = 0
+        self.x, self.y = self.rnd.choice(self.walkable())
+        self.target = (self.x, self.y)
+        self.patrol = None
+        self.flip = False
+        self.input_seq = 0
+
+        self.enemies = set()        # ids d'ennemis vus dans les snapshots
+        self.partial = {}           # seq -> parts reçues (snapshots compacts)
+        self.last_seq = 0
+
+        # Stats, remises à zéro à chaque rapport
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.snapshots = 0
+        self.last_snapshot_at = None
+        self.intervals = []         # écarts entre snapshots complets (s)
+        self.rtts = []              # RTT des pings (s)
+        self.kills = 0
+
+    # --- asyncio.DatagramProtocol ---
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if not data:
+            return
+        self.bytes_in += len(data)
+        if self.id is None:
+            if len(data) == 4:
+                self.id = struct.unpack("I", data)[0]
+                if not self.connected.done():
+                    self.connected.set_result(self.id)
+                return
+        msg_type = data[0]
+        if msg_type == 9 and len(data) >= 9:
+            self.rtts.append(time.time() - struct.unpack("d", data[1:9])[0])
+        elif msg_type == 2:
+            self.snapshot_done()
+        elif msg_type == 6:
+            seq, _, _, (changed, removed) = decode_delta(data)
+            self.snapshot_part(seq, 0, 1, changed, removed)
+        elif msg_type == 8:
+            seq, _, _, part, parts, _, (changed, removed) = decode_compact(data)
+            self.snapshot_part(seq, part, parts, changed, removed)
+        elif msg_type == 4 and len(data) >= 5:
+            self.map_id = struct.unpack("<I", data[1:5])[0]
+            self.x, self.y = self.rnd.choice(self.walkable())
+            self.target = (self.x, self.y)
+            self.patrol = None
+            self.enemies.clear()
+
+    def error_received(self, exc):
+        pass  # serveur pas encore lancé / arrêté : on continue d'essayer
+
+    # --- Snapshots ---
+    def snapshot_part(self, seq, part, parts, changed, removed):
+        if seq <= self.last_seq:
+            return
+        for eid, _, _ in changed:
+            self.enemies.add(eid)
+        self.enemies.difference_update(removed)
+        received = self.partial.setdefault(seq, set())
+        received.add(part)
+        if len(received) < parts:
+            if len(self.partial) > PARTIAL_SNAPSHOTS:
+                del self.partial[min(self.partial)]
+            return
+        self.last_seq = seq
+        for old in [s for s in self.partial if s <= seq]:
+            del self.partial[old]
+        self.send(b'\x07' + struct.pack("<I", seq))
+        self.snapshot_done()
+
+    def snapshot_done(self):
+        now = time.monotonic()
+        if self.last_snapshot_at is not None:
+            self.intervals.append(now - self.last_snapshot_at)
+        self.last_snapshot_at = now
+        self.snapshots += 1
+
+    # --- Envoi ---
+    def send(self, packet: bytes):
+        self.bytes_out += len(packet)
+        self.transport.sendto(packet)
+
+    def walkable(self) -> list:
+        spots = self.maps.get(self.map_id)
+        if spots is None:
+            spots = self.maps[self.map_id] = load_walkable(self.map_id)
+        return spots
+
+    def move(self, dt: float) -> int:
+        """Moves towards the current target, returns the action id"""
+        if self.movement == "static":
+            return ACTION_IDS['idle']
+        dx, dy = self.target[0] - self.x, self.target[1] - self.y
+        dist = math.hypot(dx, dy)
+        if dist < 2:
+            if self.movement == "patrol":
+                if self.patrol is None:
+                    self.patrol = ((self.x, self.y), self.rnd.choice(self.walkable()))
+                self.target = self.patrol[1] if self.target == self.patrol[0] else self.patrol[0]
+            else:
+                self.target = self.rnd.choice(self.walkable())
+            return ACTION_IDS['idle']
+        step = min(dist, RUN_SPEED * dt)
+        self.x += dx / dist * step
+        self.y += dy / dist * step
+        self.flip = dx < 0
+        return ACTION_IDS['run']
+
+    async def run(self, rate: float, stop: asyncio.Event):
+        while self.id is None and not stop.is_set():
+            self.send(b'\x0A' + struct.pack("B", PROTOCOL_VERSION))
+            try:
+                await asyncio.wait_for(asyncio.shield(self.connected), CONNECT_RETRY)
+            except asyncio.TimeoutError:
+                pass
+
+        period = 1 / rate
+        next_ping = time.monotonic()
+        last = time.monotonic()
+        while not stop.is_set():
+            now = time.monotonic()
+            action = self.move(now - last)
+            last = now
+            self.input_seq = (self.input_seq + 1) & 0xFFFFFFFF
+            vx = 0.0 if action == ACTION_IDS['idle'] else (-RUN_SPEED if self.flip else RUN_SPEED)
+            self.send(b'\x00' + PLAYER_INPUT.pack(self.x, self.y, vx, 0.0, action, self.flip, 1, self.input_seq))
+
+            if now >= next_ping:
+                next_ping = now + PING_INTERVAL
+                self.send(b'\x09' + struct.pack("d", time.time()))
+            if self.enemies and self.kill_rate and self.rnd.random() < self.kill_rate * period:
+                eid = self.rnd.choice(tuple(self.enemies))
+                self.enemies.discard(eid)
+                self.send(b'\x03' + struct.pack("I", eid))
+                self.kills += 1
+            await asyncio.sleep(period)
+
+        if self.id is not None:
+            # Plusieurs fois : un serveur saturé peut perdre des datagrammes (les suivants sont ignorés)
+            for _ in range(3):
+                self.send(b'\x01')
+                await asyncio.sleep(0.05)
+        self.transport.close()
+
+    def take_stats(self) -> tuple:
+        stats = (self.bytes_in, self.bytes_out, self.snapshots, self.intervals, self.rtts, self.kills)
+        self.bytes_in = self.bytes_out = self.snapshots = self.kills = 0
+        self.intervals = []
+        self.rtts = []
+        return stats
+
+
+def report(bots: list, elapsed: float, prefix: str = "") -> str:
+    """Aggregated stats of the bots since the last report"""
+    stats = [bot.take_stats() for bot in bots]
+    connected = sum(1 for bot in bots if bot.id is not None)
+    rates = [s[2] / elapsed for s in stats]
+    intervals = [i for s in stats for i in s[3]]
+    rtts = [r for s in stats for r in s[4]]
+    down = sum(s[0] for s in stats) / elapsed / max(1, len(bots)) / 1024
+    up = sum(s[1] for s in stats) / elapsed / max(1, len(bots)) / 1024
+    return (f"{prefix}{connected}/{len(bots)} bots | snapshots/s par bot moy {sum(rates) / max(1, len(rates)):.1f} "
+            f"min {min(rates, default=0):.1f} | écart entre snapshots p50 {percentile(intervals, 0.5) * 1000:.1f} ms "
+            f"p99 {percentile(intervals, 0.99) * 1000:.1f} ms | RTT/2 ping p50 {percentile(rtts, 0.5) * 500:.1f} ms "
+            f"p99 {percentile(rtts, 0.99) * 500:.1f} ms | par bot : down {down:.2f} Ko/s, up {up:.2f} Ko/s | "
+            f"{sum(s[5] for s in stats)} ennemis tués")
+
+
+async def run_bots(host: str, port: int, count: int, first: int, rate: float, duration: float,
+                   movement: str, kill_rate: float, ramp: float, prefix: str = "") -> None:
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    maps = {}
+    bots = []
+    tasks = []
+    for i in range(count):
+        bot = Bot(first + i, movement, kill_rate, maps)
+        await loop.create_datagram_endpoint(lambda: bot, remote_addr=(host, port))
+        bots.append(bot)
+        tasks.append(asyncio.create_task(bot.run(rate, stop)))
+        if ramp:
+            await asyncio.sleep(ramp)
+
+    start = last = time.monotonic()
+    try:
+        while not duration or time.monotonic() - start < duration:
+            await asyncio.sleep(REPORT_INTERVAL)
+            now = time.monotonic()
+            print(report(bots, now - last, prefix), flush=True)
+            last = now
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_worker(args: tuple) -> None:
+    """Entry point of a worker process"""
+    try:
+        asyncio.run(run_bots(*args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Ninja Game Server - headless bot load generator')
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='Server address')
+    parser.add_argument('--port', type=int, default=5006, help='Server UDP port')
+    parser.add_argument('--bots', type=int, default=50, help='Number of simulated clients')
+    parser.add_argument('--rate', type=float, default=60, help='Player state packets per second and per bot')
+    parser.add_argument('--duration', type=float, default=0, help='Seconds before stopping, 0 = until Ctrl+C')
+    parser.add_argument('--movement', choices=('random', 'patrol', 'static'), default='random',
+                        help='random: walk between random tiles, patrol: back and forth between two tiles')
+    parser.add_argument('--kill-rate', type=float, default=0.0, help='Enemy kill requests per second and per bot')
+    parser.add_argument('--ramp', type=float, default=0.01, help='Seconds between two bot connections')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes sharing the bots')
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        try:
+            asyncio.run(run_bots(args.host, args.port, args.bots, 0, args.rate, args.duration,
+                                 args.movement, args.kill_rate, args.ramp))
+        except KeyboardInterrupt:
+            pass
+    else:
+        import multiprocessing as mp
+        share = -(-args.bots // args.processes)
+        jobs = [(args.host, args.port, min(share, args.bots - i * share), i * share, args.rate, args.duration,
+                 args.movement, args.kill_rate, args.ramp, f"[worker {i + 1}] ")
+                for i in range(args.processes) if args.bots > i * share]
+        with mp.Pool(len(jobs)) as pool:
+            try:
+                pool.map(run_worker, jobs)
+            except KeyboardInterrupt:
+                pool.terminate()
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from TilemapServer import TilemapServer, load_map
+
+# Catalogue des maps de data/maps : toutes les maps sont indexées au démarrage
+# puis compilées (JSON, grilles de collision, spawners, table de visibilité) par
+# un thread de fond, la suivante dans la rotation en premier. Un changement de
+# niveau ne fait qu'échanger l'objet TilemapServer déjà prêt au lieu de lire et
+# compiler la map pendant le tick. Une map modifiée sur disque (éditeur) est
+# recompilée à la demande suivante. Les grandes maps sont streamées par chunks
+# (StreamingTilemapServer) : seul leur index est chargé ici.
+
+MAPS_DIR = os.path.join("data", "maps")
+
+
+class MapCatalog:
+    """
+    Compiled TilemapServer of every map of 'maps_dir' (files named <id>.json).
+    The compiled maps are shared and must be treated as read-only.
+    """
+    def __init__(self, maps_dir: str = MAPS_DIR, preload: bool = True):
+        self.maps_dir = maps_dir
+        self.paths = {}       # id -> chemin du .json
+        self.maps = {}        # id -> (TilemapServer, mtime du fichier compilé)
+        self.futures = {}     # id -> Future de la compilation en cours
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="map-catalog")
+        self.index()
+        self.preload = preload
+
+    def index(self) -> None:
+        """Lists the maps of the directory, in rotation order"""
+        paths = {}
+        for name in os.listdir(self.maps_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == ".json" and stem.isdigit():
+                paths[int(stem)] = os.path.join(self.maps_dir, name)
+        self.paths = dict(sorted(paths.items()))
+
+    @property
+    def ids(self) -> list:
+        return list(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def next_id(self, map_id: int) -> int:
+        """Map after 'map_id' in the rotation"""
+        ids = self.ids
+        for i in ids:
+            if i > map_id:
+                return i
+        return ids[0]
+
+    def compile(self, map_id: int) -> TilemapServer:
+        """Reads and compiles one map (any thread)"""
+        path = self.paths[map_id]
+        try:
+            mtime = os.path.getmtime(path)
+            tilemap = load_map(path)
+            with self.lock:
+                self.maps[map_id] = (tilemap, mtime)
+        finally:
+            with self.lock:
+                self.futures.pop(map_id, None)
+        return tilemap
+
+    def ready(self, map_id: int) -> TilemapServer | None:
+        """The compiled map if it is up to date with its file, None otherwise"""
+        entry = self.maps.get(map_id)
+        if entry is None:
+            return None
+        try:
+            if os.path.getmtime(self.paths[map_id]) != entry[1]:
+                return None  # modifiée depuis la compilation
+        except OSError:
+            pass
+        return entry[0]
+
+    def preload_map(self, map_id: int) -> None:
+        """Compiles 'map_id' on the background thread, unless it is ready or already queued"""
+        if map_id not in self.paths:
+            return
+        with self.lock:
+            if map_id in self.futures or self.ready(map_id) is not None:
+                return
+            self.futures[map_id] = self.executor.submit(self.compile, map_id)
+
+    def preload_all(self, current: int) -> None:
+        """Queues every map, starting with the one after 'current' in the rotation"""
+        if not self.preload or not self.paths:
+            return
+        map_id = current if current in self.paths else self.ids[0]
+        for _ in range(len(self.paths)):
+            map_id = self.next_id(map_id)
+            self.preload_map(map_id)
+
+    def get(self, map_id: int) -> TilemapServer:
+        """
+        Compiled map 'map_id': the preloaded one, the end of its compilation if it is running,
+        or a compilation on the spot. Raises FileNotFoundError for an unknown map.
+        """
+        if map_id not in self.paths:
+            self.index()  # une map ajoutée depuis le démarrage
+            if map_id not in self.paths:
+                raise FileNotFoundError(os.path.join(self.maps_dir, f"{map_id}.json"))
+        tilemap = self.ready(map_id)
+        if tilemap is not None:
+            return tilemap
+        future = self.futures.get(map_id)
+        if future is not None:
+            start = time.perf_counter()
+            tilemap = future.result()
+            print(f"Map {map_id} attendue {(time.perf_counter() - start) * 1000:.1f} ms (préchargement en cours)")
+            if self.ready(map_id) is tilemap:
+                return tilemap
+        return self.compile(map_id)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,231 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tick_scheduler import REPORT_INTERVAL
+
+# Instrumentation du serveur : histogrammes de durée des phases du tick,
+# trafic entrant / sortant, RTT par client (temps entre l'envoi d'un snapshot
+# et son ack), nombre d'ennemis et dépassements de tick.
+# Exposés au format texte Prometheus sur http://127.0.0.1:<port>/metrics et
+# résumés sur une ligne dans la console. Désactivé, GameServer.metrics vaut None
+# et le serveur ne fait aucune mesure.
+
+# Bornes des histogrammes de durée, en secondes
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 1 / 60, 0.025, 0.05, 0.1)
+RTT_SMOOTHING = 0.1       # poids d'un nouvel échantillon dans la moyenne glissante du RTT
+MAX_PENDING_ACKS = 64     # snapshots non ackés suivis par client
+
+
+class Histogram:
+    """Cumulative duration histogram (Prometheus semantics)"""
+    def __init__(self, name: str, help_text: str, buckets: tuple = TIME_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # le dernier compte les valeurs > buckets[-1]
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {total}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class ServerMetrics:
+    """
+    Counters of one GameServer. Only the server thread writes them, the HTTP thread
+    reads plain ints / floats and copies of the dicts.
+    """
+    def __init__(self, rate: float = 1/60):
+        self.rate = rate
+        self.tick = Histogram("ninja_tick_seconds", "Duration of a whole server tick")
+        self.receive = Histogram("ninja_receive_seconds", "Duration of the receive phase (socket drain)")
+        self.enemy_update = Histogram("ninja_enemy_update_seconds", "Duration of EnemyManager.update")
+        self.broadcast = Histogram("ninja_broadcast_seconds", "Duration of broadcast_state")
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.packets_in = 0
+        self.packets_out = 0
+        self.overruns = 0
+        self.players = 0
+        self.enemies = 0
+        self.los_hits = 0       # cache des lignes de vue d'EnemyManager (cumulés)
+        self.los_misses = 0
+        self.lod = (0, 0, 0)    # ennemis par niveau de détail (plein, réduit, endormis)
+        self.jobs = {'backlog': 0, 'processed': 0, 'rejected': 0, 'expired': 0,  # AIJobQueue.stats()
+                     'latency_avg': 0.0, 'latency_max': 0.0}
+
+        self.rtt = {}           # pid -> RTT lissé (s)
+        self.sent_at = {}       # addr -> {seq: instant d'envoi}
+
+        self.last_report = time.monotonic()
+        self.last_totals = self.totals()
+        self.http = None
+
+    # --- Mesures (thread du serveur) ---
+    def received(self, size: int) -> None:
+        self.bytes_in += size
+        self.packets_in += 1
+
+    def sent(self, size: int) -> None:
+        self.bytes_out += size
+        self.packets_out += 1
+
+    def observe_tick(self, duration: float) -> None:
+        self.tick.observe(duration)
+        if duration > self.rate:
+            self.overruns += 1
+
+    def snapshot_sent(self, addr, seq: int) -> None:
+        pending = self.sent_at.setdefault(addr, {})
+        pending[seq] = time.monotonic()
+        if len(pending) > MAX_PENDING_ACKS:
+            del pending[min(pending)]
+
+    def snapshot_acked(self, addr, pid, seq: int) -> None:
+        pending = self.sent_at.get(addr)
+        if not pending or seq not in pending:
+            return
+        sample = time.monotonic() - pending[seq]
+        for old in [s for s in pending if s <= seq]:
+            del pending[old]
+        rtt = self.rtt.get(pid)
+        self.rtt[pid] = sample if rtt is None else rtt + (sample - rtt) * RTT_SMOOTHING
+
+    def remove_client(self, addr, pid) -> None:
+        self.sent_at.pop(addr, None)
+        self.rtt.pop(pid, None)
+
+    def set_world(self, players: int, enemies: int, los_hits: int = 0, los_misses: int = 0) -> None:
+        self.players = players
+        self.enemies = enemies
+        self.los_hits = los_hits
+        self.los_misses = los_misses
+
+    def set_lod(self, counts) -> None:
+        self.lod = tuple(counts)
+
+    def set_jobs(self, stats: dict) -> None:
+        self.jobs = stats
+
+    # --- Sorties ---
+    def totals(self) -> tuple:
+        return (self.bytes_in, self.bytes_out, self.packets_in, self.packets_out, self.overruns,
+                self.tick.count, self.tick.sum, self.enemy_update.sum, self.broadcast.sum, self.receive.sum,
+                self.los_hits, self.los_misses, self.jobs['processed'])
+
+    def report(self) -> str | None:
+        """One line summary of the last REPORT_INTERVAL seconds, or None if it is not time yet"""
+        now = time.monotonic()
+        elapsed = now - self.last_report
+        if elapsed < REPORT_INTERVAL:
+            return None
+        totals = self.totals()
+        (b_in, b_out, p_in, p_out, overruns, ticks, tick_sum, enemy_sum, broadcast_sum, receive_sum,
+         los_hits, los_misses, jobs) = (
+            t - last for t, last in zip(totals, self.last_totals))
+        self.last_report = now
+        self.last_totals = totals
+
+        per_tick = 1000 / ticks if ticks else 0.0
+        rtts = list(self.rtt.values())
+        rtt = f"{sum(rtts) / len(rtts) * 1000:.1f} ms" if rtts else "-"
+        los = los_hits + los_misses
+        los_rate = f"{los_hits / los * 100:.0f} %" if los else "-"
+        job_stats = self.jobs
+        return (f"{ticks / elapsed:.1f} ticks/s, tick {tick_sum * per_tick:.2f} ms "
+                f"(ennemis {enemy_sum * per_tick:.2f}, broadcast {broadcast_sum * per_tick:.2f}, "
+                f"réception {receive_sum * per_tick:.2f}) | {self.players} joueurs, {self.enemies} ennemis "
+                f"({self.lod[0]} actifs, {self.lod[1]} ralentis, {self.lod[2]} endormis) | "
+                f"in {p_in / elapsed:.0f} pkt/s {b_in / elapsed / 1024:.1f} Ko/s | "
+                f"out {p_out / elapsed:.0f} pkt/s {b_out / elapsed / 1024:.1f} Ko/s | "
+                f"RTT {rtt} | cache LOS {los_rate} de {los / elapsed:.0f}/s | "
+                f"travaux IA {jobs / elapsed:.0f}/s, {job_stats['backlog']} en attente, "
+                f"latence {job_stats['latency_avg'] * 1000:.1f} ms (max {job_stats['latency_max'] * 1000:.1f}) | "
+                f"{overruns} dépassements")
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for name, kind, help_text, value in (
+                ("ninja_bytes_received_total", "counter", "UDP payload bytes received", self.bytes_in),
+                ("ninja_bytes_sent_total", "counter", "UDP payload bytes sent", self.bytes_out),
+                ("ninja_packets_received_total", "counter", "Datagrams received", self.packets_in),
+                ("ninja_packets_sent_total", "counter", "Datagrams sent", self.packets_out),
+                ("ninja_tick_overruns_total", "counter", "Ticks longer than the tick rate", self.overruns),
+                ("ninja_los_cache_hits_total", "counter", "Line of sight checks answered by the per-tick cache",
+                 self.los_hits),
+                ("ninja_los_cache_misses_total", "counter", "Line of sight checks that cast a ray", self.los_misses),
+                ("ninja_ai_jobs_processed_total", "counter", "Deferred AI jobs run", self.jobs['processed']),
+                ("ninja_ai_jobs_rejected_total", "counter", "Deferred AI jobs refused because the queue was full",
+                 self.jobs['rejected']),
+                ("ninja_ai_jobs_expired_total", "counter", "Deferred AI jobs cancelled or expired before running",
+                 self.jobs['expired']),
+                ("ninja_ai_jobs_backlog", "gauge", "Deferred AI jobs waiting in the queue", self.jobs['backlog']),
+                ("ninja_ai_job_latency_seconds", "gauge", "Average submission to execution delay of the last AI jobs",
+                 self.jobs['latency_avg']),
+                ("ninja_ai_job_latency_max_seconds", "gauge", "Longest submission to execution delay of the last AI jobs",
+                 self.jobs['latency_max']),
+                ("ninja_players", "gauge", "Connected players", self.players),
+                ("ninja_enemies", "gauge", "Living enemies", self.enemies)):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        lines += ["# HELP ninja_enemies_lod Living enemies per AI level of detail",
+                  "# TYPE ninja_enemies_lod gauge"]
+        for level, count in zip(("full", "reduced", "asleep"), self.lod):
+            lines.append(f'ninja_enemies_lod{{level="{level}"}} {count}')
+        for hist in (self.tick, self.receive, self.enemy_update, self.broadcast):
+            lines += hist.render()
+        lines += ["# HELP ninja_client_rtt_seconds Smoothed snapshot to ack round trip time",
+                  "# TYPE ninja_client_rtt_seconds gauge"]
+        for pid, rtt in sorted(list(self.rtt.items())):
+            lines.append(f'ninja_client_rtt_seconds{{player="{pid}"}} {rtt}')
+        return "\n".join(lines) + "\n"
+
+    # --- Endpoint HTTP ---
+    def serve_http(self, port: int, host: str = "127.0.0.1") -> None:
+        """Serves render() on http://host:port/metrics from a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # pas de log par requête dans la console du serveur
+
+        self.http = ThreadingHTTPServer((host, port), Handler)
+        self.http.daemon_threads = True
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        print(f"Métriques sur http://{host}:{port}/metrics")
+
+    def close(self) -> None:
+        if self.http:
+            self.http.shutdown()
+            self.http.server_close()
+            self.http = None
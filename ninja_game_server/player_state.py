@@ -0,0 +1,20 @@
+class PlayerState:
+    """
+    State of one player on the server, updated in place by PlayerManager.apply_pending.
+    Fixed fields (__slots__): no per-player dict, no tuple rebuilt on every update.
+    """
+    __slots__ = ('x', 'y', 'action', 'flip', 'weapon_id', 'vx', 'vy')
+
+    def __init__(self, x: float = 0.0, y: float = 0.0, action: str = 'idle', flip: bool = False,
+                 weapon_id: int = 1, vx: float = 0.0, vy: float = 0.0):
+        self.x = x
+        self.y = y
+        self.action = action
+        self.flip = flip
+        self.weapon_id = weapon_id
+        self.vx = vx
+        self.vy = vy
+
+    def __repr__(self) -> str:
+        return (f"PlayerState({self.x}, {self.y}, {self.action!r}, {self.flip}, {self.weapon_id}, "
+                f"{self.vx}, {self.vy})")
@@ -1,11 +1,20 @@
+import select
 import socket
 import struct
 import time
 import miniupnpc
-import os #pour listdir les level les faire looper entre eux
+import os
 
-from TilemapServer import TilemapServer
-from enemy_manager import Blob, EnemyManager
+from ai_jobs import AI_JOB_BUDGET
+from enemy_manager import Blob, EnemyManager, LOD_NEAR_DISTANCE, LOD_FAR_DISTANCE
+from interest import InterestManager, INTEREST_RADIUS
+from map_catalog import MapCatalog
+from tick_scheduler import TickScheduler, IDLE_WAIT, REPORT_INTERVAL
+from metrics import ServerMetrics
+from player_state import PlayerState
+
+MAX_DATAGRAMS_PER_DRAIN = 1024  # évite qu'un flood affame la simulation
+STATS_INTERVAL = 1.0    # secondes entre deux envois de stats au superviseur
 
 # Message types:
 #  10 : Connexion
@@ -14,6 +23,10 @@ from enemy_manager import Blob, EnemyManager
 #   3 : Suppression d’un ennemi
 #   9 : Ping
 
+#   6 : Snapshot delta (serveur -> client)
+#   7 : Ack de snapshot (client -> serveur)
+#   8 : Snapshot delta compact (serveur -> client, protocole 2)
+
 import sys
 # Ajout du chemin vers les scripts du client
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../ninja_game/scripts')))
@@ -23,25 +36,38 @@ except ImportError as e:
     print("Erreur import LobbyManager:", e)
     LobbyManager = None
 
-# ==============================
-# --- Player Manager ---
-# ==============================
+from snapshot import (PROTOCOL_LEGACY, PROTOCOL_DELTA, PROTOCOL_COMPACT, PROTOCOL_VERSION, SNAPSHOT_HISTORY, LEGACY_MAX_ENTITIES,
+                      QUANT_CELL, ACTIONS, ACTION_IDS, ENEMY_STATE_IDS, PLAYER_INPUT, PLAYER_INPUT_LEGACY, SnapshotEncoder,
+                      Quantizer)
 
 # ==============================
 # --- Player Manager ---
 # ==============================
 class PlayerManager:
+    """
+    Player states. The type 0 updates received between two ticks are only queued,
+    the newest one per player (by sequence number) being applied at the start of the tick:
+    the cost of a tick depends on the number of players, not on the clients' frame rates.
+    """
     def __init__(self):
         self.clients = {}   # addr -> id
-        self.players = {}   # id -> (x, y, action:str, flip:bool)
+        self.players = {}   # id -> PlayerState
         self.next_id = 1
-        
+
+        # Ingest des mises à jour : une seule en attente par joueur
+        self.pending = {}   # id -> paquet le plus récent reçu depuis le dernier tick
+        self.last_seq = {}  # id -> seq de la dernière mise à jour retenue
+        self.received = 0   # compteurs remis à zéro à chaque rapport
+        self.coalesced = 0  # remplacées par une plus récente avant le tick
+        self.stale = 0      # arrivées en retard / dans le désordre
+        self.last_report = time.monotonic()
+
 
     def add_player(self, addr):
         pid = self.next_id
         self.next_id += 1
         self.clients[addr] = pid
-        self.players[pid] = (0, 0, 'idle', False, 1, 0.0, 0.0) # x, y, action, flip, weapon_id, vx, vy
+        self.players[pid] = PlayerState()
         return pid
 
     def remove_player(self, addr):
@@ -51,58 +77,222 @@ class PlayerManager:
         del self.clients[addr]
         if pid in self.players:
             del self.players[pid]
+        self.pending.pop(pid, None)
+        self.last_seq.pop(pid, None)
         return pid
 
-    def update_player(self, addr, data):
-        if addr not in self.clients:
+    def queue_update(self, addr, data):
+        """Keeps 'data' (a type 0 payload) if it is the newest update of this player"""
+        pid = self.clients.get(addr)
+        if pid is None:
             return
-        pid = self.clients[addr]
+        if len(data) < PLAYER_INPUT_LEGACY.size:
+            return  # paquet trop court (19 bytes avec vx, vy)
+        self.received += 1
+
+        if len(data) >= PLAYER_INPUT.size:
+            seq = PLAYER_INPUT.unpack_from(data)[7]
+            last = self.last_seq.get(pid)
+            # Comparaison modulo 2^32 (le seq finit par reboucler)
+            if last is not None and (seq == last or (seq - last) & 0xFFFFFFFF >= 0x80000000):
+                self.stale += 1
+                return
+            self.last_seq[pid] = seq
+        # Sans seq (ancien client) : l'ordre d'arrivée fait foi
+
+        if pid in self.pending:
+            self.coalesced += 1
+        self.pending[pid] = data
+
+    def apply_pending(self):
+        """Applies the update kept for every player since the last tick"""
+        if not self.pending:
+            return
+        players = self.players
+        for pid, data in self.pending.items():
+            player = players.get(pid)
+            if player is None:
+                continue
+            player.x, player.y, player.vx, player.vy, action_id, flip_byte, player.weapon_id = \
+                PLAYER_INPUT_LEGACY.unpack_from(data)
+            player.action = ACTIONS[action_id] if action_id < len(ACTIONS) else 'idle'
+            player.flip = bool(flip_byte)
+        self.pending.clear()
+
+    def report(self) -> str | None:
+        """Returns a summary of the coalesced updates every REPORT_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self.last_report < REPORT_INTERVAL:
+            return None
+        self.last_report = now
+        msg = None
+        if self.coalesced or self.stale:
+            msg = (f"Mises à jour joueurs : {self.received} reçues, {self.coalesced} fusionnées, "
+                   f"{self.stale} en retard ignorées")
+        self.received = self.coalesced = self.stale = 0
+        return msg
 
-        if len(data) < 19:
-            return  # paquet trop court (maintenant 19 bytes avec vx, vy)
 
-        x, y, vx, vy = struct.unpack("ffff", data[:16])
-        action_id, flip_byte, weapon_id = struct.unpack("BBB", data[16:19])
-        action_map = {0: 'idle', 1: 'run', 2: 'jump', 3: 'wall_slide', 4: 'slide', 5: 'attack_front', 6: 'attack_up', 7: 'attack_down'}
-        action = action_map.get(action_id, 'idle')
-        flip = bool(flip_byte)
-        self.players[pid] = (x, y, action, flip, weapon_id, vx, vy)
+# ==============================
+# --- Snapshot Manager ---
+# ==============================
+class SnapshotManager:
+    """
+    Keeps, for every client speaking the delta protocol, the snapshots sent to it
+    and the last one it acknowledged, so that only the changes since that baseline are sent.
+    """
+    EMPTY = ({}, {})
+
+    def __init__(self, history=SNAPSHOT_HISTORY):
+        self.history_size = history
+        self.seq = 0
+        self.versions = {}  # addr -> version du protocole annoncée à la connexion
+        self.history = {}   # addr -> {seq: (players, enemies)}
+        self.acked = {}     # addr -> dernier seq acké
+        self.quantizers = {}  # addr -> Quantizer local (maps trop larges pour une quantification commune)
+        self.encoder = SnapshotEncoder()
+
+    def set_version(self, addr, version):
+        # Un client plus récent que le serveur parle la dernière version connue ici
+        self.versions[addr] = min(version, PROTOCOL_VERSION)
+        self.history.setdefault(addr, {})
+        self.acked.setdefault(addr, 0)
+
+    def uses_delta(self, addr):
+        return self.versions.get(addr, PROTOCOL_LEGACY) >= PROTOCOL_DELTA
+
+    def uses_compact(self, addr):
+        return self.versions.get(addr, PROTOCOL_LEGACY) >= PROTOCOL_COMPACT
+
+    def remove_client(self, addr):
+        self.versions.pop(addr, None)
+        self.history.pop(addr, None)
+        self.acked.pop(addr, None)
+        self.quantizers.pop(addr, None)
+
+    def ack(self, addr, seq):
+        history = self.history.get(addr)
+        if history is None or seq not in history or seq <= self.acked[addr]:
+            return
+        self.acked[addr] = seq
+        # Les snapshots plus vieux que la baseline ne serviront plus
+        for old in [s for s in history if s < seq]:
+            del history[old]
+
+    def reset_baselines(self):
+        """Forgets every baseline, the next snapshots are full ones (e.g. the quantization changed with the map)"""
+        for addr in self.history:
+            self.history[addr] = {}
+            self.acked[addr] = 0
+        self.quantizers.clear()
+
+    def local_quantizer(self, addr, x, y, reach):
+        """
+        Quantizer of 'addr' around its player at (x, y), for maps too wide for a shared one.
+        Its origin only moves once the player went further than QUANT_CELL from it, and the
+        next snapshot is then a full one (the baselines were quantized around the old origin).
+        """
+        quantizer = self.quantizers.get(addr)
+        if quantizer is None or abs(x - quantizer.origin_x) > QUANT_CELL or abs(y - quantizer.origin_y) > QUANT_CELL:
+            quantizer = self.quantizers[addr] = Quantizer.around(x, y, reach)
+            self.history[addr] = {}
+            self.acked[addr] = 0
+        return quantizer
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def build(self, addr, seq, state, quantizer=None):
+        """
+        Returns the datagrams of the type 6 snapshot of 'state' for 'addr', as a delta when a valid baseline exists.
+        With a quantizer, 'state' is already quantized and the snapshot is a type 8 (compact) one,
+        split in MTU sized parts.
+        The payloads are only valid until the next call.
+        """
+        history = self.history[addr]
+        baseline_seq = self.acked[addr]
+        if baseline_seq not in history or seq - baseline_seq > self.history_size:
+            # Pas de baseline exploitable -> snapshot complet
+            baseline_seq = 0
+        baseline = history[baseline_seq] if baseline_seq else self.EMPTY
+
+        history[seq] = state
+        if len(history) > self.history_size:
+            del history[min(history)]
+        if quantizer is not None:
+            return self.encoder.encode_compact(seq, baseline_seq, baseline, state, quantizer)
+        return (self.encoder.encode_delta(seq, baseline_seq, baseline, state),)
 
 
 # ==============================
 # --- Game Server ---
 # ==============================
 class GameServer:
-    def __init__(self,  local : bool = False, ip="0.0.0.0", port=5006, server_name="Ninja Server", rate=1/60):
+    def __init__(self,  local : bool = False, ip="0.0.0.0", port=5006, server_name="Ninja Server", rate=1/60, interest_radius=INTEREST_RADIUS,
+                 map_id=0, stop_event=None, stats_queue=None, metrics=False, metrics_port=None, vectorized_enemies=False,
+                 lod_near=LOD_NEAR_DISTANCE, lod_far=LOD_FAR_DISTANCE, ai_budget=AI_JOB_BUDGET, maps=None):
         self.ip = ip
         self.port = port
         self.rate = rate
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.bind((ip, port))
-        self.sock.settimeout(0.002)
+        self.sock.setblocking(False)
+        self.transport = None  # transport asyncio quand le serveur tourne dans une boucle d'événements
+        self.scheduler = TickScheduler(rate)
+        # Instrumentation (metrics.py), None = désactivée, aucun coût
+        self.metrics = ServerMetrics(rate) if metrics or metrics_port else None
+        if metrics_port:
+            self.metrics.serve_http(metrics_port)
+        self.local = local
+
+        # Pilotage par le superviseur de rooms (supervisor.py)
+        self.stop_event = stop_event    # multiprocessing.Event : arrêt demandé
+        self.stats_queue = stats_queue  # multiprocessing.Queue : (port, joueurs, tick moyen)
+        self.last_stats = 0.0
 
         self.next_map = 0
 
         # --- Charger la map ---
-        self.map = TilemapServer()
-        self.map_id = 0
-        self.map.load(f"data/maps/{self.map_id}.json")
+        # Catalogue des maps compilées, partageable entre les rooms d'un même processus
+        self.maps = maps if maps is not None else MapCatalog()
+        self.map_id = map_id
+        self.map = self.maps.get(self.map_id)
+        self.maps.preload_all(self.map_id)  # les autres en fond, la suivante d'abord
         print("carte chargée sur le serveur.")
 
         # --- Managers ---
         self.players = PlayerManager()
-        self.EnemyManager = EnemyManager(self.map)
-        self.last_update = time.time()
+        self.snapshots = SnapshotManager()
+        # Area of interest : None -> tout le monde reçoit toute la map
+        self.interest = InterestManager(interest_radius) if interest_radius else None
+        # Quantification des positions du format compact, dépend des bornes de la map
+        self.update_quantizer()
+        self.EnemyManager = EnemyManager(self.map, vectorized=vectorized_enemies, lod_near=lod_near, lod_far=lod_far,
+                                         ai_budget=ai_budget)
 
         print(f"Serveur en ligne sur {ip}:{port}")
-        if not local:
-            self.init_upnp()
-        
-        # Démarrage du Lobby Discovery (même en local pour tester)
+
+        # Lobby Discovery (même en local pour tester), démarré par run() / async_server
+        self.lobby = None
         if LobbyManager:
             self.lobby = LobbyManager(mode='server', server_port=self.port, server_name=server_name)
+
+    def start_services(self):
+        """Opens the UPnP port and starts the lobby heartbeat thread (blocking mode)."""
+        if not self.local:
+            self.init_upnp()
+        if self.lobby:
             self.lobby.start_heartbeat()
 
+    def send(self, payload, addr):
+        if self.metrics:
+            self.metrics.sent(len(payload))
+        if self.transport is not None:
+            self.transport.sendto(payload, addr)
+        else:
+            self.sock.sendto(payload, addr)
+
     def init_upnp(self):
         upnp = miniupnpc.UPnP()
         upnp.discoverdelay = 200
@@ -118,34 +308,101 @@ class GameServer:
     # --- Boucle principale ---
     # ---------------------------
     def run(self):
+        self.start_services()
         print("Serveur en cours d’exécution...")
         try:
-            while True:
-                try:
-                    data, addr = self.sock.recvfrom(1024)
-                    self.handle_message(data, addr)
-                except ConnectionResetError:
-                    # Ignore les erreurs quand un client quitte brutalement
-                    continue
-                except socket.timeout:
-                    pass
-                except OSError as e:
-                    print("Erreur socket:", e)
+            while not (self.stop_event and self.stop_event.is_set()):
+                idle = not self.players.clients
+                if idle:
+                    # Personne de connecté : on dort jusqu'au prochain paquet
+                    timeout = IDLE_WAIT
+                else:
+                    timeout = self.scheduler.time_until_next()
+
+                readable, _, _ = select.select([self.sock], [], [], timeout)
+                if readable:
+                    self.drain_socket()
+
+                if not self.players.clients:
+                    self.report_stats()
                     continue
+                if idle:
+                    self.scheduler.resync()
+
+                for _ in range(self.scheduler.due_ticks()):
+                    self.drain_socket()
+                    self.run_tick()
 
-                now = time.time()
-                if now - self.last_update >= self.rate:
-                    self.last_update = now
-                    self.update_world()
+                self.print_reports()
+                self.report_stats()
         except KeyboardInterrupt:
-            print("Arrêt du serveur...")
-            if hasattr(self, 'lobby') and self.lobby:
-                self.lobby.stop()
-            self.sock.close()
+            pass
+        print("Arrêt du serveur...")
+        if self.lobby:
+            self.lobby.stop()
+        if self.metrics:
+            self.metrics.close()
+        self.maps.close()
+        self.sock.close()
+
+    def run_tick(self):
+        start = time.monotonic()
+        self.update_world()
+        duration = time.monotonic() - start
+        self.scheduler.record_tick(duration)
+        if self.metrics:
+            self.metrics.observe_tick(duration)
+
+    def print_reports(self, prefix=""):
+        """Prints the periodic summaries (tick overruns, coalesced updates, metrics)"""
+        reports = [self.scheduler.report(), self.players.report()]
+        if self.metrics:
+            reports.append(self.metrics.report())
+        for msg in reports:
+            if msg:
+                print(prefix + msg)
+
+    def report_stats(self):
+        """Sends (port, player count, average tick time) to the supervisor, if any"""
+        if self.stats_queue is None:
+            return
+        now = time.monotonic()
+        if now - self.last_stats < STATS_INTERVAL:
+            return
+        self.last_stats = now
+        self.stats_queue.put((self.port, len(self.players.clients), self.scheduler.avg_tick_time))
+
+    def drain_socket(self):
+        """Handles every datagram waiting in the socket buffer"""
+        if self.metrics:
+            start = time.monotonic()
+            if self._drain_socket():
+                self.metrics.receive.observe(time.monotonic() - start)
+        else:
+            self._drain_socket()
+
+    def _drain_socket(self):
+        """Returns the number of datagrams handled"""
+        for n in range(MAX_DATAGRAMS_PER_DRAIN):
+            try:
+                data, addr = self.sock.recvfrom(1024)
+            except BlockingIOError:
+                return n
+            except ConnectionResetError:
+                # Ignore les erreurs quand un client quitte brutalement
+                continue
+            except OSError as e:
+                print("Erreur socket:", e)
+                return n
+            if data:
+                self.handle_message(data, addr)
+        return MAX_DATAGRAMS_PER_DRAIN
 
 
     def handle_message(self, data, addr):
         msg_type = data[0]
+        if self.metrics:
+            self.metrics.received(len(data))
 
 
         if msg_type == 10: # 10 = connexion
@@ -154,28 +411,49 @@ class GameServer:
                 print(f"New player: {pid} ({addr})") 
             else:
                 pid = self.players.clients[addr]
+            # Octet optionnel : version du protocole supportée par le client
+            self.snapshots.set_version(addr, data[1] if len(data) >= 2 else PROTOCOL_LEGACY)
             
             # renvoyer le PID à chaque paquet de connexion reçu
-            self.sock.sendto(struct.pack("I", pid), addr)
+            self.send(struct.pack("I", pid), addr)
+            # puis la map courante (la room peut ne pas être sur la map 0)
+            self.send(struct.pack("<BI", 4, int(self.map_id)), addr)
             return
 
         # -- ping --
         if msg_type == 9:  # 9 = ping
-            self.sock.sendto(b'\x09' + data[1:9], addr)
+            self.send(b'\x09' + data[1:9], addr)
 
         # --- Déconnexion ---
         if msg_type == 1:
             pid = self.players.remove_player(addr)
+            if pid is None:
+                return  # adresse inconnue ou déjà déconnectée (déconnexion répétée par un client)
+            self.snapshots.remove_client(addr)
+            if self.metrics:
+                self.metrics.remove_client(addr, pid)
+            if self.interest:
+                self.interest.remove_client(addr)
             print(f"Déconnexion du joueur {pid}")
             # Supprime la cible si l’ennemi le suivait
             for e in self.EnemyManager.enemies.values():
-                if e.properties['target_player'] == pid:
-                    e.properties['target_player'] = None
+                if e.target_player == pid:
+                    e.target_player = None
             return
 
         # --- Mise à jour joueur ---
-        if msg_type == 0 and addr in self.players.clients and len(data) >= 10:
-            self.players.update_player(addr, data[1:])
+        if msg_type == 0 and addr in self.players.clients:
+            # appliquée au prochain tick (apply_pending), seule la plus récente compte
+            self.players.queue_update(addr, memoryview(data)[1:])
+            return
+
+        # --- Ack de snapshot ---
+        if msg_type == 7 and len(data) >= 5:
+            seq = struct.unpack("<I", data[1:5])[0]
+            if self.metrics:
+                self.metrics.snapshot_acked(addr, self.players.clients.get(addr), seq)
+            self.snapshots.ack(addr, seq)
+            return
 
         # --- Suppression ennemi ---
         if msg_type == 3 and len(data) >= 5:
@@ -186,7 +464,7 @@ class GameServer:
 
         # --- Request Level Change (Debug) ---
         if msg_type == 5:
-            self.next_map = int((self.map_id) + 1) % len(os.listdir("data/maps")) #modulo nombre de map dans le fichier
+            self.next_map = self.maps.next_id(self.map_id)
             self.change_level(self.next_map)
             return
 
@@ -194,25 +472,45 @@ class GameServer:
     # --- Mises à jour ---
     # ---------------------------
     def update_world(self):
-        self.EnemyManager.update(self.players.players)
-        
+        metrics = self.metrics
+        self.players.apply_pending()
+        # Map streamée par chunks : garde chargés ceux autour des joueurs (rien pour une map dense)
+        self.map.stream([(p.x, p.y) for p in self.players.players.values()])
+        if metrics:
+            start = time.monotonic()
+            self.EnemyManager.update(self.players.players)
+            metrics.enemy_update.observe(time.monotonic() - start)
+        else:
+            self.EnemyManager.update(self.players.players)
+
         # Example condition de changement de map automatique (tous les ennemis morts)
         if len(self.EnemyManager.enemies) == 0:
-            self.next_map = int((self.map_id) + 1) % len(os.listdir("data/maps")) #modulo nombre de map dans le fichier
+            self.next_map = self.maps.next_id(self.map_id)
             self.change_level(self.next_map)
 
-        self.broadcast_state()
+        if metrics:
+            start = time.monotonic()
+            self.broadcast_state()
+            metrics.broadcast.observe(time.monotonic() - start)
+            metrics.set_world(len(self.players.clients), len(self.EnemyManager.enemies),
+                              self.EnemyManager.los_hits, self.EnemyManager.los_misses)
+            metrics.set_lod(self.EnemyManager.lod_counts)
+            metrics.set_jobs(self.EnemyManager.jobs.stats())
+        else:
+            self.broadcast_state()
 
     def change_level(self, map_id):
         try:
-            filename = f"data/maps/{map_id}.json"
-            self.map.load(filename)
+            # Déjà compilée en fond dans le cas normal : simple échange d'objet
+            self.map = self.maps.get(map_id)
             self.map_id = map_id
         except FileNotFoundError:
             print(f"Map {map_id} not found!")
             return
 
         print(f"Map changée vers {map_id}")
+        self.update_quantizer()
+        self.snapshots.reset_baselines()
         self.EnemyManager.reset(self.map)
         
         # Reset players (Spawn au spawn point si disponible)
@@ -223,49 +521,92 @@ class GameServer:
                     spawn_pos = s['pos']
                     break
         
-        for pid in self.players.players:
-            _, _, a, f, w, vx, vy = self.players.players[pid]
-            self.players.players[pid] = (spawn_pos[0], spawn_pos[1], a, f, w, vx, vy)
+        # Les mises à jour en attente datent d'avant le changement de map
+        self.players.pending.clear()
+        for player in self.players.players.values():
+            player.x, player.y = spawn_pos[0], spawn_pos[1]
 
         self.broadcast_map_change(map_id)
+        self.maps.preload_map(self.maps.next_id(map_id))  # au cas où son fichier a changé
+
+    def update_quantizer(self):
+        """
+        Shared quantization of the compact snapshots for the current map. A map too wide for it
+        gets a quantization local to each client (with an area of interest), or the type 6 snapshots.
+        """
+        try:
+            self.quantizer = Quantizer.from_bounds(*self.map.bounds())
+        except ValueError as e:
+            self.quantizer = None
+            if self.interest:
+                print(f"{e} : quantification autour de chaque joueur")
+            else:
+                print(f"{e} : snapshots delta (type 6) pour les clients compacts, sans zone d'intérêt")
 
     def broadcast_map_change(self, map_id):
         # Type 4 : Changement de map
         payload = struct.pack("<BI", 4, int(map_id))
         for addr in self.players.clients:
-            self.sock.sendto(payload, addr)
+            self.send(payload, addr)
 
     # ---------------------------
     # --- Envoi aux clients ---
     # ---------------------------
     def broadcast_state(self):
-        # Type 2 : Update World
-        # On préfixe avec \x02
-        payload = struct.pack("BB", 2, len(self.players.players))
-        for pid, (x, y, action, flip, weapon_id, vx, vy) in self.players.players.items():
-            action_bytes = action.encode('utf-8')[:15]
-            action_bytes += b'\x00' * (15 - len(action_bytes))
-            flip_byte = b'\x01' if flip else b'\x00'
-            payload += struct.pack("Iffff", pid, x, y, vx, vy) + action_bytes + flip_byte + struct.pack("B", weapon_id)
-
-        payload += struct.pack("B", len(self.EnemyManager.enemies))
-        #for eid, e in self.EnemyManager.enemies.items():
-        #    payload += struct.pack("Iff?", eid, e.properties['x'], e.properties['y'], e.properties['flip'])
-
-        for eid, e in self.EnemyManager.enemies.items():
-            state = e.properties.get("state", "")
-            state_bytes = state.encode("utf-8")[:15]
-            state_bytes += b'\x00' * (15 - len(state_bytes))
-
-            payload += (
-                struct.pack("Iff?", eid,
-                            e.properties['x'],
-                            e.properties['y'],
-                            e.properties['flip'])
-                + state_bytes
-            )
-        for addr in self.players.clients:
-            self.sock.sendto(payload, addr)
+        world = self.build_world_state()
+        if self.interest:
+            self.interest.rebuild(*world)
+
+        seq = None
+        compact = None  # monde quantifié, calculé une seule fois par tick si besoin
+        for addr, pid in self.players.clients.items():
+            if self.interest:
+                # Seul le snapshot historique (type 2) a des compteurs sur un octet
+                if self.snapshots.uses_delta(addr):
+                    state = self.interest.filter(addr, pid, *world)
+                else:
+                    state = self.interest.filter(addr, pid, *world, limit=LEGACY_MAX_ENTITIES)
+            else:
+                state = world
+            if self.snapshots.uses_compact(addr) and self.quantizer is not None:
+                if seq is None:
+                    seq = self.snapshots.next_seq()
+                if compact is None:
+                    compact = (self.quantizer.quantize_players(world[0]), self.quantizer.quantize_enemies(world[1]))
+                if self.interest:
+                    state = ({p: compact[0][p] for p in state[0]}, {e: compact[1][e] for e in state[1]})
+                else:
+                    state = compact
+                payloads = self.snapshots.build(addr, seq, state, self.quantizer)
+            elif self.snapshots.uses_compact(addr) and self.interest:
+                # Map trop large pour une origine commune : quantification autour du joueur
+                if seq is None:
+                    seq = self.snapshots.next_seq()
+                me = world[0].get(pid, (0.0, 0.0))
+                quantizer = self.snapshots.local_quantizer(addr, me[0], me[1],
+                                                           self.interest.radius + self.interest.hysteresis)
+                state = (quantizer.quantize_players(state[0]), quantizer.quantize_enemies(state[1]))
+                payloads = self.snapshots.build(addr, seq, state, quantizer)
+            elif self.snapshots.uses_delta(addr):
+                if seq is None:
+                    seq = self.snapshots.next_seq()
+                payloads = self.snapshots.build(addr, seq, state)
+            else:
+                payloads = (self.snapshots.encoder.encode_legacy(state),)
+            for payload in payloads:
+                self.send(payload, addr)
+            if seq is not None and self.metrics:
+                self.metrics.snapshot_sent(addr, seq)
+
+    def build_world_state(self):
+        """Returns the (players, enemies) state of this tick, as wire tuples (interned action / state ids)."""
+        action_ids = ACTION_IDS
+        players = {pid: (p.x, p.y, action_ids.get(p.action, 0), p.flip, p.weapon_id, p.vx, p.vy)
+                   for pid, p in self.players.players.items()}
+        state_ids = ENEMY_STATE_IDS
+        enemies = {eid: (e.x, e.y, e.flip, state_ids.get(e.state, 0))
+                   for eid, e in self.EnemyManager.enemies.items()}
+        return players, enemies
 
 
 # ==============================
@@ -275,7 +616,41 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Ninja Game Server')
     parser.add_argument('--name', type=str, default="Ninja Server", help='Name of the server')
+    parser.add_argument('--interest-radius', type=float, default=INTEREST_RADIUS,
+                        help='Radius (px) of the area of interest around each player, 0 to send the whole map')
+    parser.add_argument('--asyncio', action='store_true', help='Run on an asyncio event loop instead of the blocking loop')
+    parser.add_argument('--rooms', type=int, default=1, help='Number of rooms on consecutive ports (asyncio mode only)')
+    parser.add_argument('--port', type=int, default=5006, help='UDP port of the (first) room')
+    parser.add_argument('--metrics', action='store_true', help='Print a one line performance summary every few seconds')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (one port per room)')
+    parser.add_argument('--vectorized-enemies', action='store_true',
+                        help='Simulate the enemies with the NumPy struct-of-arrays engine (enemy_engine.py)')
+    parser.add_argument('--lod-near', type=float, default=LOD_NEAR_DISTANCE,
+                        help='Enemies further (px) from every player update at a reduced rate, 0 to update all every tick')
+    parser.add_argument('--lod-far', type=float, default=LOD_FAR_DISTANCE,
+                        help='Enemies further (px) from every player sleep until one comes closer')
+    parser.add_argument('--ai-budget', type=float, default=AI_JOB_BUDGET * 1000,
+                        help='Time (ms) per tick for the deferred AI jobs (raycasts, spawns, wander), 0 to run them inline')
     args = parser.parse_args()
 
-    server = GameServer(True, server_name=args.name)  # mode local == True
-    server.run()
+    if args.asyncio:
+        import asyncio
+        from async_server import serve_rooms
+        maps = MapCatalog()
+        servers = [GameServer(True, port=args.port + i, server_name=args.name if args.rooms == 1 else f"{args.name} #{i + 1}",
+                              interest_radius=args.interest_radius, metrics=args.metrics,
+                              metrics_port=args.metrics_port + i if args.metrics_port else None,
+                              vectorized_enemies=args.vectorized_enemies, lod_near=args.lod_near, lod_far=args.lod_far,
+                              ai_budget=args.ai_budget / 1000, maps=maps)
+                   for i in range(args.rooms)]  # mode local == True
+        try:
+            asyncio.run(serve_rooms(servers))
+        except KeyboardInterrupt:
+            print("Arrêt du serveur...")
+    else:
+        server = GameServer(True, port=args.port, server_name=args.name, interest_radius=args.interest_radius,
+                            metrics=args.metrics, metrics_port=args.metrics_port,
+                            vectorized_enemies=args.vectorized_enemies, lod_near=args.lod_near,
+                            lod_far=args.lod_far, ai_budget=args.ai_budget / 1000)  # mode local == True
+        server.run()
@@ -0,0 +1,65 @@
+from math import floor
+
+
+class SpatialGrid:
+    """
+    Uniform grid hashing entities by position, rebuilt every tick.
+    Used to find the entities around a point without scanning the whole map.
+    """
+    def __init__(self, cell_size: float = 128):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> [(id, x, y), ...]
+
+    def clear(self) -> None:
+        self.cells.clear()
+
+    def cell_of(self, x: float, y: float) -> tuple:
+        return (floor(x / self.cell_size), floor(y / self.cell_size))
+
+    def insert(self, eid, x: float, y: float) -> None:
+        key = (floor(x / self.cell_size), floor(y / self.cell_size))
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [(eid, x, y)]
+        else:
+            cell.append((eid, x, y))
+
+    def rebuild(self, positions) -> None:
+        """Refills the grid from an iterable of (id, x, y)"""
+        self.cells.clear()
+        for eid, x, y in positions:
+            self.insert(eid, x, y)
+
+    def query_radius(self, x: float, y: float, radius: float) -> list:
+        """Returns the (id, squared distance) of every entity within 'radius' of (x, y)"""
+        res = []
+        r2 = radius * radius
+        cx0, cy0 = self.cell_of(x - radius, y - radius)
+        cx1, cy1 = self.cell_of(x + radius, y + radius)
+        cells = self.cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for eid, ex, ey in cell:
+                    d2 = (ex - x) ** 2 + (ey - y) ** 2
+                    if d2 <= r2:
+                        res.append((eid, d2))
+        return res
+
+    def any_within(self, x: float, y: float, radius: float) -> bool:
+        """Whether at least one entity is within 'radius' of (x, y)"""
+        r2 = radius * radius
+        cx0, cy0 = self.cell_of(x - radius, y - radius)
+        cx1, cy1 = self.cell_of(x + radius, y + radius)
+        cells = self.cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for _, ex, ey in cell:
+                    if (ex - x) ** 2 + (ey - y) ** 2 <= r2:
+                        return True
+        return False
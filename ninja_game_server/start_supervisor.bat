@@ -0,0 +1,5 @@
+@echo off
+title NinjaGameSupervisor
+cd /d "%~dp0"
+python supervisor.py
+pause
@@ -0,0 +1,214 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+
+from ai_jobs import AI_JOB_BUDGET
+from enemy_manager import LOD_NEAR_DISTANCE, LOD_FAR_DISTANCE
+from interest import INTEREST_RADIUS
+
+# Superviseur multi-rooms : chaque room est un GameServer dans son propre
+# processus (un coeur chacun, pas de GIL partagé), sur son propre port UDP.
+# Les rooms remontent (port, joueurs, tick moyen) par une Queue ; le superviseur
+# ouvre une room quand toutes sont pleines et ferme celles restées vides.
+# Une room plantée est relancée après un délai qui double à chaque plantage
+# consécutif ; au-delà de MAX_RESTARTS elle est abandonnée.
+
+CHECK_INTERVAL = 1.0      # secondes entre deux passes du superviseur
+PLAYER_THRESHOLD = 4      # joueurs par room avant d'en ouvrir une nouvelle
+EMPTY_GRACE = 60.0        # secondes à vide avant qu'une room en trop soit fermée
+STOP_TIMEOUT = 5.0        # secondes laissées à une room pour s'arrêter proprement
+RESTART_DELAY = 1.0       # secondes avant de relancer une room plantée, doublées à chaque plantage consécutif
+RESTART_DELAY_MAX = 60.0  # secondes
+MAX_RESTARTS = 5          # plantages consécutifs avant d'abandonner une room
+STABLE_UPTIME = 60.0      # secondes de fonctionnement après lesquelles les plantages passés sont oubliés
+
+
+def run_room(port: int, server_name: str, map_id: int, stats_queue, stop_event, options: dict) -> None:
+    """
+    Entry point of a room process (top level so it can be pickled with the 'spawn' start method),
+    'options' being extra GameServer keyword arguments.
+    """
+    from server import GameServer
+    server = GameServer(True, port=port, server_name=server_name, map_id=map_id, stop_event=stop_event,
+                        stats_queue=stats_queue, **options)  # mode local == True
+    server.run()
+
+
+class Room:
+    """Supervisor side view of one room process"""
+    def __init__(self, number: int, port: int, process, stop_event, crashes: int = 0):
+        self.number = number
+        self.port = port
+        self.process = process
+        self.stop_event = stop_event
+        self.players = 0
+        self.tick_time = 0.0
+        self.started = self.empty_since = time.monotonic()
+        self.crashes = crashes    # plantages consécutifs avant ce démarrage
+
+
+class RoomSupervisor:
+    """
+    Starts and stops room processes on consecutive ports from 'base_port'.
+    A new room opens when every room has at least 'threshold' players, an empty room
+    above 'min_rooms' closes after EMPTY_GRACE seconds, a crashed room is restarted with an
+    exponential backoff and abandoned after MAX_RESTARTS consecutive crashes.
+    'room_options' are passed to every GameServer, except 'metrics_port' which is the port
+    of the first room (room n serves its metrics on metrics_port + n).
+    """
+    def __init__(self, name="Ninja Server", base_port=5006, min_rooms=1, max_rooms=None,
+                 threshold=PLAYER_THRESHOLD, room_options: dict = None):
+        self.name = name
+        self.base_port = base_port
+        self.min_rooms = min_rooms
+        self.max_rooms = max(min_rooms, max_rooms or os.cpu_count() or 1)
+        self.threshold = threshold
+        self.room_options = dict(room_options or {})
+        self.metrics_port = self.room_options.pop('metrics_port', None)
+        self.map_count = len([f for f in os.listdir("data/maps") if f.endswith(".json")])
+
+        self.stats_queue = mp.Queue()
+        self.rooms = {}       # port -> Room
+        self.restarts = {}    # port -> (instant de relance, plantages consécutifs) des rooms plantées
+        self.abandoned = set()  # ports des rooms abandonnées après trop de plantages
+
+    def start_room(self, port: int, crashes: int = 0) -> Room:
+        number = port - self.base_port
+        stop_event = mp.Event()
+        # Chaque room démarre sur une map différente
+        map_id = number % self.map_count
+        options = dict(self.room_options)
+        if self.metrics_port:
+            options['metrics_port'] = self.metrics_port + number
+        process = mp.Process(target=run_room, name=f"room-{port}", daemon=True,
+                             args=(port, f"{self.name} #{number + 1}", map_id,
+                                   self.stats_queue, stop_event, options))
+        process.start()
+        room = Room(number, port, process, stop_event, crashes)
+        self.rooms[port] = room
+        print(f"Room #{number + 1} démarrée sur le port {port} (map {map_id}, pid {process.pid})")
+        return room
+
+    def stop_room(self, room: Room) -> None:
+        room.stop_event.set()
+        room.process.join(STOP_TIMEOUT)
+        if room.process.is_alive():
+            room.process.terminate()
+            room.process.join()
+        self.rooms.pop(room.port, None)
+        print(f"Room #{room.number + 1} arrêtée (port {room.port})")
+
+    def free_port(self) -> int:
+        """Lowest port not used by a room (running, waiting for a restart or abandoned)"""
+        port = self.base_port
+        while port in self.rooms or port in self.restarts or port in self.abandoned:
+            port += 1
+        return port
+
+    def drain_stats(self) -> None:
+        now = time.monotonic()
+        while True:
+            try:
+                port, players, tick_time = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            room = self.rooms.get(port)
+            if room is None:
+                continue
+            if players or room.players:
+                room.empty_since = now
+            room.players = players
+            room.tick_time = tick_time
+
+    def check(self) -> None:
+        """One supervisor pass: restarts dead rooms, scales up or down"""
+        self.drain_stats()
+        now = time.monotonic()
+
+        for room in list(self.rooms.values()):
+            if not room.process.is_alive():
+                self.rooms.pop(room.port)
+                crashes = 1 if now - room.started > STABLE_UPTIME else room.crashes + 1
+                if crashes > MAX_RESTARTS:
+                    self.abandoned.add(room.port)
+                    print(f"Room #{room.number + 1} (port {room.port}) morte, code {room.process.exitcode} : "
+                          f"abandonnée après {MAX_RESTARTS} redémarrages")
+                    continue
+                delay = min(RESTART_DELAY * 2 ** (crashes - 1), RESTART_DELAY_MAX)
+                self.restarts[room.port] = (now + delay, crashes)
+                print(f"Room #{room.number + 1} (port {room.port}) morte, code {room.process.exitcode} : "
+                      f"redémarrage dans {delay:.0f} s ({crashes}/{MAX_RESTARTS})")
+
+        for port, (due, crashes) in list(self.restarts.items()):
+            if now >= due:
+                del self.restarts[port]
+                self.start_room(port, crashes)
+
+        rooms = list(self.rooms.values())
+        # Les rooms en attente de relance ou abandonnées comptent : un plantage systématique
+        # ne fait pas ouvrir de nouvelles rooms à l'infini
+        used = len(rooms) + len(self.restarts) + len(self.abandoned)
+        if not self.restarts and used < self.max_rooms and all(r.players >= self.threshold for r in rooms):
+            self.start_room(self.free_port())
+            return
+
+        # Ferme au plus une room vide par passe, en commençant par la plus haute
+        if len(rooms) > self.min_rooms:
+            for room in sorted(rooms, key=lambda r: -r.port):
+                if room.players == 0 and now - room.empty_since > EMPTY_GRACE:
+                    self.stop_room(room)
+                    break
+
+    def print_rooms(self) -> None:
+        for room in sorted(self.rooms.values(), key=lambda r: r.port):
+            print(f"  #{room.number + 1} port {room.port} : {room.players} joueurs, "
+                  f"tick moyen {room.tick_time * 1000:.2f} ms")
+
+    def run(self) -> None:
+        for i in range(self.min_rooms):
+            self.start_room(self.base_port + i)
+        print(f"Superviseur en cours d’exécution ({self.min_rooms} à {self.max_rooms} rooms)...")
+        last_print = time.monotonic()
+        try:
+            while True:
+                time.sleep(CHECK_INTERVAL)
+                self.check()
+                if time.monotonic() - last_print >= 10.0:
+                    last_print = time.monotonic()
+                    self.print_rooms()
+        except KeyboardInterrupt:
+            print("Arrêt du superviseur...")
+        finally:
+            for room in list(self.rooms.values()):
+                self.stop_room(room)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Ninja Game Server - multi-room supervisor')
+    parser.add_argument('--name', type=str, default="Ninja Server", help='Base name of the rooms')
+    parser.add_argument('--base-port', type=int, default=5006, help='UDP port of the first room')
+    parser.add_argument('--rooms', type=int, default=1, help='Number of rooms always running')
+    parser.add_argument('--max-rooms', type=int, default=None, help='Maximum number of rooms (default: CPU count)')
+    parser.add_argument('--threshold', type=int, default=PLAYER_THRESHOLD,
+                        help='Players per room before a new room is opened')
+    parser.add_argument('--interest-radius', type=float, default=INTEREST_RADIUS,
+                        help='Radius (px) of the area of interest around each player, 0 to send the whole map')
+    parser.add_argument('--metrics', action='store_true', help='Print a one line performance summary per room')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve Prometheus metrics of room n on http://127.0.0.1:PORT+n/metrics')
+    parser.add_argument('--vectorized-enemies', action='store_true',
+                        help='Simulate the enemies with the NumPy struct-of-arrays engine (enemy_engine.py)')
+    parser.add_argument('--lod-near', type=float, default=LOD_NEAR_DISTANCE,
+                        help='Enemies further (px) from every player update at a reduced rate, 0 to update all every tick')
+    parser.add_argument('--lod-far', type=float, default=LOD_FAR_DISTANCE,
+                        help='Enemies further (px) from every player sleep until one comes closer')
+    parser.add_argument('--ai-budget', type=float, default=AI_JOB_BUDGET * 1000,
+                        help='Time (ms) per tick for the deferred AI jobs (raycasts, spawns, wander), 0 to run them inline')
+    args = parser.parse_args()
+
+    room_options = dict(interest_radius=args.interest_radius, metrics=args.metrics, metrics_port=args.metrics_port,
+                        vectorized_enemies=args.vectorized_enemies, lod_near=args.lod_near, lod_far=args.lod_far,
+                        ai_budget=args.ai_budget / 1000)
+    RoomSupervisor(args.name, args.base_port, args.rooms, args.max_rooms, args.threshold, room_options).run()
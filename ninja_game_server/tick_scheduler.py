@@ -0,0 +1,73 @@
+import time
+
+MAX_CATCHUP_TICKS = 5   # ticks rattrapés d'affilée avant d'abandonner le retard
+REPORT_INTERVAL = 5.0   # secondes entre deux rapports de dépassement
+IDLE_WAIT = 0.5         # attente max (s) quand aucun joueur n'est connecté
+
+
+class TickScheduler:
+    """
+    Fixed timestep scheduler on a monotonic clock.
+    Deadlines are computed from the start time (tick n is due at start + n * rate),
+    so the tick rate does not drift with the time spent handling packets.
+    """
+    def __init__(self, rate: float = 1/60, max_catchup: int = MAX_CATCHUP_TICKS, clock=time.monotonic):
+        self.rate = rate
+        self.max_catchup = max_catchup
+        self.clock = clock
+        self.next_tick = clock()
+
+        # Stats de dépassement, remises à zéro à chaque rapport
+        self.overruns = 0        # ticks dont le travail a duré plus que 'rate'
+        self.late_ticks = 0      # ticks lancés en retard (rattrapage)
+        self.dropped_ticks = 0   # ticks abandonnés au-delà de max_catchup
+        self.max_tick_time = 0.0
+        self.last_report = self.next_tick
+        self.avg_tick_time = 0.0  # moyenne glissante, jamais remise à zéro
+
+    def resync(self) -> None:
+        """Restarts the timeline from now (after an idle period)"""
+        self.next_tick = self.clock()
+
+    def time_until_next(self) -> float:
+        return max(0.0, self.next_tick - self.clock())
+
+    def due_ticks(self) -> int:
+        """
+        Returns how many ticks must run now and moves the deadline accordingly.
+        At most 'max_catchup' ticks are run in a row, the rest of the backlog is dropped.
+        """
+        now = self.clock()
+        if now < self.next_tick:
+            return 0
+        due = int((now - self.next_tick) / self.rate) + 1
+        if due > self.max_catchup:
+            self.dropped_ticks += due - self.max_catchup
+            self.next_tick = now + self.rate
+            due = self.max_catchup
+        else:
+            self.next_tick += due * self.rate
+        self.late_ticks += due - 1
+        return due
+
+    def record_tick(self, duration: float) -> None:
+        """Records the time spent in one tick"""
+        if duration > self.rate:
+            self.overruns += 1
+        if duration > self.max_tick_time:
+            self.max_tick_time = duration
+        self.avg_tick_time += (duration - self.avg_tick_time) * 0.05
+
+    def report(self) -> str | None:
+        """Returns a summary of the overruns since the last report, every REPORT_INTERVAL seconds"""
+        now = self.clock()
+        if now - self.last_report < REPORT_INTERVAL:
+            return None
+        self.last_report = now
+        msg = None
+        if self.overruns or self.late_ticks or self.dropped_ticks:
+            msg = (f"Ticks en retard : {self.overruns} trop longs (max {self.max_tick_time * 1000:.1f} ms), "
+                   f"{self.late_ticks} rattrapés, {self.dropped_ticks} abandonnés")
+        self.overruns = self.late_ticks = self.dropped_ticks = 0
+        self.max_tick_time = 0.0
+        return msg
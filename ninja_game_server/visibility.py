@@ -0,0 +1,154 @@
+import hashlib
+import os
+
+import numpy as np
+
+# Table de visibilité tuile -> tuile d'une map, précalculée au chargement.
+# Pour chaque tuile de la grille et chaque tuile à moins de VISIBILITY_DISTANCE,
+# un bit indique si le segment entre leurs centres est dégagé (même test que
+# can_see_player : rayon arrêté LOS_STOP px avant la cible). La table est mise en
+# cache à côté de la map (data/maps/N.vis.npz), avec un hash de la grille solide :
+# un rechargement de la même map ne coûte qu'une lecture de fichier.
+#
+#     python visibility.py          # précalcule toutes les maps de data/maps
+
+VISIBILITY_DISTANCE = 16 * 8   # px, VISION_DISTANCE_PATROL d'enemy_manager
+LOS_STOP = 10                  # px, comme Enemy.can_see_player
+CACHE_VERSION = 1              # à incrémenter si le calcul de la table change
+CHUNK_RAYS = 200_000           # rayons par lot pendant le calcul (mémoire)
+
+
+def cache_path(map_path: str) -> str:
+    return os.path.splitext(map_path)[0] + ".vis.npz"
+
+
+class VisibilityTable:
+    """
+    Bitset of the visible tiles around every tile of a TilemapServer grid, within 'radius' tiles.
+    Queries outside the grid or the radius return None: the caller casts a ray instead.
+    """
+    def __init__(self, tilemap, radius: int, bits: np.ndarray, key: str):
+        self.origin = tilemap.origin
+        self.width = tilemap.width
+        self.height = tilemap.height
+        self.tile_size = tilemap.tile_size
+        self.radius = radius
+        self.key = key
+        self.offsets = disk_offsets(radius)
+        self.stride = bits.shape[1] if bits.ndim == 2 else 0
+        self.bits = bits
+        self.bytes = bits.tobytes()
+        # Indice du bit de chaque décalage (dy + radius, dx + radius), -1 hors du disque
+        size = 2 * radius + 1
+        index = np.full((size, size), -1, dtype=np.int64)
+        index[self.offsets[:, 1] + radius, self.offsets[:, 0] + radius] = np.arange(len(self.offsets))
+        self.offset_index = index
+        self.offset_rows = index.tolist()
+
+    @staticmethod
+    def content_key(tilemap, radius: int) -> str:
+        """Hash of everything the table depends on"""
+        h = hashlib.sha1(f"{CACHE_VERSION};{tilemap.tile_size};{tilemap.origin};{tilemap.solid.shape};"
+                         f"{radius};{LOS_STOP}".encode())
+        h.update(np.ascontiguousarray(tilemap.solid).tobytes())
+        return h.hexdigest()
+
+    @classmethod
+    def build(cls, tilemap, radius: int = None) -> "VisibilityTable":
+        """Casts one ray between the centres of every tile of the grid and every tile of its disk"""
+        if radius is None:
+            radius = -(-VISIBILITY_DISTANCE // tilemap.tile_size)
+        offsets = disk_offsets(radius)
+        ts = tilemap.tile_size
+        cells = tilemap.width * tilemap.height
+        visible = np.zeros((cells, len(offsets)), dtype=bool)
+        if cells:
+            gy, gx = np.divmod(np.arange(cells), tilemap.width)
+            cx = (gx + tilemap.origin[0] + 0.5) * ts
+            cy = (gy + tilemap.origin[1] + 0.5) * ts
+            per_chunk = max(1, CHUNK_RAYS // len(offsets))
+            for start in range(0, cells, per_chunk):
+                sx = np.repeat(cx[start:start + per_chunk], len(offsets))
+                sy = np.repeat(cy[start:start + per_chunk], len(offsets))
+                n = len(sx) // len(offsets)
+                tx = sx + np.tile(offsets[:, 0] * ts, n)
+                ty = sy + np.tile(offsets[:, 1] * ts, n)
+                visible[start:start + n] = tilemap.segments_clear(sx, sy, tx, ty, LOS_STOP).reshape(n, len(offsets))
+        return cls(tilemap, radius, np.packbits(visible, axis=1), cls.content_key(tilemap, radius))
+
+    @classmethod
+    def for_map(cls, tilemap, map_path: str) -> "VisibilityTable":
+        """Table of a map loaded from 'map_path', read from its cache file or built and saved there"""
+        radius = -(-VISIBILITY_DISTANCE // tilemap.tile_size)
+        key = cls.content_key(tilemap, radius)
+        path = cache_path(map_path)
+        try:
+            with np.load(path) as data:
+                if str(data['key']) == key:
+                    return cls(tilemap, radius, data['bits'], key)
+        except (OSError, KeyError, ValueError):
+            pass  # pas de cache ou cache illisible : on recalcule
+
+        table = cls.build(tilemap, radius)
+        try:
+            with open(path, 'wb') as f:
+                np.savez_compressed(f, key=np.array(key), bits=table.bits)
+        except OSError as e:
+            print(f"Cache de visibilité non écrit ({path}) : {e}")
+        return table
+
+    def visible(self, sx: int, sy: int, tx: int, ty: int) -> bool | None:
+        """Whether tile (tx, ty) is visible from tile (sx, sy), None if the table does not know"""
+        gx = sx - self.origin[0]
+        gy = sy - self.origin[1]
+        dx = tx - sx + self.radius
+        dy = ty - sy + self.radius
+        size = 2 * self.radius + 1
+        if not (0 <= gx < self.width and 0 <= gy < self.height and 0 <= dx < size and 0 <= dy < size):
+            return None
+        bit = self.offset_rows[dy][dx]
+        if bit < 0:
+            return None
+        return bool(self.bytes[(gy * self.width + gx) * self.stride + (bit >> 3)] & (0x80 >> (bit & 7)))
+
+    def visible_many(self, ox: np.ndarray, oy: np.ndarray, tx: np.ndarray, ty: np.ndarray) -> tuple:
+        """visible() for arrays of pixel positions, returns (known, visible) boolean arrays"""
+        ts = self.tile_size
+        sx = np.floor(ox / ts).astype(np.int64)
+        sy = np.floor(oy / ts).astype(np.int64)
+        gx = sx - self.origin[0]
+        gy = sy - self.origin[1]
+        dx = np.floor(tx / ts).astype(np.int64) - sx + self.radius
+        dy = np.floor(ty / ts).astype(np.int64) - sy + self.radius
+        size = 2 * self.radius + 1
+        known = ((gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+                 & (dx >= 0) & (dx < size) & (dy >= 0) & (dy < size))
+        bit = np.full(known.shape, -1, dtype=np.int64)
+        bit[known] = self.offset_index[dy[known], dx[known]]
+        known &= bit >= 0
+        visible = np.zeros(known.shape, dtype=bool)
+        cell = gy[known] * self.width + gx[known]
+        b = bit[known]
+        visible[known] = (self.bits[cell, b >> 3] & (0x80 >> (b & 7))) != 0
+        return known, visible
+
+
+def disk_offsets(radius: int) -> np.ndarray:
+    """(dx, dy) tile offsets within 'radius' tiles, shape (n, 2)"""
+    r = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(r, r)
+    inside = dx * dx + dy * dy <= radius * radius
+    return np.stack((dx[inside], dy[inside]), axis=1)
+
+
+if __name__ == "__main__":
+    import time
+    from TilemapServer import TilemapServer
+    maps_dir = os.path.join("data", "maps")
+    for name in sorted(f for f in os.listdir(maps_dir) if f.endswith(".json")):
+        start = time.perf_counter()
+        tilemap = TilemapServer()
+        tilemap.load(os.path.join(maps_dir, name))
+        table = tilemap.visibility
+        print(f"{name} : {tilemap.width}x{tilemap.height} tuiles, rayon {table.radius}, "
+              f"{table.bits.nbytes / 1024:.1f} Ko, {time.perf_counter() - start:.2f} s")